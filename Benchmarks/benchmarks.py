@@ -0,0 +1,300 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('MPLBACKEND', 'Agg')    # never open a window, whatever gets called
+
+import numpy as np
+from scipy.integrate import odeint, solve_ivp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))     # repository root, for mathematical_models
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+import mathematical_models as mm
+
+"""
+ Benchmarks of the models and Monte Carlo routines
+
+ Every benchmark runs one computation (no plotting) for a sweep of problem sizes (time points, scenarios,
+ walks, iterations, ...) and reports, for each size:
+
+    seconds:     best wall time over the repeats
+    throughput:  size / seconds (e.g. scenarios per second)
+    peak_bytes:  peak memory allocated during one run (tracemalloc, measured in a separate run)
+
+ plus a scaling exponent per benchmark (slope of log(seconds) against log(size): 1 = linear).
+ Results are written to a JSON file; --compare old.json reports the change against a previous run:
+
+    python Benchmarks/benchmarks.py --quick --output before.json
+    python Benchmarks/benchmarks.py --quick --output after.json --compare before.json
+"""
+
+BENCHMARKS = {}
+
+def benchmark(name, unit, sizes, quick_sizes):
+    """Register setup(size) -> function running the workload for `size` units."""
+    def register(setup):
+        BENCHMARKS[name] = {'unit': unit, 'sizes': sizes, 'quick_sizes': quick_sizes, 'setup': setup}
+        return setup
+    return register
+
+"""-----------------------------------------------------------------"""
+
+# Deterministic models:
+
+@benchmark('sir_odeint', 'time points', [10**3, 10**4, 10**5], [10**3, 10**4])
+def sir_odeint(size):
+    sir = mm.sir
+    t = np.linspace(0, 160, size)
+    return lambda: odeint(sir.derivative, (349, 1, 0), t, args = (350, 0.4, 0.1))
+
+@benchmark('simplest_sir_odeint', 'time points', [10**3, 10**4, 10**5], [10**3, 10**4])
+def simplest_sir_odeint(size):
+    t = np.linspace(0, 365, size)
+    return lambda: odeint(mm.sir_model, (999990, 10, 0), t, args = (10**6, 0.5, 0.1))
+
+@benchmark('seir_odeint_loop', 'scenarios', [10, 100, 1000], [10, 100])
+def seir_odeint_loop(size):
+    seir = mm.seir
+    t = np.linspace(0, 365, 366)
+    E0 = np.linspace(1, 100, size)
+    return lambda: [odeint(seir.derivative, (1000 - e, e, 0, 0), t, args = (1000, 0.3, 0.1, 0.05)) for e in E0]
+
+@benchmark('seir_batch', 'scenarios', [10, 100, 1000, 10000], [10, 100, 1000])
+def seir_batch(size):
+    t = np.linspace(0, 365, 366)
+    E0 = np.linspace(1, 100, size)
+    return lambda: mm.solve_seir_batch(0.3, 0.1, 0.05, 1000, E0, t)
+
+@benchmark('seir_compiled_rk4', 'scenarios', [10, 100, 1000, 10000], [10, 100, 1000])
+def seir_compiled_rk4(size):
+    t = np.linspace(0, 365, 366)
+    E0 = np.linspace(1, 100, size)
+    X0 = np.stack([1000 - E0, E0, np.zeros(size), np.zeros(size)], axis = 1)
+    mm.integrate_batch('seir', X0[:1], t, (1000, 0.3, 0.1, 0.05))       # JIT compilation is not timed
+    return lambda: mm.integrate_batch('seir', X0, t, (1000, 0.3, 0.1, 0.05), method = 'rk4')
+
+@benchmark('seir_compiled_rk45', 'scenarios', [10, 100, 1000, 10000], [10, 100, 1000])
+def seir_compiled_rk45(size):
+    t = np.linspace(0, 365, 366)
+    E0 = np.linspace(1, 100, size)
+    X0 = np.stack([1000 - E0, E0, np.zeros(size), np.zeros(size)], axis = 1)
+    mm.integrate_batch('seir', X0[:1], t, (1000, 0.3, 0.1, 0.05), method = 'rk45')
+    return lambda: mm.integrate_batch('seir', X0, t, (1000, 0.3, 0.1, 0.05), method = 'rk45')
+
+@benchmark('seir_metapopulation', 'groups', [10**2, 10**3, 10**4], [10**2, 10**3])
+def seir_metapopulation(size):
+    mp = mm.metapopulation
+    N = np.full(size, 1000.0)
+    K = mp.coupling(mp.ring_mobility(size, shortcuts = size // 25, seed = 0), epsilon = 0.05)
+    t = np.linspace(0, 365, 366)
+    return lambda: mp.solve(mp.seed_outbreak(N, 1), t, N, 0.3, 0.1, K, sigma = 0.05)
+
+@benchmark('sir_explorer', 'points', [10**3, 10**4, 10**5], [10**3, 10**4])
+def sir_explorer(size):
+    points = mm.parameter_explorer.latin_hypercube({'beta': (0.01, 0.6), 'gamma': (0.05, 0.5)}, size, seed = 0)
+    mm.parameter_explorer.explore('sir', {'beta': [0.4], 'gamma': [0.1]}, workers = 1)       # JIT compilation is not timed
+    return lambda: mm.parameter_explorer.explore('sir', points, t_max = 160)
+
+@benchmark('lotka_volterra_odeint', 'time points', [10**3, 10**4, 10**5], [10**3, 10**4])
+def lotka_volterra_odeint(size):
+    lv = mm.lotka_volterra
+    t = np.linspace(0, 30, size)
+    return lambda: odeint(lv.derivative, (3, 2), t, args = (1, 0.3, 0.8, 1.5))
+
+@benchmark('lotka_volterra_poisson', 'time units', [10**3, 10**4, 10**5, 10**6], [10**3, 10**4])
+def lotka_volterra_poisson(size):
+    lv = mm.lotka_volterra
+    lv.lotka_volterra_poisson((3, 2), 1, 1, 0.3, 0.8, 1.5)      # JIT compilation is not timed
+    return lambda: lv.lotka_volterra_poisson((3, 2), size, 1, 0.3, 0.8, 1.5, dt = 0.05)
+
+@benchmark('lotka_volterra_portrait', 'trajectories', [10, 100, 1000], [10, 100])
+def lotka_volterra_portrait(size):
+    lv, pp = mm.lotka_volterra, mm.phase_portrait
+    t = np.linspace(0, 30, 1000)
+    seeds = np.stack([np.linspace(0.5, 6, size), np.ones(size)], axis = 1)
+    grid = np.linspace(0, 8, 500)
+    return lambda: (pp.vector_field(lv.derivative, grid, grid, (1, 0.3, 0.8, 1.5)),
+                    pp.trajectories(lv.derivative, seeds, t, (1, 0.3, 0.8, 1.5), jac = lv.jacobian))
+
+@benchmark('logistic_odeint_loop', 'curves', [10, 100, 1000], [10, 100])
+def logistic_odeint_loop(size):
+    t = np.linspace(0, 50, 51)
+    k = np.linspace(-0.3, 0.3, size)
+    return lambda: [odeint(mm.logistic_model, 100, t, args = (k_i, 1000)) for k_i in k]
+
+@benchmark('logistic_exact', 'curves', [10**3, 10**5, 10**6], [10**3, 10**5])
+def logistic_exact(size):
+    t = np.linspace(0, 50, 51)
+    k = np.linspace(-0.3, 0.3, size)
+    return lambda: mm.solve_growth_model(mm.logistic_model, 100, t, k, 1000)
+
+@benchmark('malthus_exact', 'curves', [10**3, 10**5, 10**6], [10**3, 10**5])
+def malthus_exact(size):
+    t = np.linspace(0, 10, 11)
+    r = np.linspace(-0.2, 0.2, size)
+    return lambda: mm.solve_growth_model(mm.malthus_model, 100, t, r)
+
+"""-----------------------------------------------------------------"""
+
+# Stochastic models:
+
+@benchmark('stock_solve_ivp', 'time points', [10**2, 10**3, 10**4], [10**2, 10**3])
+def stock_solve_ivp(size):
+    t_eval = np.linspace(0, 100, size)
+    return lambda: solve_ivp(mm.stock_price, t_span = [0, 100], y0 = [100], t_eval = t_eval, args = (0.05, 0.001, 0.01))
+
+@benchmark('stock_sde_paths', 'paths', [10**2, 10**3, 10**4], [10**2, 10**3])
+def stock_sde_paths(size):
+    t_eval = np.linspace(0, 100, 1000)
+    return lambda: mm.sde_paths(100, t_eval, 0.05, 0.001, 0.01, paths = size, seed = 0)
+
+@benchmark('gbm_paths', 'paths', [10**3, 10**4, 10**5], [10**3, 10**4])
+def gbm_paths(size):
+    return lambda: mm.gbm_paths(100, 0.05, 0.2, 1, 0.01, size, seed = 0)
+
+@benchmark('gbm_statistics', 'paths', [10**4, 10**5, 10**6], [10**4, 10**5])
+def gbm_statistics(size):
+    return lambda: mm.gbm_statistics(100, 0.05, 0.2, 1, 1/252, size, dtype = np.float32, seed = 0)
+
+"""-----------------------------------------------------------------"""
+
+# Monte Carlo:
+
+@benchmark('coin_flip_loop', 'iterations', [10**4, 10**5, 10**6], [10**4, 10**5])
+def coin_flip_loop(size):
+    return lambda: mm.coin_flip.monte_carlo(size)
+
+@benchmark('coin_flip_vectorized', 'iterations', [10**5, 10**6, 10**7], [10**5, 10**6])
+def coin_flip_vectorized(size):
+    return lambda: mm.coin_flip.count_flips(size, seed = 0)
+
+@benchmark('monty_hall', 'iterations', [10**4, 10**5, 10**6], [10**4, 10**5])
+def monty_hall(size):
+    return lambda: mm.monty_hall.monte_carlo(size, seed = 0)
+
+@benchmark('monty_hall_simulate', 'iterations', [10**5, 10**6, 10**7], [10**5, 10**6])
+def monty_hall_simulate(size):
+    return lambda: mm.monty_hall.simulate(size, record_every = 1000, seed = 0)
+
+@benchmark('random_walk_statistics', 'walks', [10**3, 10**4, 10**5], [10**3, 10**4])
+def random_walk_statistics(size):
+    return lambda: mm.random_walk_statistics(size, 1000, seed = 0)
+
+@benchmark('gbm_sobol_bridge', 'paths', [2**12, 2**14, 2**16], [2**12, 2**14])
+def gbm_sobol_bridge(size):
+    return lambda: mm.variance_reduction.gbm_sample(100, 0.05, 0.2, 1, 0.01, size, 'sobol', bridge = True, seed = 0)
+
+@benchmark('option_pricing', 'paths', [10**4, 10**5, 10**6], [10**4, 10**5])
+def option_pricing(size):
+    op = mm.option_pricing
+    products = {'european': op.european(100), 'asian': op.asian(100), 'barrier': op.barrier(100, 130), 'lookback': op.lookback(100)}
+    return lambda: op.price(products, 100, 0.05, 0.2, 1, 0.01, size, seed = 0)
+
+@benchmark('abc_gbm_rejection', 'particles', [10**4, 10**5, 10**6], [10**4, 10**5])
+def abc_gbm_rejection(size):
+    S0, T, dt = 100, 1, 1 / 252
+    observed = mm.abc_inference.price_summaries(mm.gbm_paths(S0, 0.05, 0.2, T, dt, 1, seed = 1), dt)[0]
+    prior = {'r': (-0.5, 0.5), 'sigma': (0.01, 0.6)}
+    return lambda: mm.abc_inference.rejection(mm.abc_inference.gbm_simulator, prior, observed, simulations = size,
+                                              args = (S0, T, dt), seed = 0, workers = 1)
+
+"""-----------------------------------------------------------------"""
+
+def measure(run, repeats):
+    """Best wall time over `repeats` runs, and peak traced memory of one more run."""
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(seconds), peak
+
+def scaling_exponent(sizes, seconds):
+    """Slope of log(seconds) against log(size) (None with less than 2 sizes)."""
+    if len(sizes) < 2:
+        return None
+    return float(np.polyfit(np.log(sizes), np.log(np.maximum(seconds, 1e-9)), 1)[0])
+
+def run_benchmarks(names = None, quick = False, repeats = 3, verbose = True):
+    results = {}
+    for name, spec in BENCHMARKS.items():
+        if names and not any(pattern in name for pattern in names):
+            continue
+        sizes = spec['quick_sizes'] if quick else spec['sizes']
+        rows = []
+        for size in sizes:
+            run = spec['setup'](size)
+            seconds, peak = measure(run, repeats)
+            rows.append({'size': size, 'seconds': seconds, 'throughput': size / seconds, 'peak_bytes': peak})
+            if verbose:
+                print('{:<24} {:>10} {:<12} {:>10.4f} s {:>14.1f} {}/s {:>10.1f} MB'.format(
+                    name, size, spec['unit'], seconds, size / seconds, spec['unit'], peak / 1e6))
+        results[name] = {'unit': spec['unit'], 'runs': rows,
+                         'scaling_exponent': scaling_exponent(sizes, [row['seconds'] for row in rows])}
+    return results
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd = ROOT, capture_output = True, text = True).stdout.strip()
+    except OSError:
+        commit = ''
+    import scipy
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__, 'scipy': scipy.__version__,
+            'machine': platform.machine(), 'processor': platform.processor(), 'cpus': os.cpu_count(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+def compare(results, previous, threshold = 0.2):
+    """Print the change of every common (benchmark, size) and return the regressions (slower by more than threshold)."""
+    regressions = []
+    for name, result in results.items():
+        if name not in previous['results']:
+            continue
+        old = {row['size']: row for row in previous['results'][name]['runs']}
+        for row in result['runs']:
+            if row['size'] in old:
+                ratio = row['seconds'] / old[row['size']]['seconds']
+                flag = 'REGRESSION' if ratio > 1 + threshold else ''
+                print('{:<24} {:>10}  {:>6.2f}x time  {}'.format(name, row['size'], ratio, flag))
+                if flag:
+                    regressions.append((name, row['size'], ratio))
+    return regressions
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Benchmark the models and Monte Carlo routines.')
+    parser.add_argument('benchmarks', nargs = '*', help = 'run only the benchmarks whose name contains one of these')
+    parser.add_argument('--output', default = 'benchmark_results.json', help = 'JSON file for the results')
+    parser.add_argument('--compare', help = 'JSON file of a previous run to compare against')
+    parser.add_argument('--threshold', type = float, default = 0.2, help = 'slowdown reported as a regression (0.2 = 20%%)')
+    parser.add_argument('--quick', action = 'store_true', help = 'smaller problem sizes')
+    parser.add_argument('--repeats', type = int, default = 3)
+    parser.add_argument('--list', action = 'store_true', help = 'list the benchmarks and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, spec in BENCHMARKS.items():
+            print('{:<24} {:<12} {}'.format(name, spec['unit'], spec['sizes']))
+        return 0
+
+    results = run_benchmarks(args.benchmarks, args.quick, args.repeats)
+    with open(args.output, 'w') as f:
+        json.dump({'environment': environment(), 'quick': args.quick, 'results': results}, f, indent = 2)
+    print('Results written to', args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
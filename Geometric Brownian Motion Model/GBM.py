@@ -1,29 +1,149 @@
 import numpy as np
-import matplotlib.pyplot as plt
-
-# Initialize parameters
-S0 = 100 # initial asset price
-r = 0.05 # rate of return
-sigma = 0.2 # volatility
-T = 1 # time horizon (years)
-dt = 0.01 # time step
-N = 10 # number of simulations
-
-# Calculate number of steps
-n = int(T / dt) + 1
-
-# Initialize price path
-P = np.zeros((n, N))
-P[0,:] = S0
-
-# Generate price path
-for i in range(1, n):
-    # Calculate next price using GBM formula
-    P[i,:] = P[i-1,:] * np.exp((r - 0.5 * sigma**2) * dt + sigma * np.sqrt(dt) * np.random.normal(size=N))
-
-# Plot price path for all simulations
-plt.plot(P)
-plt.xlabel('Steps')
-plt.ylabel('Price')
-plt.title('Geometric Brownian Motion Model')
-plt.show()
\ No newline at end of file
+
+def gbm_paths(S0, r, sigma, T, dt, N, seed = None):
+    """Simulate N price paths of a Geometric Brownian Motion.
+
+    Args:
+        S0 (float): Initial asset price.
+        r (float): Rate of return.
+        sigma (float): Volatility.
+        T (float): Time horizon (years).
+        dt (float): Time step.
+        N (int): Number of simulations.
+        seed: Seed (int, SeedSequence or np.random.Generator) of the random numbers.
+
+    Returns:
+        ndarray: Array P of shape (steps, N), where P[i, j] is the price of path j at step i.
+    """
+    rng = np.random.default_rng(seed)
+
+    # Calculate number of steps
+    n = int(T / dt) + 1
+
+    # Initialize price path
+    P = np.zeros((n, N))
+    P[0,:] = S0
+
+    # Generate price path: by the GBM formula, log-prices are cumulative sums of normal increments
+    increments = (r - 0.5 * sigma**2) * dt + sigma * np.sqrt(dt) * rng.normal(size=(n - 1, N))
+    P[1:,:] = S0 * np.exp(np.cumsum(increments, axis = 0))
+    return P
+
+def gbm_chunks(S0, r, sigma, T, dt, N, chunk_paths = 2**14, chunk_steps = None, dtype = np.float64, seed = None):
+    """Generate GBM price paths piece by piece, without ever holding all of them.
+
+    Paths are simulated in blocks of chunk_paths paths, and every block in time-chunks of chunk_steps steps.
+    The log-prices of a chunk are one cumulative sum of its normal increments, continued from the last
+    log-price of the previous chunk.
+
+    Args:
+        S0, r, sigma, T, dt, N: As in gbm_paths.
+        chunk_paths (int): Paths per block.
+        chunk_steps (int): Steps per time-chunk (default: all the steps at once).
+        dtype: np.float64 or np.float32 (half the memory and faster, enough for statistics).
+        seed: Seed (int, SeedSequence or np.random.Generator) of the random numbers.
+
+    Yields:
+        tuple: (first path, first step, P), where P has shape (steps in chunk, paths in block) and
+               P[i, j] is the price of path first_path + j at step first_step + i. Steps start at 1 (step 0 is S0).
+    """
+    rng = np.random.default_rng(seed)
+    n = int(T / dt) + 1
+    drift = (r - 0.5 * sigma**2) * dt
+    vol = sigma * np.sqrt(dt)
+    chunk_steps = chunk_steps or max(n - 1, 1)
+
+    for first_path in range(0, N, chunk_paths):
+        m = min(chunk_paths, N - first_path)
+        log_price = np.full(m, np.log(S0), dtype = dtype)
+        for first_step in range(1, n, chunk_steps):
+            k = min(chunk_steps, n - first_step)
+            X = rng.standard_normal((k, m), dtype = dtype)
+            X *= vol
+            X += drift
+            np.cumsum(X, axis = 0, out = X)
+            X += log_price
+            log_price = X[-1].copy()
+            yield first_path, first_step, np.exp(X, out = X)
+
+def gbm_statistics(S0, r, sigma, T, dt, N, quantiles = (0.05, 0.5, 0.95), chunk_paths = 2**14, chunk_steps = None, dtype = np.float64, seed = None):
+    """Statistics of N GBM paths, computed on the fly from gbm_chunks.
+
+    Memory is one chunk plus O(steps + N) for the results, whatever the number of paths.
+
+    Returns:
+        dict:
+            - 'mean', 'var': mean and (sample) variance of the price at every step, shape (steps,).
+            - 'terminal': the terminal prices, shape (N,), and 'terminal_quantiles' at the given quantiles.
+            - 'max_drawdown': largest relative fall from a running peak of every path, shape (N,),
+              with 'max_drawdown_mean' and 'max_drawdown_quantiles'.
+    """
+    n = int(T / dt) + 1
+    mean = np.zeros(n)
+    M2 = np.zeros(n)
+    mean[0] = S0
+    terminal = np.full(N, S0, dtype = dtype)
+    max_drawdown = np.zeros(N, dtype = dtype)
+
+    for first_path, first_step, P in gbm_chunks(S0, r, sigma, T, dt, N, chunk_paths, chunk_steps, dtype, seed):
+        k, m = P.shape
+        steps = slice(first_step, first_step + k)
+        if first_step == 1:
+            peak = np.full(m, S0, dtype = dtype)
+            drawdown = np.zeros(m, dtype = dtype)
+
+        # Drawdown from the running peak, continued from the previous time-chunk
+        running_peak = np.maximum.accumulate(P, axis = 0)
+        np.maximum(running_peak, peak, out = running_peak)
+        np.maximum(drawdown, (1 - P / running_peak).max(axis = 0), out = drawdown)
+        peak = running_peak[-1]
+
+        # Per-step mean and variance over paths, merging blocks with Chan et al.'s pairwise update
+        block_mean = P.mean(axis = 1, dtype = np.float64)
+        block_M2 = np.square(P - block_mean[:, None].astype(dtype)).sum(axis = 1, dtype = np.float64)
+        delta = block_mean - mean[steps]
+        total = first_path + m
+        mean[steps] += delta * m / total
+        M2[steps] += block_M2 + delta**2 * first_path * m / total
+
+        if first_step + k == n:
+            terminal[first_path:first_path + m] = P[-1]
+            max_drawdown[first_path:first_path + m] = drawdown
+
+    return {
+        'mean': mean,
+        'var': M2 / max(N - 1, 1),
+        'terminal': terminal,
+        'terminal_quantiles': np.quantile(terminal, quantiles),
+        'max_drawdown': max_drawdown,
+        'max_drawdown_mean': float(max_drawdown.mean()),
+        'max_drawdown_quantiles': np.quantile(max_drawdown, quantiles),
+    }
+
+def plot_gbm(P):
+    import matplotlib.pyplot as plt
+
+    # Plot price path for all simulations
+    plt.plot(P)
+    plt.xlabel('Steps')
+    plt.ylabel('Price')
+    plt.title('Geometric Brownian Motion Model')
+    plt.show()
+
+if __name__ == '__main__':
+    # Initialize parameters
+    S0 = 100 # initial asset price
+    r = 0.05 # rate of return
+    sigma = 0.2 # volatility
+    T = 1 # time horizon (years)
+    dt = 0.01 # time step
+    N = 10 # number of simulations
+
+    P = gbm_paths(S0, r, sigma, T, dt, N)
+    plot_gbm(P)
+
+    # Statistics of many more paths, without keeping them
+    stats = gbm_statistics(S0, r, sigma, T, dt, 10**5, dtype = np.float32)
+    print('Mean terminal price: ', format(stats['mean'][-1], '.2f'), '(exact: '+format(S0*np.exp(r*T), '.2f')+')')
+    print('5%, 50%, 95% quantiles of the terminal price: ', np.round(stats['terminal_quantiles'], 2))
+    print('Mean maximum drawdown: ', format(stats['max_drawdown_mean']*100, '.2f')+'%')
@@ -0,0 +1,236 @@
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.stats import norm
+
+if __name__ == '__main__':      # run as a script: put the repository root on the path for mathematical_models
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import mathematical_models as mm
+
+"""
+ Option pricing and risk on the GBM paths of GBM.py
+
+ The paths of gbm_chunks are reduced while they are generated, one block of paths (and time-chunk) at a time, to
+ the few numbers per path the payoffs need: the terminal price S_T, the average A of the monitored prices, the
+ maximum M and minimum m, their derivatives with respect to sigma, and the likelihood-ratio scores. Memory is one
+ chunk plus O(N) (the terminal prices, for the risk measures), and every product and Greek is estimated from the
+ same batch of paths:
+
+    price:              exp(-r T) E[payoff]
+    pathwise Greeks:    exp(-r T) E[d payoff / d theta], with dS_t/dS0 = S_t / S0, dS_t/dsigma = S_t (W_t - sigma t)
+                        (payoffs continuous in the path: European, Asian, lookback)
+    likelihood ratio:   exp(-r T) E[payoff * d log p / d theta], with the density p of the log-increments
+                        x_k = (r - sigma^2 / 2) dt + sigma sqrt(dt) Z_k:
+                            delta: Z_1 / (S0 sigma sqrt(dt))
+                            vega:  sum_k (Z_k^2 - 1) / sigma - Z_k sqrt(dt)
+                        (any payoff, including the discontinuous barrier options; larger variance)
+    gamma:              likelihood ratio of the pathwise delta (LR-PW), for payoffs with a pathwise delta
+    risk:               VaR and CVaR of the loss S0 - S_T of one unit of the asset, at the levels `alpha`
+
+ A product is a function product(state) -> (payoff, d payoff / dS0, d payoff / dsigma) of the reduced state of a
+ block (arrays per path, see european, asian, barrier, lookback); the derivatives are None where the pathwise
+ estimator does not apply. r is the risk-free rate (risk-neutral pricing). The average, the extremes and the
+ barriers are monitored at the steps dt, 2dt, ..., T (not at t = 0, so the payoffs only depend on S0 through the
+ path, as the likelihood-ratio estimators require).
+"""
+
+def european(strike, option = 'call'):
+    """European option on S_T."""
+    def product(state):
+        return _vanilla(state['terminal'], state['terminal_vega'], state['S0'], strike, option)
+    return product
+
+def asian(strike, option = 'call'):
+    """Arithmetic average price option (average of the prices at the steps dt, 2dt, ..., T)."""
+    def product(state):
+        return _vanilla(state['average'], state['average_vega'], state['S0'], strike, option)
+    return product
+
+def lookback(strike = None, option = 'call'):
+    """Lookback option: on the maximum (call) or minimum (put) with a fixed strike, or with a floating strike
+    (strike None: S_T - m for a call, M - S_T for a put). The extremes are over the steps dt, 2dt, ..., T."""
+    def product(state):
+        S0, S, dS = state['S0'], state['terminal'], state['terminal_vega']
+        if strike is not None:
+            extreme = 'maximum' if option == 'call' else 'minimum'
+            return _vanilla(state[extreme], state[extreme + '_vega'], S0, strike, option)
+        if option == 'call':
+            X, dX = S - state['minimum'], dS - state['minimum_vega']
+        else:
+            X, dX = state['maximum'] - S, state['maximum_vega'] - dS
+        return X, X / S0, dX                     # X is homogeneous of degree 1 in the path: dX/dS0 = X / S0
+    return product
+
+def barrier(strike, level, option = 'call', knock = 'up-and-out'):
+    """Barrier option: a European option cancelled ('out') or activated ('in') when the monitored price crosses
+    `level` upwards ('up-and-...') or downwards ('down-and-...'). No pathwise Greeks (the payoff jumps at the barrier)."""
+    def product(state):
+        crossed = state['maximum'] >= level if knock.startswith('up') else state['minimum'] <= level
+        alive = crossed if knock.endswith('in') else ~crossed
+        payoff = _vanilla(state['terminal'], state['terminal_vega'], state['S0'], strike, option)[0]
+        return payoff * alive, None, None
+    return product
+
+def _vanilla(X, dX, S0, strike, option):
+    """max(X - K, 0) (call) or max(K - X, 0) (put) of a price functional X homogeneous in the path, and its derivatives."""
+    if option == 'call':
+        exercised = X > strike
+        return np.where(exercised, X - strike, 0.0), exercised * X / S0, exercised * dX
+    exercised = X < strike
+    return np.where(exercised, strike - X, 0.0), -(exercised * X) / S0, -(exercised * dX)
+
+"""-----------------------------------------------------------------"""
+
+def _blocks(S0, r, sigma, T, dt, N, chunk_paths, chunk_steps, seed):
+    """Reduce the chunks of gbm_chunks to the per-path state of every block of paths (streaming)."""
+    n = int(T / dt) + 1
+    log_S0 = np.log(S0)
+    drift, vol = (r - 0.5 * sigma**2) * dt, sigma * np.sqrt(dt)
+    for first_path, first_step, P in mm.gbm_chunks(S0, r, sigma, T, dt, N, chunk_paths, chunk_steps, seed = seed):
+        k, m = P.shape
+        L = np.log(P)
+        if first_step == 1:
+            previous = np.full(m, log_S0)
+            total, total_vega, delta_score, vega_score = np.zeros(m), np.zeros(m), None, np.zeros(m)
+            maximum, minimum = np.full(m, -np.inf), np.full(m, np.inf)
+            maximum_vega, minimum_vega = np.zeros(m), np.zeros(m)
+
+        # Normals of the steps, from the log-increments (likelihood-ratio scores)
+        Z = (np.diff(L, axis = 0, prepend = previous[None]) - drift) / vol
+        if delta_score is None:
+            delta_score = Z[0] / (S0 * vol)
+        vega_score += ((Z**2 - 1) / sigma - Z * np.sqrt(dt)).sum(axis = 0)
+        previous = L[-1]
+
+        # dS_t/dsigma = S_t (W_t - sigma t) = S_t (log(S_t / S0) - (r + sigma^2 / 2) t) / sigma
+        t = dt * np.arange(first_step, first_step + k)[:, None]
+        vega = P * (L - log_S0 - (r + 0.5 * sigma**2) * t) / sigma
+        total += P.sum(axis = 0)
+        total_vega += vega.sum(axis = 0)
+        columns = np.arange(m)
+        for extreme, vega_extreme, pick, better in ((maximum, maximum_vega, np.argmax, np.greater),
+                                                    (minimum, minimum_vega, np.argmin, np.less)):
+            i = pick(P, axis = 0)
+            new = better(P[i, columns], extreme)
+            extreme[new], vega_extreme[new] = P[i, columns][new], vega[i, columns][new]
+
+        if first_step + k == n:
+            yield first_path, {'S0': S0, 'terminal': P[-1], 'terminal_vega': vega[-1], 'average': total / (n - 1),
+                               'average_vega': total_vega / (n - 1), 'maximum': maximum, 'maximum_vega': maximum_vega,
+                               'minimum': minimum, 'minimum_vega': minimum_vega, 'delta_score': delta_score,
+                               'vega_score': vega_score}
+
+def price(products, S0, r, sigma, T, dt, N, alpha = (0.95, 0.99), chunk_paths = 2**14, chunk_steps = None, seed = None):
+    """Price products and estimate their Greeks, and the risk of the asset, from one batch of GBM paths.
+
+    Args:
+        products (dict): Name -> product (european(100), asian(100, 'put'), barrier(100, 120), lookback(), ...).
+        S0, r, sigma, T, dt, N: As in gbm_paths (r is the risk-free rate).
+        alpha (tuple): Confidence levels of VaR and CVaR.
+        chunk_paths, chunk_steps: Block sizes of gbm_chunks (memory: one block of chunk_paths x chunk_steps prices).
+        seed: Seed (int, SeedSequence or np.random.Generator) of the random numbers.
+
+    Returns:
+        dict: name -> {'price', 'delta_pathwise', 'vega_pathwise', 'gamma', 'delta_lr', 'vega_lr', each with its
+              standard error under the key + '_stderr' (pathwise and gamma None when not applicable)};
+              'risk': {'var': {alpha: VaR}, 'cvar': {alpha: CVaR}} of the loss S0 - S_T;
+              'paths', 'seconds', 'paths_per_second'.
+    """
+    start = time.perf_counter()
+    discount = np.exp(-r * T)
+    sums = {name: {} for name in products}
+    terminal = np.empty(N)
+
+    def accumulate(totals, key, values):
+        if values is not None:
+            values = discount * values
+            s, s2 = totals.get(key, (0.0, 0.0))
+            totals[key] = (s + values.sum(), s2 + np.square(values).sum())
+
+    for first_path, state in _blocks(S0, r, sigma, T, dt, N, chunk_paths, chunk_steps, seed):
+        terminal[first_path:first_path + state['terminal'].size] = state['terminal']
+        for name, product in products.items():
+            payoff, delta, vega = product(state)
+            accumulate(sums[name], 'price', payoff)
+            accumulate(sums[name], 'delta_pathwise', delta)
+            accumulate(sums[name], 'vega_pathwise', vega)
+            accumulate(sums[name], 'delta_lr', payoff * state['delta_score'])
+            accumulate(sums[name], 'vega_lr', payoff * state['vega_score'])
+            if delta is not None:
+                # d/dS0 E[h] for the pathwise delta h: likelihood ratio of h, plus its explicit dependence -h / S0
+                accumulate(sums[name], 'gamma', delta * (state['delta_score'] - 1 / S0))
+
+    results = {}
+    for name, totals in sums.items():
+        results[name] = {}
+        for key in ('price', 'delta_pathwise', 'vega_pathwise', 'gamma', 'delta_lr', 'vega_lr'):
+            if key not in totals:
+                results[name][key] = results[name][key + '_stderr'] = None
+                continue
+            s, s2 = totals[key]
+            mean = s / N
+            results[name][key] = mean
+            results[name][key + '_stderr'] = np.sqrt(max(s2 / N - mean**2, 0) / max(N - 1, 1))
+
+    loss = S0 - terminal
+    var = {a: float(np.quantile(loss, a)) for a in alpha}
+    results['risk'] = {'var': var, 'cvar': {a: float(loss[loss >= var[a]].mean()) for a in alpha}}
+    seconds = time.perf_counter() - start
+    results.update(paths = N, seconds = seconds, paths_per_second = N / seconds)
+    return results
+
+def black_scholes(S0, strike, r, sigma, T, option = 'call'):
+    """Black-Scholes price, delta, gamma and vega of a European option."""
+    d1 = (np.log(S0 / strike) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
+    d2 = d1 - sigma * np.sqrt(T)
+    if option == 'call':
+        value, delta = S0 * norm.cdf(d1) - strike * np.exp(-r * T) * norm.cdf(d2), norm.cdf(d1)
+    else:
+        value, delta = strike * np.exp(-r * T) * norm.cdf(-d2) - S0 * norm.cdf(-d1), norm.cdf(d1) - 1
+    return {'price': value, 'delta': delta, 'gamma': norm.pdf(d1) / (S0 * sigma * np.sqrt(T)), 'vega': S0 * norm.pdf(d1) * np.sqrt(T)}
+
+def gbm_risk(S0, r, sigma, T, alpha = (0.95, 0.99)):
+    """Exact VaR and CVaR of the loss S0 - S_T, S_T lognormal."""
+    mu, s = np.log(S0) + (r - 0.5 * sigma**2) * T, sigma * np.sqrt(T)
+    var, cvar = {}, {}
+    for a in alpha:
+        z = norm.ppf(1 - a)                                  # the loss exceeds VaR when S_T is below its 1 - a quantile
+        var[a] = S0 - np.exp(mu + s * z)
+        cvar[a] = S0 - np.exp(mu + 0.5 * s**2) * norm.cdf(z - s) / (1 - a)
+    return {'var': var, 'cvar': cvar}
+
+if __name__ == '__main__':
+    # The parameters of GBM.py, with r as the risk-free rate
+    S0, r, sigma, T, dt, N = 100, 0.05, 0.2, 1, 0.01, 10**6
+    products = {
+        'european call': european(100),
+        'european put': european(100, 'put'),
+        'asian call': asian(100),
+        'up-and-out call': barrier(100, 130),
+        'up-and-in call': barrier(100, 130, knock = 'up-and-in'),
+        'lookback call': lookback(100),
+        'floating lookback put': lookback(option = 'put'),
+    }
+    results = price(products, S0, r, sigma, T, dt, N, seed = 0)
+    print(N, 'paths of', int(T / dt), 'steps,', format(results['paths_per_second'], '.0f'), 'paths/s')
+    for name in products:
+        line = '{:<22}'.format(name)
+        for key in ('price', 'delta_pathwise', 'delta_lr', 'vega_pathwise', 'vega_lr', 'gamma'):
+            if results[name][key] is not None:
+                line += '  {} {:.4f} ({:.4f})'.format(key, results[name][key], results[name][key + '_stderr'])
+        print(line)
+
+    # Check against the closed forms
+    for option in ('call', 'put'):
+        exact = black_scholes(S0, 100, r, sigma, T, option)
+        estimate = results['european ' + option]
+        print('european', option, 'Black-Scholes:', {key: round(value, 4) for key, value in exact.items()}, '- errors in standard errors:',
+              {key: round((estimate[name] - exact[key]) / estimate[name + '_stderr'], 2)
+               for key, name in (('price', 'price'), ('delta', 'delta_pathwise'), ('gamma', 'gamma'), ('vega', 'vega_pathwise'))})
+    print('in + out = european call:', format(results['up-and-out call']['price'] + results['up-and-in call']['price'], '.4f'))
+    exact = gbm_risk(S0, r, sigma, T)
+    for a in (0.95, 0.99):
+        print('VaR {:.0%}: {:.3f} (exact {:.3f}), CVaR: {:.3f} (exact {:.3f})'.format(
+            a, results['risk']['var'][a], exact['var'][a], results['risk']['cvar'][a], exact['cvar'][a]))
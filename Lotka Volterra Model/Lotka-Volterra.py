@@ -1,121 +1,339 @@
-import pandas as pd
+import os
+import sys
 import numpy as np
-import matplotlib.pyplot as plt
-import scipy as ipw
 from scipy import integrate
 
+if __name__ == '__main__':      # run as a script: put the repository root on the path for mathematical_models
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mathematical_models import events, phase_portrait
 
-""" Lotka-Volterra (Predator-Prey)  Mathematical Model 
+
+""" Lotka-Volterra (Predator-Prey)  Mathematical Model
 
    x: Prey , y: Predator (Population)
 
-   System of Differential Equations:    
+   System of Differential Equations:
 
       dx/dt = a*x - b*x*y
 
       dy/dt = d*x*y - g*y   """
 
-# Constants (Parameters describing the interaction of the two species): 
+# Constants (Parameters describing the interaction of the two species):
 
 a = 1       # a*x:   Exponential growth of Prey's population
-b = 0.3     # b*x*y: The rate of predation on the prey 
+b = 0.3     # b*x*y: The rate of predation on the prey
 g = 1.5     # g*y:   Loss rate of the predators due to either natural death or emigration
 d = 0.8     # d*x*y: The growth of the predator population (Note the similarity to the predation rate; however, a different constant is used, as the rate at which the predator population grows is not necessarily equal to the rate at which it consumes the prey)
 x0 = 3      # Initial State of Prey's Population
 y0 = 2      # Initial State of Predator's Population
 
+# Harvest rates (used by derivative_2):
+u = 0.5
+v = 1
+
 def derivative(X, t, a, b, d, g):
     x,y = X
     dotx = x*( a - b*y )
     doty = y*( d*x - g )
     return np.array([dotx, doty])
 
+def derivative_2(X, t, a, b, d, g, u, v):
+    x, y = X
+    dotx = x*( ( a - u ) - b*y)           # change of the function - we add the harvest
+    doty = y*( ( d*x - ( g + v ) ) )
+    return np.array([dotx, doty])
+
+# Jacobian matrices (d derivative_i / d X_j) of the two systems:
+
+def jacobian(X, t, a, b, d, g):
+    x, y = X
+    return np.array([[a - b*y, -b*x],
+                     [d*y, d*x - g]])
+
+def jacobian_2(X, t, a, b, d, g, u, v):
+    return jacobian(X, t, a - u, b, d, g + v)
+
+# One closed orbit, stopped by an event: the prey crosses its equilibrium g/d upwards once per turn
+def lotka_volterra_cycle(X0, a, b, d, g, cycles = 1, t_max = 1000):
+    """Integrate until `cycles` turns of the orbit through X0 are completed.
+
+    Returns:
+        dict: 'period' (mean time of a turn), 'x_range', 'y_range' ((min, max) of prey and predators over the
+              integration), 't', 'X' (the solution, solver steps) and 'end_time'.
+    """
+    result = events.solve_events(derivative, X0, (0, t_max), (a, b, d, g), {'cycle': events.cycle(0, g / d, cycles)},
+                                 jac = jacobian)
+    crossings = result['events']['cycle'][0]
+    X = result['X']
+    return {'period': float(np.diff(crossings).mean()) if crossings.size > 1 else np.nan,
+            'x_range': (float(X[:, 0].min()), float(X[:, 0].max())), 'y_range': (float(X[:, 1].min()), float(X[:, 1].max())),
+            't': result['t'], 'X': X, 'end_time': result['end_time']}
+
+# Conserved quantity and structure-preserving integrator:
+
+""" Along every orbit of the system the quantity
+
+      V = d*x - g*ln(x) + b*y - a*ln(y)
+
+   is constant (the orbits are closed). odeint (LSODA) does not know this: over long horizons its errors add up and
+   the solution slowly spirals away from the orbit, unless the tolerances are made ever finer. In the variables
+   p = ln(x), q = ln(y) the system is Hamiltonian with the separable Hamiltonian H(p, q) = V = (d*e^p - g*p) + (b*e^q - a*q):
+
+      dp/dt = a - b*e^q        dq/dt = d*e^p - g
+
+   and each of the two parts can be integrated exactly. Alternating them (Stormer-Verlet, 2nd order, or Yoshida's
+   composition of three Verlet steps, 4th order) gives a symplectic integrator: the error on V stays bounded by
+   O(dt^order) for all times instead of growing, and x, y stay positive. The harvest system (derivative_2) is the
+   same system with a - u and g + v.   """
+
+# Yoshida's 4th order composition: Verlet steps of w1*dt, w0*dt, w1*dt
+YOSHIDA = (1 / (2 - 2**(1/3)), -2**(1/3) / (2 - 2**(1/3)), 1 / (2 - 2**(1/3)))
+
+def conserved_quantity(X, a, b, d, g):
+    """V = d*x - g*ln(x) + b*y - a*ln(y), for states X = (x, y) (arrays of any shape)."""
+    x, y = X
+    return d*x - g*np.log(x) + b*y - a*np.log(y)
+
+def orbit_amplitude(X0, a, b, d, g):
+    """Exact ranges (min, max) of prey and predators on the orbit through X0, from the conserved quantity.
+
+    The prey is extreme where dx/dt changes sign, i.e. on y = a/b, and the predators on x = g/d: there
+    d*x - g*ln(x) (resp. b*y - a*ln(y)) takes the value V - its minimum over the other variable.
+    """
+    from scipy.optimize import brentq
+
+    V = conserved_quantity(np.asarray(X0, dtype = float), a, b, d, g)
+    ranges = []
+    for c, k, other in [(d, g, b*(a/b) - a*np.log(a/b)), (b, a, d*(g/d) - g*np.log(g/d))]:
+        level, center = V - other, k / c                        # solve c*z - k*ln(z) = level on both sides of center
+        h = lambda z: c*z - k*np.log(z) - level
+        if h(center) >= 0:                                      # X0 is the equilibrium
+            ranges.append((center, center))
+            continue
+        low = center / 2
+        while h(low) < 0:
+            low /= 2
+        high = center * 2
+        while h(high) < 0:
+            high *= 2
+        ranges.append((brentq(h, low, center, xtol = 1e-14), brentq(h, center, high, xtol = 1e-14)))
+    return {'x_range': ranges[0], 'y_range': ranges[1]}
+
+def _poisson_orbits(p0, q0, a, b, d, g, dt, steps, stride, weights, section):
+    n = p0.size
+    points = steps // stride + 1
+    P = np.empty((n, points))
+    Q = np.empty((n, points))
+    drift = np.zeros(n)                 # max |H - H0|
+    crossings = np.zeros(n, dtype = np.int64)
+    first = np.full(n, np.nan)          # first and last upward crossing times of p = section
+    last = np.full(n, np.nan)
+    for k in range(n):
+        p, q = p0[k], q0[k]
+        ep, eq = np.exp(p), np.exp(q)   # e^p = x and e^q = y, each computed once per update
+        H0 = d*ep - g*p + b*eq - a*q
+        P[k, 0], Q[k, 0] = p, q
+        for i in range(1, steps + 1):
+            p_old, eq_old = p, eq
+            for w in weights:
+                h = w * dt
+                q += 0.5 * h * (d*ep - g)
+                p += h * (a - b*np.exp(q))
+                ep = np.exp(p)
+                q += 0.5 * h * (d*ep - g)
+            eq = np.exp(q)
+            if i % stride == 0:
+                P[k, i // stride], Q[k, i // stride] = p, q
+            error = abs(d*ep - g*p + b*eq - a*q - H0)
+            if error > drift[k]:
+                drift[k] = error
+            if p_old < section <= p:
+                # Crossing time: root of the cubic Hermite interpolant of p over the step (dp/dt = a - b*e^q)
+                m0, m1 = dt * (a - b*eq_old), dt * (a - b*eq)
+                s = (section - p_old) / (p - p_old)
+                for _ in range(4):
+                    h00, h10, h01, h11 = 2*s**3 - 3*s**2 + 1, s**3 - 2*s**2 + s, -2*s**3 + 3*s**2, s**3 - s**2
+                    value = h00*p_old + h10*m0 + h01*p + h11*m1 - section
+                    slope = (6*s**2 - 6*s)*p_old + (3*s**2 - 4*s + 1)*m0 + (6*s - 6*s**2)*p + (3*s**2 - 2*s)*m1
+                    if slope == 0:
+                        break
+                    s = min(1.0, max(0.0, s - value / slope))
+                time = (i - 1 + s) * dt
+                if crossings[k] == 0:
+                    first[k] = time
+                last[k] = time
+                crossings[k] += 1
+    return P, Q, drift, crossings, first, last
+
+_compiled_poisson_orbits = None
+
+def _poisson_kernel():
+    """_poisson_orbits, compiled with compiled_rhs.jit on first use (numba is only imported then)."""
+    global _compiled_poisson_orbits
+    if _compiled_poisson_orbits is None:
+        from mathematical_models import compiled_rhs
+        _compiled_poisson_orbits = compiled_rhs.jit(_poisson_orbits)
+    return _compiled_poisson_orbits
+
+def lotka_volterra_poisson(X0, t_max, a, b, d, g, dt = 0.01, order = 4, max_points = 10**4, u = 0, v = 0):
+    """Integrate the predator-prey system with a symplectic integrator in log variables (long horizons).
+
+    Args:
+        X0: Initial state (x0, y0), or initial states of shape (orbits, 2).
+        t_max (float): Final time (e.g. 10**6).
+        a, b, d, g (float): Parameters of the model.
+        dt (float): Time step.
+        order (int): 2 (Stormer-Verlet) or 4 (Yoshida).
+        max_points (int): At most about max_points states are stored per orbit (every stride-th step).
+        u, v (float): Harvest rates (derivative_2): the system with a - u and g + v.
+
+    Returns:
+        dict: 't' (stored times), 'X' (stored states, shape (len(t), 2), or (orbits, len(t), 2)),
+              'V0' (conserved quantity at X0), 'V_drift' (max |V - V0| / |V0| over every step),
+              'period' (mean time between upward crossings of the prey through its equilibrium, nan if fewer
+              than two), 'cycles' (number of such crossings), and the exact 'x_range', 'y_range' of the orbit.
+    """
+    a, g = a - u, g + v
+    if order not in (2, 4):
+        raise ValueError('order must be 2 or 4')
+    X0 = np.asarray(X0, dtype = float)
+    single = X0.ndim == 1
+    X0 = np.atleast_2d(X0)
+    steps = int(np.ceil(t_max / dt))
+    stride = max(1, int(np.ceil(steps / max_points)))
+    weights = np.array(YOSHIDA if order == 4 else (1.0,))
+    P, Q, drift, cycles, first, last = _poisson_kernel()(np.log(X0[:, 0]), np.log(X0[:, 1]), float(a), float(b), float(d),
+                                                         float(g), float(dt), steps, stride, weights, float(np.log(g / d)))
+    V0 = conserved_quantity(X0.T, a, b, d, g)
+    with np.errstate(invalid = 'ignore'):
+        period = np.where(cycles > 1, (last - first) / np.maximum(cycles - 1, 1), np.nan)
+    amplitudes = [orbit_amplitude(x0, a, b, d, g) for x0 in X0]
+    X = np.exp(np.stack([P, Q], axis = -1))
+    result = {'t': np.arange(P.shape[1]) * stride * dt, 'X': X, 'V0': V0, 'V_drift': drift / np.abs(V0),
+              'period': period, 'cycles': cycles, 'x_range': np.array([r['x_range'] for r in amplitudes]),
+              'y_range': np.array([r['y_range'] for r in amplitudes])}
+    if single:
+        result.update({name: result[name][0] for name in ('X', 'V0', 'V_drift', 'period', 'cycles', 'x_range', 'y_range')})
+    return result
+
+def plot_conserved_quantity(X0, t_max, a, b, d, g, dt = 0.01):
+    """Relative error on V along the solution of odeint and of the symplectic integrator."""
+    import matplotlib.pyplot as plt
+
+    result = lotka_volterra_poisson(X0, t_max, a, b, d, g, dt = dt, max_points = 5000)
+    t = result['t']
+    Xf = integrate.odeint(derivative, X0, t, args = (a, b, d, g), Dfun = jacobian, mxstep = 10**6)
+    V0 = result['V0']
+    plt.figure()
+    plt.semilogy(t[1:], np.abs(conserved_quantity(Xf[1:].T, a, b, d, g) - V0) / abs(V0), label = 'odeint (LSODA)')
+    plt.semilogy(t[1:], np.abs(conserved_quantity(result['X'][1:].T, a, b, d, g) - V0) / abs(V0), label = 'Symplectic, order 4, dt = '+str(dt))
+    plt.xlabel('Time t')
+    plt.ylabel('Relative error on V')
+    plt.title('Drift of the conserved quantity')
+    plt.legend()
+    plt.show()
+
 """  Odeint Method:  """
 
-Nt = 1000
-tmax = 30
-t = np.linspace(0, tmax, Nt)  # Nt:samples, from 0 to tmax   (We need to have many samples in order to have a "good" graph)
-X0 = [x0, y0]                                                     # Initial State
-res = integrate.odeint(derivative, X0, t, args = (a, b, d, g))    # Solve the O.D.E
-x, y = res.T                                                      # .T : reverses the order of the axes
-plt.figure()
-plt.grid()                                                        # To have grid on the graph
-plt.title('Odeint Method')
-plt.plot(t, x, '.b', label = 'Prey')                              # x, y: solution of the O.D.E
-plt.plot(t, y, '-r', label = 'Predator' )
-plt.xlabel('Time t, [Days]')
-plt.ylabel('Population')
-plt.legend()
-plt.show()
+def plot_odeint(X0, t, a, b, d, g):
+    import matplotlib.pyplot as plt
+
+    res = integrate.odeint(derivative, X0, t, args = (a, b, d, g), Dfun = jacobian)    # Solve the O.D.E
+    x, y = res.T                                                      # .T : reverses the order of the axes
+    plt.figure()
+    plt.grid()                                                        # To have grid on the graph
+    plt.title('Odeint Method')
+    plt.plot(t, x, '.b', label = 'Prey')                              # x, y: solution of the O.D.E
+    plt.plot(t, y, '-r', label = 'Predator' )
+    plt.xlabel('Time t, [Days]')
+    plt.ylabel('Population')
+    plt.legend()
+    plt.show()
 
 
 """------------------------------------------------------------"""
 
 """  Phase - Space Graph:  """
 
-plt.figure()
-I = np.linspace(1.0, 6.0, 15)  # (prey's population initial state from 1.0, to 6.0, Number of Samples), generates 15 rational numbers from 1 to 6
-for prey in I:
-    X0 = [prey, 1.0]
-    Xf = integrate.odeint(derivative, X0, t, args = (a, b, d, g))       # Xf: The solutions of the ODE for different X0 each time
-    plt.plot(Xf[:, 0], Xf[:, 1], "-", label = "$x_0 = $"+str(X0[0]))   
-plt.xlabel('Prey')
-plt.ylabel('Predator')
-plt.legend()
-plt.title('Phase - Space')                                              # Where the center is the saddle point: (g/d, a/b)
-plt.show()
+def plot_phase_space(I, t, a, b, d, g):
+    import matplotlib.pyplot as plt
+
+    seeds = np.stack([I, np.ones_like(I)], axis = 1)                        # X0 = [prey, 1.0] for every prey in I
+    paths = phase_portrait.trajectories(derivative, seeds, t, (a, b, d, g), jac = jacobian)   # All the solutions in one batch
+    plt.figure()
+    for X0, Xf in zip(seeds, paths):
+        plt.plot(Xf[:, 0], Xf[:, 1], "-", label = "$x_0 = $"+str(X0[0]))
+    plt.xlabel('Prey')
+    plt.ylabel('Predator')
+    plt.legend()
+    plt.title('Phase - Space')                                              # Where the center is the saddle point: (g/d, a/b)
+    plt.show()
 
 
 """------------------------------------------------------------"""
 
 """  Direction Field:  """
 
-x = np.linspace(0, 6, 15)     # Generates 15 numbers from 0 to 6
-y = np.linspace(0, 6, 15)
-X1, Y1 = np.meshgrid(x, y)    # Making a matrice with dimensions x*y
-D = [X1, Y1]
-Dx1, Dy1 = derivative(D, t = 0, a = 1, b = 1, d = 0.75, g = 1.5)
-plt.figure()
-plt.title('Direction Field')
-Q = plt.quiver(X1,Y1, Dx1, Dy1, pivot = 'mid', cmap = plt.cm.jet)   # vectors (X1,Dx1), (Y1, Dy1)
+def plot_direction_field(I, t, a, b, d, g, resolution = 15):
+    import matplotlib.pyplot as plt
 
-# Add the same as the above Graph: (Because we want to see the direction fields inside the phase - space )
+    # The field on a resolution x resolution grid of [0, 6] x [0, 6], in one call of derivative
+    field = phase_portrait.vector_field(derivative, np.linspace(0, 6, resolution), np.linspace(0, 6, resolution), (a, b, d, g))
+    plt.figure()
+    plt.title('Direction Field')
+    Q = phase_portrait.plot_field(field, stride = 1 if resolution <= 30 else None)   # vectors (X1,Dx1), (Y1, Dy1)
 
-I = np.linspace(1.0, 6.0, 15)  
-for prey in I:
-    X0 = [prey, 1.0]
-    Xf = integrate.odeint(derivative, X0, t, args = (a, b, d, g))
-    plt.plot(Xf[:, 0], Xf[:, 1], "-", label = "$x_0 = $"+str(X0[0]))   
-plt.xlabel('Prey')
-plt.ylabel('Predator')
-plt.legend()    
-plt.show()
+    # Add the same as the above Graph: (Because we want to see the direction fields inside the phase - space )
+
+    seeds = np.stack([I, np.ones_like(I)], axis = 1)
+    paths = phase_portrait.trajectories(derivative, seeds, t, (a, b, d, g), jac = jacobian)
+    for X0, Xf in zip(seeds, paths):
+        plt.plot(Xf[:, 0], Xf[:, 1], "-", label = "$x_0 = $"+str(X0[0]))
+    plt.xlabel('Prey')
+    plt.ylabel('Predator')
+    plt.legend()
+    plt.show()
 
 
 """------------------------------------------------------------"""
 
 """  Phase - Space Graph with & without harvest:  """
 
-u = 0.5
-v = 1
+def plot_harvest(I, t, a, b, d, g, u, v):
+    import matplotlib.pyplot as plt
 
-def derivative_2(X, t, a, b, d, g, u, v):
-    x, y = X
-    dotx = x*( ( a - u ) - b*y)           # change of the function - we add the harvest
-    doty = y*( ( d*x - ( g + v ) ) )
-    return np.array([dotx, doty])
+    plt.figure()
+    for prey in I:
+        X0 = [prey, 1.0]
+        Xf = integrate.odeint(derivative, X0, t, args = (a, b, d, g), Dfun = jacobian)
+        plt.plot(Xf[:, 0], Xf[:, 1], "-", label = "$x_0 = $"+str(X0[0]))
+
+        Xz = integrate.odeint(derivative_2, X0, t, args = (a, b, d, g, u, v), Dfun = jacobian_2)  # Solution
+        plt.plot(Xz[:, 0], Xz[:, 1], "-", label = "$x_0 = $"+str(X0[0]))       # We add the case of harvest into the graph
+
+    plt.xlabel('Prey')
+    plt.ylabel('predator')
+    plt.title('Phase - Space Graph with and without harvest')                   # Center of the Harvest - Graph is ( (g+v)/d, (a-u)/b )
+    plt.show()
+
+if __name__ == '__main__':
+    Nt = 1000
+    tmax = 30
+    t = np.linspace(0, tmax, Nt)  # Nt:samples, from 0 to tmax   (We need to have many samples in order to have a "good" graph)
+    X0 = [x0, y0]                 # Initial State
+
+    plot_odeint(X0, t, a, b, d, g)
 
-plt.figure()
-I = np.linspace(1.0, 6.0, 1)              # Only 1 Sample to see the difference of the graphs
-for prey in I:
-    X0 = [prey, 1.0]
-    Xf = integrate.odeint(derivative, X0, t, args = (a, b, d, g))
-    plt.plot(Xf[:, 0], Xf[:, 1], "-", label = "$x_0 = $"+str(X0[0]))
+    I = np.linspace(1.0, 6.0, 15)  # (prey's population initial state from 1.0, to 6.0, Number of Samples), generates 15 rational numbers from 1 to 6
+    plot_phase_space(I, t, a, b, d, g)
+    plot_direction_field(I, t, a, b, d, g)
 
-    Xz = integrate.odeint(derivative_2, X0, t, args = (a, b, d, g, u, v))  # Solution
-    plt.plot(Xz[:, 0], Xz[:, 1], "-", label = "$x_0 = $"+str(X0[0]))       # We add the case of harvest into the graph
+    I = np.linspace(1.0, 6.0, 1)   # Only 1 Sample to see the difference of the graphs
+    plot_harvest(I, t, a, b, d, g, u, v)
 
-plt.xlabel('Prey')
-plt.ylabel('predator')
-plt.title('Phase - Space Graph with and without harvest')                   # Center of the Harvest - Graph is ( (g+v)/d, (a-u)/b )
-plt.show()
+    # Long horizons: the symplectic integrator keeps the orbit (V constant), odeint slowly drifts away from it
+    plot_conserved_quantity(X0, 10**4, a, b, d, g)
+    for name, harvest in [('without', (0, 0)), ('with', (u, v))]:
+        orbit = lotka_volterra_poisson(X0, 10**6, a, b, d, g, dt = 0.05, u = harvest[0], v = harvest[1])
+        print('10^6 days', name, 'harvest: period', format(orbit['period'], '.6f'), ', prey in', np.round(orbit['x_range'], 4),
+              ', predators in', np.round(orbit['y_range'], 4), ', relative drift of V', format(orbit['V_drift'], '.1e'))
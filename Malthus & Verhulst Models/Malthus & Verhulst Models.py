@@ -1,7 +1,12 @@
+import os
+import sys
 import numpy as np
-import matplotlib.pyplot as plt
 from scipy.integrate import odeint
 
+if __name__ == '__main__':      # run as a script: put the repository root on the path for mathematical_models
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mathematical_models import result_cache
+
 """   Malthus Growth Model / Simple Exponential Growth Model   """
 
 # Malthusian growth model
@@ -10,6 +15,21 @@ def malthus_model(Y, t, r):
     dPdt = r * P
     return dPdt
 
+def malthus_jacobian(Y, t, r):
+    return r * np.ones_like(Y)
+
+# Exact solution: P(t) = P0 * exp(r*t)
+def malthus_solution(P0, r, t):
+    """
+    Parameters:
+     - P0, r : Initial population(s) and growth rate(s), scalars or arrays (broadcast against each other).
+     - t : Time points for the simulation.
+
+    Returns: array of shape broadcast(P0, r).shape + (len(t),)
+    """
+    P0, r = np.broadcast_arrays(np.asarray(P0, dtype = float), np.asarray(r, dtype = float))
+    return P0[..., None] * np.exp(r[..., None] * np.asarray(t, dtype = float))
+
 # Plot
 def plot_malthus_model(P0, r, t):
    
@@ -20,8 +40,9 @@ def plot_malthus_model(P0, r, t):
     - t : Time points for the simulation.
 
     """
-   solution = odeint(malthus_model, P0, t, args = (r,))
-   P = solution
+   import matplotlib.pyplot as plt
+
+   P = malthus_solution(P0, r, t)
    # Plot the results:
    plt.figure()
    plt.grid()
@@ -32,28 +53,15 @@ def plot_malthus_model(P0, r, t):
    plt.legend()
    plt.show()
 
-# Initial Population:
-P0 = 100
-
-# Population growth rate:
-r = 0.2
+# Compare different cases of growth rate r (any number of cases)
+def compare_r_cases(*r_cases, P0, t):
+    import matplotlib.pyplot as plt
 
-# Time points for the simulation
-t = np.linspace(0, 10, 11)     
-
-plot_malthus_model(P0, r, t)
-
-# Compare different cases of growth rate r
-def compare_r_cases(r_1, r_2, r_3, P0, t):
-    solution_1 = odeint(malthus_model, P0, t, args = (r_1,))
-    solution_2 = odeint(malthus_model, P0, t, args = (r_2,))
-    solution_3 = odeint(malthus_model, P0, t, args = (r_3,))
-    P1, P2, P3 = solution_1, solution_2, solution_3
+    P = cached_growth_model(malthus_model, P0, t, np.array(r_cases))
     plt.figure()
     plt.grid()
-    plt.plot(t, P1, 'b', label = 'Population with growth rate r = '+str(r_1))
-    plt.plot(t, P2, 'orange', label = 'Population with growth rate r = '+str(r_2))
-    plt.plot(t, P3, 'r', label = 'Population with growth rate r = '+str(r_3))
+    for i, r in enumerate(r_cases):
+        plt.plot(t, P[i], case_color(i), label = 'Population with growth rate r = '+str(r))
     plt.xlabel('Time [days]')
     plt.ylabel('Number of individuals')
     plt.ylim([0, 400])  # Optional
@@ -61,8 +69,6 @@ def compare_r_cases(r_1, r_2, r_3, P0, t):
     plt.legend()
     plt.show()
 
-compare_r_cases(0.2, 0, -0.2, P0 = 100, t = np.linspace(0, 10, 11))
-
 "---------------------------------------------------------------------------------------"
 
 """   Verhulst Logistic Growth Model   """
@@ -72,6 +78,45 @@ def logistic_model(Y, t, k, K):
     dPdt = k * P * (1 - (P / K))
     return dPdt
 
+def logistic_jacobian(Y, t, k, K):
+    P = Y
+    return k * (1 - 2 * P / K)
+
+# Exact solution: P(t) = K * P0 / (P0 + (K - P0) * exp(-k*t))
+def logistic_solution(P0, k, K, t):
+    """
+    Parameters:
+     - P0, k, K : Initial population(s), growth rate coefficient(s) and carrying capacity(ies),
+                  scalars or arrays (broadcast against each other).
+     - t : Time points for the simulation.
+
+    Returns: array of shape broadcast(P0, k, K).shape + (len(t),)
+    """
+    P0, k, K = (v[..., None] for v in np.broadcast_arrays(*(np.asarray(v, dtype = float) for v in (P0, k, K))))
+    return K * P0 / (P0 + (K - P0) * np.exp(-k * np.asarray(t, dtype = float)))
+
+# Time at which the logistic curve reaches a fraction of the carrying capacity K (the event P = fraction * K,
+# solved exactly from the closed form): t = ln(fraction * (K - P0) / ((1 - fraction) * P0)) / k
+def logistic_time_to_fraction(P0, k, K, fraction = 0.9):
+    """
+    Parameters:
+     - P0, k, K : As in logistic_solution (scalars or arrays, broadcast against each other).
+     - fraction : Fraction of K to reach (0 < fraction < 1).
+
+    Returns: the time(s) at which P crosses fraction * K: rising to it for k > 0, falling through it for k < 0
+             (P then decays from K towards 0, and never rises). 0 if P0 is already beyond it in the direction P moves
+             (k > 0: P0 >= fraction * K, below K; k < 0: P0 <= fraction * K; k = 0: P0 = fraction * K),
+             np.inf if P never gets there (P0 > K, or k = 0 with P0 != fraction * K).
+    """
+    P0, k, K = np.broadcast_arrays(*(np.asarray(v, dtype = float) for v in (P0, k, K)))
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        time = np.log(fraction * (K - P0) / ((1 - fraction) * P0)) / k
+    past = np.where(k > 0, P0 >= fraction * K, P0 <= fraction * K)      # growing towards K or decaying towards 0
+    time = np.where(past, 0.0, time)
+    time = np.where(P0 > K, np.inf, time)       # above K: P stays above K (k > 0) or blows up (k < 0), never back to fraction * K
+    time = np.where(k == 0, np.where(P0 == fraction * K, 0.0, np.inf), time)     # constant curve
+    return np.where(np.isfinite(time) & (time >= 0), time, np.inf)
+
 # Plot
 def plot_logistic_model(P0, k, K, t):
 
@@ -83,8 +128,9 @@ def plot_logistic_model(P0, k, K, t):
     - t : Time points for the simulation.
 
     """
-    solution = odeint(logistic_model, P0, t, args = (k, K) )
-    P = solution
+    import matplotlib.pyplot as plt
+
+    P = logistic_solution(P0, k, K, t)
    # Plot the results:
     plt.figure()
     plt.grid()
@@ -95,31 +141,15 @@ def plot_logistic_model(P0, k, K, t):
     plt.legend()
     plt.show()
 
-# Initial Population:
-P0 = 100
-
-# Carrying Capacity:
-K = 1000
-
-# Relative Growth Rate Coefficient:
-k = 0.3
-
-# Time points for the simulation
-t = np.linspace(0, 50, 51)
+# Compare different cases of relative growth rate coefficient k (any number of cases)
+def compare_k_cases(*k_cases, P0, K, t):
+    import matplotlib.pyplot as plt
 
-plot_logistic_model(P0, k, K, t)
-
-# Compare different cases of relative growth rate coefficient k
-def compare_k_cases(k_1, k_2, k_3, P0, K, t):
-    solution_1 = odeint(logistic_model, P0, t, args = (k_1, K))
-    solution_2 = odeint(logistic_model, P0, t, args = (k_2, K))
-    solution_3 = odeint(logistic_model, P0, t, args = (k_3, K))
-    P1, P2, P3 = solution_1, solution_2, solution_3
+    P = cached_growth_model(logistic_model, P0, t, np.array(k_cases), K)
     plt.figure()
     plt.grid()
-    plt.plot(t, P1, 'b', label = 'Population with relative growth rate coefficient k = '+str(k_1))
-    plt.plot(t, P2, 'orange', label = 'Population with relative growth rate coefficient k = '+str(k_2))
-    plt.plot(t, P3, 'r', label = 'Population with relative growth rate coefficient k = '+str(k_3))
+    for i, k in enumerate(k_cases):
+        plt.plot(t, P[i], case_color(i), label = 'Population with relative growth rate coefficient k = '+str(k))
     plt.xlabel('Time [days]')
     plt.ylabel('Number of individuals')
     plt.ylim([0, 1000])  # Optional
@@ -127,4 +157,74 @@ def compare_k_cases(k_1, k_2, k_3, P0, K, t):
     plt.legend()
     plt.show()
 
-compare_k_cases(0.3, 0, -0.3, P0 = 100, K = 1000, t = np.linspace(0, 50, 51))
+"---------------------------------------------------------------------------------------"
+
+"""   Solving many growth curves at once   """
+
+# Closed forms and derivatives dmodel/dP of the models above
+CLOSED_FORMS = {malthus_model: malthus_solution, logistic_model: logistic_solution}
+JACOBIANS = {malthus_model: malthus_jacobian, logistic_model: logistic_jacobian}
+
+def solve_growth_model(model, P0, t, *params, method = 'auto', jacobian = None):
+    """
+    Solve a one-dimensional growth model dP/dt = model(P, t, *params) for many cases at once.
+
+    Parameters:
+     - model : malthus_model, logistic_model, or any user-supplied variant with the same signature.
+               User-supplied models must work elementwise on arrays (as the models above do).
+     - P0, *params : Initial population(s) and model parameters, scalars or arrays (broadcast against each other).
+     - t : Time points for the simulation.
+     - method : 'auto' uses the exact solution when the model has one and odeint otherwise,
+                'exact' requires the exact solution, 'odeint' always integrates numerically.
+     - jacobian : dmodel/dP with the same signature as model (elementwise), for the numerical integration.
+
+    Returns: array of shape broadcast(P0, *params).shape + (len(t),)
+    """
+    if method not in ('auto', 'exact', 'odeint'):
+        raise ValueError("method must be 'auto', 'exact' or 'odeint'")
+    if method != 'odeint' and model in CLOSED_FORMS:
+        return CLOSED_FORMS[model](P0, *params, t)
+    if method == 'exact':
+        raise ValueError('No exact solution is known for '+getattr(model, '__name__', str(model)))
+
+    # Numerical fallback: every case is an independent scalar O.D.E, so all of them are stacked
+    # into one state vector with a diagonal Jacobian (ml = mu = 0) and integrated by a single odeint call
+    arrays = np.broadcast_arrays(*(np.asarray(v, dtype = float) for v in (P0,) + params))
+    shape = arrays[0].shape
+    P0, params = arrays[0].ravel(), tuple(v.ravel() for v in arrays[1:])
+    jacobian = jacobian or JACOBIANS.get(model)
+    Dfun = None if jacobian is None else (lambda P, t, *params: np.broadcast_to(jacobian(P, t, *params), P.shape)[None, :])
+    solution = odeint(model, P0, t, args = params, Dfun = Dfun, ml = 0, mu = 0)
+    return solution.T.reshape(shape + (len(t),))
+
+# Same, with the curves kept (read-only) in result_cache.default_cache, for the comparison plots
+cached_growth_model = result_cache.memoize('growth_model')(solve_growth_model)
+
+# Line colors of the comparison plots
+def case_color(i):
+    return ['b', 'orange', 'r'][i] if i < 3 else 'C{}'.format(i)
+
+if __name__ == '__main__':
+    # Initial Population:
+    P0 = 100
+
+    # Population growth rate:
+    r = 0.2
+
+    # Time points for the simulation
+    t = np.linspace(0, 10, 11)
+
+    plot_malthus_model(P0, r, t)
+    compare_r_cases(0.2, 0, -0.2, P0 = 100, t = np.linspace(0, 10, 11))
+
+    # Carrying Capacity:
+    K = 1000
+
+    # Relative Growth Rate Coefficient:
+    k = 0.3
+
+    # Time points for the simulation
+    t = np.linspace(0, 50, 51)
+
+    plot_logistic_model(P0, k, K, t)
+    compare_k_cases(0.3, 0, -0.3, P0 = 100, K = 1000, t = np.linspace(0, 50, 51))
@@ -1,5 +1,4 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import random
 
 def coin_flip():
@@ -32,7 +31,23 @@ def monte_carlo(iterations):
         tail_probabilities.append(prob_tail)
     return head_probabilities, tail_probabilities
 
+def count_flips(iterations, seed = None):
+    """Flip a coin a specified number of times and count the outcomes (vectorized).
+
+    Args:
+        iterations (int): The number of times to flip the coin.
+        seed: Seed (int, SeedSequence or np.random.Generator) of the random numbers.
+
+    Returns:
+        dict: Counters {'flips', 'heads', 'tails'}, which can be summed across independent runs.
+    """
+    rng = np.random.default_rng(seed)
+    heads = int(np.count_nonzero(rng.integers(0, 2, size = iterations, dtype = np.int8) == 0))
+    return {'flips': iterations, 'heads': heads, 'tails': iterations - heads}
+
 def run_the_simulation(iterations):
+    import matplotlib.pyplot as plt
+
     heads, tails = monte_carlo(iterations)
     """ 
     Plot the results : 
@@ -53,4 +68,5 @@ def run_the_simulation(iterations):
     print('Percentage of Heads: '+heads_per)
     print('\nPercentage of Tails: '+tails_per)
 
-run_the_simulation(iterations = 1000)
\ No newline at end of file
+if __name__ == '__main__':
+    run_the_simulation(iterations = 1000)
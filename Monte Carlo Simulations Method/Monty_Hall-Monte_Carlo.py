@@ -1,43 +1,139 @@
-import random
-import matplotlib.pyplot as plt
+import numpy as np
 
 """ Solving the Monty Hall Problem with Monte Carlo Simulation """
 
-Doors = ['goat', 'car', 'goat']
-
-def monte_carlo(iterations):
-    switchdoor_win_probability = []
-    stickdoor_win_probability = []
-    switch_win = 0                            # Counters
-    stick_win = 0
-    for i in range(iterations):
-        random.shuffle(Doors)
-        door = random.randrange(0,2)
-        choice = Doors[door]
-        if choice != 'car':                      # Switching would be the right move
-            switch_win += 1
-        else:                                    # Sticking would be the right move
-            stick_win += 1
-        win_by_switch_prob = switch_win / (i+1)          
-        win_by_stick_prob = stick_win / (i+1)
-        switchdoor_win_probability.append(win_by_switch_prob)
-        stickdoor_win_probability.append(win_by_stick_prob)
+"""
+ Host behaviours: given the car and the first choice of every game, the host gives every door a priority
+ and opens the doors with the lowest priorities (np.inf: never opened, always used for the first choice).
+
+    'standard': knows where the car is, opens goat doors at random
+    'ignorant': opens doors at random, it may reveal the car (those games are not counted)
+    'lowest':   knows where the car is, opens the lowest numbered goat doors
+
+ Any function host(rng, car, choice, doors) -> priorities of shape (games, doors) can be used as well.
+"""
+
+def standard_host(rng, car, choice, doors):
+    priority = rng.random((car.size, doors))
+    priority[np.arange(car.size), car] = np.inf
+    return priority
+
+def ignorant_host(rng, car, choice, doors):
+    return rng.random((car.size, doors))
+
+def lowest_host(rng, car, choice, doors):
+    priority = np.tile(np.arange(doors, dtype = float), (car.size, 1))
+    priority[np.arange(car.size), car] = np.inf
+    return priority
+
+HOSTS = {'standard': standard_host, 'ignorant': ignorant_host, 'lowest': lowest_host}
+
+def play_games(games, rng, doors, opened, host):
+    """Play a batch of games and return (valid, switch_win, stick_win) boolean arrays of shape (games,)."""
+    rows = np.arange(games)
+    car = rng.integers(0, doors, size = games)
+    choice = rng.integers(0, doors, size = games)
+
+    # The host opens the `opened` doors with the lowest priority (never the first choice)
+    priority = host(rng, car, choice, doors)
+    priority[rows, choice] = np.inf
+    opened_doors = np.argpartition(priority, opened - 1, axis = 1)[:, :opened]
+    valid = ~(opened_doors == car[:, None]).any(axis = 1)         # Games where the host revealed the car don't count
+
+    # Switching: pick one of the remaining closed doors at random
+    pick = rng.random((games, doors))
+    pick[rows, choice] = np.inf
+    pick[rows[:, None], opened_doors] = np.inf
+    switch = pick.argmin(axis = 1)
+
+    return valid, valid & (switch == car), valid & (choice == car)
+
+def simulate(iterations, doors = 3, opened = 1, host = 'standard', record_every = None, seed = None, max_bytes = 2**25):
+    """Simulate the Monty Hall game, vectorized over chunks of games.
+
+    Args:
+        iterations (int): The number of games.
+        doors (int): Number of doors (one car, goats behind the others).
+        opened (int): Number of doors the host opens (at most doors - 2).
+        host (str or function): Host behaviour, see HOSTS.
+        record_every (int): Record the running winning probabilities every `record_every` games (None: don't record).
+        seed: Seed (int, SeedSequence or np.random.Generator) of the random numbers.
+        max_bytes (int): Approximate memory budget of a chunk of games.
+
+    Returns:
+        dict: Counters 'games', 'valid' (games where the car was not revealed), 'switch_win', 'stick_win',
+              the final probabilities 'switch_prob' and 'stick_prob' (over the valid games),
+              and when recording: 'recorded_games', 'switch_curve', 'stick_curve' (running probabilities).
+    """
+    if not 1 <= opened <= doors - 2:
+        raise ValueError('The host must open between 1 and doors - 2 doors')
+    host = HOSTS[host] if isinstance(host, str) else host
+    rng = np.random.default_rng(seed)
+    chunk = max(1, max_bytes // (16 * doors))
+
+    valid_total = switch_total = stick_total = 0
+    recorded, switch_curve, stick_curve = [], [], []
+    for start in range(0, iterations, chunk):
+        games = min(chunk, iterations - start)
+        valid, switch_win, stick_win = play_games(games, rng, doors, opened, host)
+        if record_every:
+            # Game numbers (1, 2, ...) of this chunk that are multiples of record_every
+            first = -(start + 1) % record_every
+            index = np.arange(first, games, record_every)
+            valid_so_far = valid_total + np.cumsum(valid)[index]
+            denominator = np.maximum(valid_so_far, 1)
+            switch_curve.append((switch_total + np.cumsum(switch_win)[index]) / denominator)
+            stick_curve.append((stick_total + np.cumsum(stick_win)[index]) / denominator)
+            recorded.append(start + index + 1)
+        valid_total += int(valid.sum())
+        switch_total += int(switch_win.sum())
+        stick_total += int(stick_win.sum())
+
+    result = {'games': iterations, 'valid': valid_total, 'switch_win': switch_total, 'stick_win': stick_total,
+              'switch_prob': switch_total / max(valid_total, 1), 'stick_prob': stick_total / max(valid_total, 1)}
+    if record_every:
+        result['recorded_games'] = np.concatenate(recorded) if recorded else np.zeros(0, dtype = int)
+        result['switch_curve'] = np.concatenate(switch_curve) if switch_curve else np.zeros(0)
+        result['stick_curve'] = np.concatenate(stick_curve) if stick_curve else np.zeros(0)
+    return result
+
+def monte_carlo(iterations, seed = None):
+    result = simulate(iterations, record_every = 1, seed = seed)
+    switchdoor_win_probability = result['switch_curve'].tolist()
+    stickdoor_win_probability = result['stick_curve'].tolist()
     return switchdoor_win_probability, stickdoor_win_probability           # The Final values of the list are the "strategy"-probabilities
 
-def monty_hall(iterations):
-    switchdoor_win_probability, stickdoor_win_probability = monte_carlo(iterations)
-    switch, stick = switchdoor_win_probability[-1], stickdoor_win_probability[-1]           
+def count_wins(iterations, seed = None, doors = 3, opened = 1, host = 'standard'):
+    """Play the game a specified number of times and count the wins of each strategy (vectorized).
+
+    Args:
+        iterations (int): The number of games.
+        seed: Seed (int, SeedSequence or np.random.Generator) of the random numbers.
+        doors, opened, host: See simulate.
+
+    Returns:
+        dict: Counters {'games', 'valid', 'switch_win', 'stick_win'}, which can be summed across independent runs.
+    """
+    result = simulate(iterations, doors, opened, host, seed = seed)
+    return {key: result[key] for key in ('games', 'valid', 'switch_win', 'stick_win')}
+
+def monty_hall(iterations, doors = 3, opened = 1, host = 'standard', points = 1000):
+    import matplotlib.pyplot as plt
+
+    result = simulate(iterations, doors, opened, host, record_every = max(1, iterations // points))
+    switch, stick = result['switch_prob'], result['stick_prob']
     print('Always switching winning probability: ',format((switch*100),'.2f')+'%\n')
     print('Always sticking winning probability: ',format((stick*100),'.2f')+'%')
     plt.figure()
     plt.grid()
     plt.title('Winning Probability')
-    plt.plot(switchdoor_win_probability, 'b', label = 'Switch Door')
-    plt.plot(stickdoor_win_probability, 'r', label = 'Stick to Door')
+    plt.plot(result['recorded_games'], result['switch_curve'], 'b', label = 'Switch Door')
+    plt.plot(result['recorded_games'], result['stick_curve'], 'r', label = 'Stick to Door')
     plt.xlabel('Iterations')
     plt.ylabel('Probability')
     plt.ylim([0,1])
     plt.legend()
     plt.show()
 
-monty_hall(10000)
+if __name__ == '__main__':
+    monty_hall(10000)
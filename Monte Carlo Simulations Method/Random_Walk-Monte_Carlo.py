@@ -1,78 +1,122 @@
 import numpy as np
-import matplotlib.pyplot as plt
 
-def random_walk(num_steps):
+def random_walk(num_steps, seed = None):
     """Simulate a 1D random walk of a specified number of steps."""
-    # Define the set of possible steps
-    steps = [-1, 1]
-    
-    # Initialize the position and the list of positions over time/steps
-    pos = 0 # Initial Position / Origin
-    positions = [pos]
-    
-    # Take the specified number of steps
-    for i in range(num_steps):
-        # Randomly select a step
-        step = np.random.choice(steps)
-        
-        # Update the position
-        pos += step
-        
-        # Append the new position to the list of positions
-        positions.append(pos)
-    
-    return positions
-
-def monte_carlo_random_walk(num_walks, num_steps):
+    rng = np.random.default_rng(seed)
+
+    # Randomly select all the steps at once (-1 or 1)
+    steps = 2 * rng.integers(0, 2, size = num_steps) - 1
+
+    # Positions over time/steps, starting from the origin
+    positions = np.zeros(num_steps + 1, dtype = np.int64)
+    np.cumsum(steps, out = positions[1:])
+
+    return positions.tolist()
+
+def walk_chunks(num_walks, num_steps, chunk_size = None, max_bytes = 2**26, seed = None):
+    """Generate the positions of many 1D random walks, a chunk of walks at a time.
+
+    The steps of a chunk are drawn as random bits (8 steps per random byte) and turned into
+    positions with a single cumulative sum, so memory is bounded by the chunk, not by num_walks.
+
+    Args:
+        num_walks (int): The number of random walks.
+        num_steps (int): The number of steps to take for each random walk.
+        chunk_size (int): Walks per chunk. By default it is derived from max_bytes.
+        max_bytes (int): Approximate memory budget of a chunk (used when chunk_size is None).
+        seed: Seed (int, SeedSequence or np.random.Generator) of the random numbers.
+
+    Yields:
+        ndarray: Array of shape (walks in chunk, num_steps) with the positions after steps 1, ..., num_steps.
+    """
+    rng = np.random.default_rng(seed)
+    if chunk_size is None:
+        # bits (1 byte) + positions (4 bytes) + a boolean mask per step and walk
+        chunk_size = max(1, max_bytes // (6 * max(num_steps, 1)))
+    for start in range(0, num_walks, chunk_size):
+        walks = min(chunk_size, num_walks - start)
+        random_bytes = rng.integers(0, 256, size = (walks, (num_steps + 7) // 8), dtype = np.uint8)
+        bits = np.unpackbits(random_bytes, axis = 1, count = num_steps)
+        # position = (number of +1 steps) - (number of -1 steps) = 2 * (number of +1 steps) - steps taken
+        positions = np.cumsum(bits, axis = 1, dtype = np.int32)
+        positions *= 2
+        positions -= np.arange(1, num_steps + 1, dtype = np.int32)
+        yield positions
+
+def random_walk_statistics(num_walks, num_steps, chunk_size = None, max_bytes = 2**26, seed = None):
+    """Simulate many 1D random walks and collect their return-to-origin statistics in one pass.
+
+    Args:
+        num_walks (int): The number of random walks.
+        num_steps (int): The number of steps to take for each random walk.
+        chunk_size, max_bytes, seed: See walk_chunks.
+
+    Returns:
+        dict: With the following arrays (index = step number, 0 ... num_steps):
+            - 'return_counts': number of walks at the origin after each step (0 at step 0, by convention).
+            - 'prob_return_to_origin': return_counts / num_walks.
+            - 'first_return_counts': number of walks whose first return to the origin happens at each step.
+            - 'never_returned': number of walks that never returned to the origin.
+            - 'final_positions': histogram of the final positions, where index i counts position i - num_steps.
+    """
+    if num_steps < 1:
+        raise ValueError('num_steps must be at least 1')
+    return_counts = np.zeros(num_steps + 1, dtype = np.int64)
+    first_return_counts = np.zeros(num_steps + 1, dtype = np.int64)
+    final_positions = np.zeros(2 * num_steps + 1, dtype = np.int64)
+    never_returned = 0
+
+    for positions in walk_chunks(num_walks, num_steps, chunk_size, max_bytes, seed):
+        at_origin = positions == 0
+        return_counts[1:] += at_origin.sum(axis = 0)
+
+        # First return: the first step where the walk is at the origin (argmax finds the first True)
+        returned = at_origin.any(axis = 1)
+        first_return = at_origin.argmax(axis = 1)[returned] + 1
+        first_return_counts += np.bincount(first_return, minlength = num_steps + 1)
+        never_returned += int(returned.size - returned.sum())
+
+        final_positions += np.bincount(positions[:, -1] + num_steps, minlength = 2 * num_steps + 1)
+
+    return {
+        'return_counts': return_counts,
+        'prob_return_to_origin': return_counts / num_walks,
+        'first_return_counts': first_return_counts,
+        'never_returned': never_returned,
+        'final_positions': final_positions,
+    }
+
+def monte_carlo_random_walk(num_walks, num_steps, seed = None):
     """Simulate a random walk a specified number of times using a Monte Carlo simulation.
-    
+
     Args:
         num_walks (int): The number of times to simulate a random walk.
         num_steps (int): The number of steps to take for each random walk.
-    
+
     Returns:
-        list: A list of lists, where each inner list represents the positions over time/steps for a single random walk.
+        ndarray: Array of shape (num_walks, num_steps + 1), where each row represents the positions over time/steps for a single random walk.
     """
-    # Initialize a list to hold the positions over time for each random walk
-    positions_over_time = []
-    
-    for i in range(num_walks):
-        # Perform a random walk and add the positions over time to the list
-        positions = random_walk(num_steps)
-        positions_over_time.append(positions)
-        
+    positions_over_time = np.zeros((num_walks, num_steps + 1), dtype = np.int32)
+    start = 0
+    for positions in walk_chunks(num_walks, num_steps, seed = seed):
+        positions_over_time[start:start + positions.shape[0], 1:] = positions
+        start += positions.shape[0]
+
     return positions_over_time
 
-def monte_carlo_return_to_origin(num_walks, num_steps):
-    """Simulate a random walk a specified number of times using a Monte Carlo simulation and calculate the 
+def monte_carlo_return_to_origin(num_walks, num_steps, seed = None):
+    """Simulate a random walk a specified number of times using a Monte Carlo simulation and calculate the
         probability of returning to the origin for each step of the walk.
-    
+
     Args:
         num_walks (int): The number of times to simulate a random walk.
         num_steps (int): The number of steps to take for each random walk.
-    
+
     Returns:
         list: A list of floats representing the probability of returning to the origin for each step of the walk.
     """
-    # Perform the random walks and get the positions over time
-    positions_over_time = monte_carlo_random_walk(num_walks, num_steps)
-    
-    # Initialize a list to hold the probability of returning to the origin for each step of the walk
-    prob_return_to_origin = [0.0] * num_steps
-    
-    # For each step of the walk, calculate the probability of returning to the origin
-    for i in range(1, num_steps):
-        num_returned_to_origin = 0
-        
-        # Count the number of walks that returned to the origin at this step
-        for positions in positions_over_time:
-            if positions[i] == 0:
-                num_returned_to_origin += 1
-        
-        # Calculate the probability of returning to the origin at this step
-        prob_return_to_origin[i] = num_returned_to_origin / num_walks
-    
-    return prob_return_to_origin # list, which holds the estimated probabilities of returning to the origin for each step of the walk.
+    stats = random_walk_statistics(num_walks, num_steps, seed = seed)
+    return stats['prob_return_to_origin'][:num_steps].tolist() # list, which holds the estimated probabilities of returning to the origin for each step of the walk.
 
 def returned(positions_over_time, num_walks):
     # Count the number of walks that returned to the origin
@@ -84,14 +128,17 @@ def returned(positions_over_time, num_walks):
     prob_return = num_returned_to_origin / num_walks
     print("Probability of returning to the origin: ", format(prob_return*100, '.2f')+'%')
 
-def Plot(num_walks, num_steps):
+def Plot(num_walks, num_steps, seed = None):
+    import matplotlib.pyplot as plt
 
-    positions_over_time = monte_carlo_random_walk(num_walks, num_steps)
-    prob_return_to_origin = monte_carlo_return_to_origin(num_walks, num_steps)
+    # One pass over all the walks for the statistics, plus a few (5) walks to draw
+    rng = np.random.default_rng(seed)
+    stats = random_walk_statistics(num_walks, num_steps, seed = rng)
+    positions_over_time = monte_carlo_random_walk(5, num_steps, seed = rng)
 
     # Plot the positions over time/steps for a few (5) random walks
     plt.figure()
-    for positions in positions_over_time[:5]:
+    for positions in positions_over_time:
         plt.plot(positions)
     plt.xlabel("Step")
     plt.ylabel("Position")
@@ -99,12 +146,15 @@ def Plot(num_walks, num_steps):
 
     # Plot the probability of returning to the origin over time/steps
     plt.figure()
-    plt.plot(prob_return_to_origin)
+    plt.plot(stats['prob_return_to_origin'][:num_steps])
     plt.xlabel("Step")
     plt.ylabel("Probability of returning to origin")
     plt.title("Probability of Returning to the Origin for a Random Walk")
     plt.show()
 
-    returned(positions_over_time, num_walks)
+    # Probability of being back at the origin after the last step
+    prob_return = stats['return_counts'][-1] / num_walks
+    print("Probability of returning to the origin: ", format(prob_return*100, '.2f')+'%')
 
-Plot(num_walks = 1000, num_steps = 100)
\ No newline at end of file
+if __name__ == '__main__':
+    Plot(num_walks = 1000, num_steps = 100)
@@ -0,0 +1,255 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+if __name__ == '__main__':      # run as a script: put the repository root on the path for mathematical_models
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import mathematical_models as mm
+
+"""
+ Approximate Bayesian computation (ABC) with the stochastic simulators
+
+ The stochastic models (GBM.py, stochastic_epidemics.py, ...) are only run forward. ABC infers their parameters
+ from data without a likelihood: parameters theta are drawn, the model is simulated with them, and theta is kept
+ when the simulation looks like the observations, i.e. when the distance between summary statistics,
+
+    d(theta) = || (s(simulation) - s(observed)) / scale ||     (scale: MAD of the summaries under the prior)
+
+ is small. The kept parameters are a sample of the posterior of theta given the summaries (as epsilon -> 0).
+
+    rejection:  draw theta from the prior, keep the fraction `quantile` with the smallest distances
+    smc:        sequential Monte Carlo (Beaumont et al., 2009): a population of particles moves through
+                decreasing thresholds epsilon_1 > epsilon_2 > ..., each one the `alpha` quantile of the previous
+                distances; new particles are drawn from the weighted previous population, perturbed by a
+                Gaussian kernel (twice the weighted covariance) and weighted by prior / proposal density
+
+ The priors are uniform boxes {name: (low, high)}. A simulator is a function simulator(theta, rng, *args) that
+ simulates a whole batch of particles (theta of shape (particles, parameters)) at once and returns their summaries,
+ shape (particles, summaries). The batches are split into chunks simulated on a process pool, each chunk with
+ its own random stream spawned from one SeedSequence (as in parallel_monte_carlo.py), so a given seed gives the
+ same result for any number of workers.
+"""
+
+def _simulate_chunk(job):
+    simulator, theta, seed, args = job
+    return simulator(theta, np.random.default_rng(seed), *args)
+
+class _Evaluator:
+    """Simulates batches of particles on a process pool (kept open between the batches) and measures distances."""
+
+    def __init__(self, simulator, observed, args, workers, chunk_size, seed_sequence):
+        self.simulator, self.args = simulator, tuple(args)
+        self.observed = np.asarray(observed, dtype = float)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.seeds = seed_sequence
+        self.executor = ProcessPoolExecutor(max_workers = self.workers) if self.workers > 1 else None
+        self.scale = None
+        self.simulations = 0
+
+    def summaries(self, theta):
+        # The chunks (and their random streams) depend on chunk_size only, not on the number of workers
+        starts = range(0, len(theta), self.chunk_size)
+        jobs = [(self.simulator, theta[start:start + self.chunk_size], seed, self.args)
+                for start, seed in zip(starts, self.seeds.spawn(len(starts)))]
+        results = list(self.executor.map(_simulate_chunk, jobs)) if self.executor else [_simulate_chunk(job) for job in jobs]
+        self.simulations += len(theta)
+        return np.concatenate(results)
+
+    def distances(self, theta):
+        S = self.summaries(theta)
+        if self.scale is None:
+            # Median absolute deviation of the summaries of this first (prior) batch
+            scale = np.median(np.abs(S - np.median(S, axis = 0)), axis = 0)
+            self.scale = np.where(scale > 0, scale, 1.0)
+        distance = np.sqrt(np.sum(((S - self.observed) / self.scale)**2, axis = 1))
+        return np.where(np.isfinite(distance), distance, np.inf)
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown()
+
+def _prior_sample(prior, n, rng):
+    low, high = np.array(list(prior.values()), dtype = float).T
+    return low + (high - low) * rng.random((n, len(prior)))
+
+def _in_prior(prior, theta):
+    low, high = np.array(list(prior.values()), dtype = float).T
+    return np.all((theta >= low) & (theta <= high), axis = 1)
+
+def rejection(simulator, prior, observed, simulations = 10**5, quantile = 0.01, args = (), seed = None, workers = None, chunk_size = 10**4):
+    """ABC rejection sampling: simulate `simulations` draws of the prior and keep the closest `quantile` of them.
+
+    Args:
+        simulator (function): simulator(theta, rng, *args) -> summaries (particles, summaries), module-level.
+        prior (dict): Name -> (low, high) of a uniform prior.
+        observed: Summaries of the observations, shape (summaries,).
+        simulations (int): Number of prior draws simulated.
+        quantile (float): Fraction of them kept (the threshold epsilon is that quantile of the distances).
+        args (tuple): Extra arguments of the simulator.
+        seed: Seed (int or SeedSequence).
+        workers (int): Number of processes (default: all the cores). 1 simulates in this process.
+        chunk_size (int): Particles simulated per job. The result depends on it (it fixes the random streams), not on workers.
+
+    Returns:
+        dict: 'names', 'particles' (kept draws, shape (kept, parameters)), 'weights' (equal), 'distances',
+              'epsilon', 'simulations', 'seconds'.
+    """
+    start = time.perf_counter()
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    rng = np.random.default_rng(seed_sequence.spawn(1)[0])
+    evaluator = _Evaluator(simulator, observed, args, workers, chunk_size, seed_sequence)
+    try:
+        theta = _prior_sample(prior, simulations, rng)
+        distance = evaluator.distances(theta)
+    finally:
+        evaluator.close()
+    kept = np.argsort(distance)[:max(1, int(round(quantile * simulations)))]
+    return {'names': tuple(prior), 'particles': theta[kept], 'weights': np.full(kept.size, 1 / kept.size),
+            'distances': distance[kept], 'epsilon': float(distance[kept].max()), 'simulations': evaluator.simulations,
+            'seconds': time.perf_counter() - start}
+
+def _kernel_weights(theta, previous, previous_weights, covariance):
+    """1 / sum_j w_j K(theta_i | previous_j), with the Gaussian kernel of the given covariance (uniform prior)."""
+    inverse = np.linalg.inv(covariance)
+    density = np.zeros(len(theta))
+    for start in range(0, len(theta), 1000):           # (1000, previous) blocks of Mahalanobis distances
+        delta = theta[start:start + 1000, None, :] - previous[None, :, :]
+        density[start:start + 1000] = np.exp(-0.5 * np.einsum('ijk,kl,ijl->ij', delta, inverse, delta)) @ previous_weights
+    weights = 1 / density
+    return weights / weights.sum()
+
+def smc(simulator, prior, observed, particles = 1000, generations = 10, alpha = 0.5, min_acceptance = 0.01,
+        args = (), seed = None, workers = None, chunk_size = 10**4, verbose = False):
+    """ABC sequential Monte Carlo (population Monte Carlo with adaptive thresholds).
+
+    Args:
+        simulator (function): simulator(theta, rng, *args) -> summaries (particles, summaries), module-level.
+        prior (dict): Name -> (low, high) of a uniform prior.
+        observed: Summaries of the observations, shape (summaries,).
+        particles (int): Size of the population.
+        generations (int): Maximum number of generations (the first one samples the prior).
+        alpha (float): The next threshold is the alpha quantile of the current distances.
+        min_acceptance (float): Stop when a generation accepts a smaller fraction of its proposals.
+        args (tuple): Extra arguments of the simulator.
+        seed: Seed (int or SeedSequence).
+        workers (int): Number of processes (default: all the cores). 1 simulates in this process.
+        chunk_size (int): Particles simulated per job. The result depends on it (it fixes the random streams), not on workers.
+        verbose (bool): Print a line per generation.
+
+    Returns:
+        dict: 'names', 'particles', 'weights', 'distances' of the last population, 'epsilon' (threshold of each
+              generation), 'acceptance', 'generation_seconds', 'simulations', 'seconds'.
+    """
+    start = time.perf_counter()
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    rng = np.random.default_rng(seed_sequence.spawn(1)[0])
+    evaluator = _Evaluator(simulator, observed, args, workers, chunk_size, seed_sequence)
+    history = {'epsilon': [np.inf], 'acceptance': [1.0], 'generation_seconds': []}
+    try:
+        # Generation 0: the prior
+        theta = _prior_sample(prior, particles, rng)
+        distance = evaluator.distances(theta)
+        weights = np.full(particles, 1 / particles)
+        history['generation_seconds'].append(time.perf_counter() - start)
+
+        for generation in range(1, generations):
+            generation_start = time.perf_counter()
+            epsilon = np.quantile(distance, alpha)
+            covariance = 2 * np.atleast_2d(np.cov(theta, rowvar = False, aweights = weights))
+            factor = np.linalg.cholesky(covariance + 1e-12 * np.eye(len(prior)))
+            new_theta, new_distance, proposed = [], [], 0
+            acceptance = history['acceptance'][-1]
+            while sum(len(d) for d in new_distance) < particles:
+                missing = particles - sum(len(d) for d in new_distance)
+                batch = int(min(max(missing / max(acceptance, min_acceptance), particles // 4), 20 * particles))
+                proposal = theta[rng.choice(particles, batch, p = weights)] + rng.standard_normal((batch, len(prior))) @ factor.T
+                proposal = proposal[_in_prior(prior, proposal)]
+                proposed += batch
+                if len(proposal):
+                    d = evaluator.distances(proposal)
+                    new_theta.append(proposal[d <= epsilon])
+                    new_distance.append(d[d <= epsilon])
+                acceptance = max(sum(len(d) for d in new_distance) / proposed, 1e-9)
+                if acceptance < min_acceptance and proposed >= particles / min_acceptance:
+                    break
+            if sum(len(d) for d in new_distance) < particles:
+                if verbose:
+                    print('generation', generation, ': acceptance below', min_acceptance, '- stopped')
+                break
+            new_theta = np.concatenate(new_theta)[:particles]
+            new_distance = np.concatenate(new_distance)[:particles]
+            weights = _kernel_weights(new_theta, theta, weights, covariance)
+            theta, distance = new_theta, new_distance
+            history['epsilon'].append(float(epsilon))
+            history['acceptance'].append(particles / proposed)
+            history['generation_seconds'].append(time.perf_counter() - generation_start)
+            if verbose:
+                print('generation', generation, ': epsilon =', format(epsilon, '.4g'), ', acceptance =',
+                      format(particles / proposed, '.3f'), ',', format(history['generation_seconds'][-1], '.2f'), 's')
+    finally:
+        evaluator.close()
+    return dict(history, names = tuple(prior), particles = theta, weights = weights, distances = distance,
+                simulations = evaluator.simulations, seconds = time.perf_counter() - start)
+
+def posterior_summary(result):
+    """Weighted posterior mean, standard deviation and 95% interval of every parameter."""
+    summary = {}
+    for i, name in enumerate(result['names']):
+        values, weights = result['particles'][:, i], result['weights']
+        mean = np.sum(weights * values)
+        order = np.argsort(values)
+        cumulative = np.cumsum(weights[order])
+        low, high = np.interp([0.025, 0.975], cumulative, values[order])
+        summary[name] = {'mean': mean, 'std': np.sqrt(np.sum(weights * (values - mean)**2)), 'interval': (low, high)}
+    return summary
+
+"""-----------------------------------------------------------------"""
+
+# Simulators and summaries of the models of this repository:
+
+def price_summaries(P, dt):
+    """Summaries of price series P (steps, series): mean and standard deviation of the log-returns per unit time."""
+    returns = np.diff(np.log(P), axis = 0)
+    return np.stack([returns.mean(axis = 0) / dt, returns.std(axis = 0, ddof = 1) / np.sqrt(dt)], axis = 1)
+
+def gbm_simulator(theta, rng, S0, T, dt):
+    """GBM price series (GBM.py) for particles theta = (r, sigma), summarized by price_summaries."""
+    r, sigma = theta[:, 0], theta[:, 1]
+    return price_summaries(mm.gbm_paths(S0, r, sigma, T, dt, len(theta), seed = rng), dt)
+
+def outbreak_summaries(t, X, infected = 1):
+    """Summaries of outbreaks X (runs, len(t), compartments): peak of infected, its time, final size, infected at t[-1] / 4."""
+    I = X[:, :, infected]
+    quarter = np.searchsorted(t, t[0] + (t[-1] - t[0]) / 4)
+    return np.stack([I.max(axis = 1), t[I.argmax(axis = 1)], X[:, -1, 0] - X[:, 0, 0], I[:, quarter]], axis = 1) * [1, 1, -1, 1]
+
+def sir_simulator(theta, rng, X0, t):
+    """Stochastic SIR outbreaks (tau-leaping, stochastic_epidemics.py) for particles theta = (beta, gamma)."""
+    run = mm.tau_leaping('SIR', X0, t, theta[:, 0], theta[:, 1], replicates = len(theta), seed = rng)
+    return outbreak_summaries(t, run['X'])
+
+if __name__ == '__main__':
+    # GBM drift and volatility from one year of daily prices (the parameters of GBM.py)
+    S0, T, dt = 100, 1, 1 / 252
+    prices = mm.gbm_paths(S0, 0.05, 0.2, T, dt, 1, seed = 1)
+    observed = price_summaries(prices, dt)[0]
+    prior = {'r': (-0.5, 0.5), 'sigma': (0.01, 0.6)}
+    result = rejection(gbm_simulator, prior, observed, simulations = 10**5, quantile = 0.01, args = (S0, T, dt), seed = 0)
+    print('GBM, rejection:', {name: np.round(s['interval'], 3) for name, s in posterior_summary(result).items()},
+          result['simulations'], 'simulations,', format(result['seconds'], '.2f'), 's')
+    result = smc(gbm_simulator, prior, observed, particles = 2000, generations = 6, args = (S0, T, dt), seed = 0, verbose = True)
+    print('GBM, SMC:', {name: np.round(s['interval'], 3) for name, s in posterior_summary(result).items()},
+          result['simulations'], 'simulations,', format(result['seconds'], '.2f'), 's')
+
+    # SIR contact and recovery rates from one outbreak in the population of "SIR  Epidemic Model.py"
+    X0, t = (340, 10, 0), np.linspace(0, 100, 101)
+    outbreak = mm.tau_leaping('SIR', X0, t, 0.4, 0.1, seed = 2)
+    observed = outbreak_summaries(t, outbreak['X'])[0]
+    prior = {'beta': (0.05, 1.0), 'gamma': (0.02, 0.5)}
+    result = smc(sir_simulator, prior, observed, particles = 1000, generations = 8, args = (X0, t), seed = 0, verbose = True)
+    print('SIR, SMC:', {name: (round(s['mean'], 3), np.round(s['interval'], 3)) for name, s in posterior_summary(result).items()},
+          '(truth: beta = 0.4, gamma = 0.1)', result['simulations'], 'simulations,', format(result['seconds'], '.2f'), 's')
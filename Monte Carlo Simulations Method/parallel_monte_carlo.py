@@ -0,0 +1,121 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+if __name__ == '__main__':      # run as a script: put the repository root on the path for mathematical_models
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import mathematical_models as mm
+
+"""
+ Running Monte Carlo simulations across a process pool, reproducibly.
+
+ The total number of samples is split into fixed-size blocks, and every block gets its own random
+ generator, spawned from one SeedSequence. The blocks (not the workers) own the random streams, so
+ which worker runs a block does not matter: the partial results are merged in block order and
+ a given seed gives bit-identical results for any number of workers (including 1, without a pool).
+
+ A task is a function task(n, rng, *args) that simulates n samples with the np.random.Generator rng
+ and returns partial counters/sums (a dict of numbers or arrays) that can be added together.
+"""
+
+def _run_block(job):
+    task, n, seed, args = job
+    return task(n, np.random.default_rng(seed), *args)
+
+def merge_sums(results):
+    """Add up partial results (dicts of numbers or arrays), in the given order."""
+    total = dict(results[0])
+    for result in results[1:]:
+        for key, value in result.items():
+            total[key] = total[key] + value
+    return total
+
+def run_parallel(task, total, block_size, seed = None, workers = None, args = (), merge = merge_sums):
+    """Split `total` samples of `task` into blocks and run them on a process pool.
+
+    Args:
+        task (function): task(n, rng, *args) -> partial result, a picklable (module-level) function.
+        total (int): Total number of samples.
+        block_size (int): Samples per block. The result depends on it (it fixes the random streams), not on workers.
+        seed: Seed (int or SeedSequence) from which the per-block generators are spawned.
+        workers (int): Number of processes (default: all the cores). 1 runs the blocks in this process.
+        args (tuple): Extra arguments of the task.
+        merge (function): Combines the list of partial results (in block order).
+
+    Returns:
+        The merged result.
+    """
+    if total <= 0 or block_size <= 0:
+        raise ValueError('total and block_size must be positive')
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    sizes = [min(block_size, total - start) for start in range(0, total, block_size)]
+    jobs = [(task, n, child, tuple(args)) for n, child in zip(sizes, seed_sequence.spawn(len(sizes)))]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) == 1:
+        results = [_run_block(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers = min(workers, len(jobs))) as executor:
+            results = list(executor.map(_run_block, jobs))      # map keeps the block order
+    return merge(results)
+
+"""-----------------------------------------------------------------"""
+
+# Tasks for the simulations of this repository:
+
+def coin_flip_task(n, rng):
+    return mm.coin_flip.count_flips(n, seed = rng)
+
+def monty_hall_task(n, rng):
+    return mm.monty_hall.count_wins(n, seed = rng)
+
+def random_walk_task(n, rng, num_steps):
+    stats = mm.random_walk.random_walk_statistics(n, num_steps, seed = rng)
+    del stats['prob_return_to_origin']                  # not additive, recomputed after merging
+    stats['walks'] = n
+    return stats
+
+def gbm_task(n, rng, S0, r, sigma, T, dt):
+    terminal = mm.gbm.gbm_paths(S0, r, sigma, T, dt, n, seed = rng)[-1]
+    mean = terminal.mean()
+    return {'paths': n, 'mean': mean, 'm2': np.square(terminal - mean).sum()}
+
+def merge_moments(results):
+    """Merge partial (count, mean, sum of squared deviations) results, in the given order."""
+    stats = mm.progressive_estimators.RunningStats()
+    for result in results:
+        stats.combine(result['paths'], result['mean'], result['m2'])
+    return stats
+
+# Parallel versions:
+
+def parallel_coin_flip(iterations, seed = None, workers = None, block_size = 10**6):
+    """Estimated probabilities of heads and tails: returns (counters, prob_head, prob_tail)."""
+    counts = run_parallel(coin_flip_task, iterations, block_size, seed, workers)
+    return counts, counts['heads'] / iterations, counts['tails'] / iterations
+
+def parallel_monty_hall(iterations, seed = None, workers = None, block_size = 10**6):
+    """Estimated winning probabilities: returns (counters, switch probability, stick probability)."""
+    counts = run_parallel(monty_hall_task, iterations, block_size, seed, workers)
+    return counts, counts['switch_win'] / counts['valid'], counts['stick_win'] / counts['valid']
+
+def parallel_random_walk(num_walks, num_steps, seed = None, workers = None, block_size = 10**4):
+    """Same statistics as random_walk_statistics, with the walks spread across processes."""
+    stats = run_parallel(random_walk_task, num_walks, block_size, seed, workers, args = (num_steps,))
+    stats['prob_return_to_origin'] = stats['return_counts'] / num_walks
+    return stats
+
+def parallel_gbm(S0, r, sigma, T, dt, N, seed = None, workers = None, block_size = 10**4):
+    """Mean and standard error of the terminal GBM price over N paths: returns (mean, standard error)."""
+    stats = run_parallel(gbm_task, N, block_size, seed, workers, args = (S0, r, sigma, T, dt), merge = merge_moments)
+    return stats.mean, stats.std_error if N > 1 else 0.0
+
+if __name__ == '__main__':
+    counts, heads, tails = parallel_coin_flip(10**7, seed = 0)
+    print('Percentage of Heads: '+format(heads*100, '.2f')+'%')
+    counts, switch, stick = parallel_monty_hall(10**7, seed = 0)
+    print('Always switching winning probability: ', format((switch*100),'.2f')+'%')
+    mean, error = parallel_gbm(100, 0.05, 0.2, 1, 0.01, 10**5, seed = 0)
+    print('Mean terminal price: ', format(mean, '.2f'), '+/-', format(error, '.2f'), '(exact: ', format(100*np.exp(0.05), '.2f')+')')
@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.stats import norm
+
+if __name__ == '__main__':      # run as a script: put the repository root on the path for mathematical_models
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import mathematical_models as mm
+
+"""
+ Progressive Monte Carlo estimators with confidence intervals and early stopping
+
+ run_the_simulation, monty_hall and returned run a fixed number of iterations and report a point estimate.
+ Here samples are drawn in vectorized batches, and only the running count, mean and sum of squared deviations
+ are kept (Welford's update, merged a batch at a time with Chan's formula), so memory does not grow with the
+ number of samples. After each batch the normal confidence interval
+
+    mean +/- z * sqrt(variance / n),    z = norm.ppf((1 + confidence) / 2)
+
+ is checked and the simulation stops as soon as its width is at most ci_width (or at max_samples); the next
+ batch is sized from the current variance estimate, so the target is not overshot by much. For 0/1 samples
+ (bernoulli = True) the Wilson score interval is used instead, which stays sensible for rare events. The
+ simulation never stops while all the samples are equal: a rare event not seen yet gives a variance of 0 and
+ a zero-width normal interval, so the sample size doubles until the variance estimate is positive.
+
+ A sampler is a function sampler(n, rng, *args) returning n independent samples (e.g. 1 when the switching
+ strategy wins a Monty Hall game, 0 otherwise: the mean is the winning probability).
+"""
+
+class RunningStats:
+    """Running count, mean and variance of a stream of samples, updated a batch at a time (O(1) memory)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0                    # sum of squared deviations from the mean
+
+    def update(self, batch):
+        batch = np.asarray(batch, dtype = float).ravel()
+        if batch.size:
+            mean = batch.mean()
+            self.combine(batch.size, mean, np.square(batch - mean).sum())
+
+    def combine(self, n, mean, m2):
+        """Merge the count, mean and sum of squared deviations of another set of samples (Chan's formula)."""
+        if n == 0:
+            return
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta**2 * self.count * n / total
+        self.count = total
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else np.nan
+
+    @property
+    def std_error(self):
+        return np.sqrt(self.variance / self.count) if self.count > 1 else np.inf
+
+    def interval(self, confidence = 0.95):
+        half = norm.ppf((1 + confidence) / 2) * self.std_error
+        return self.mean - half, self.mean + half
+
+    def wilson_interval(self, confidence = 0.95):
+        """Wilson score interval of a proportion (the samples being 0 or 1)."""
+        if self.count == 0:
+            return 0.0, 1.0
+        z2 = norm.ppf((1 + confidence) / 2)**2
+        n, p = self.count, self.mean
+        center = (p + z2 / (2 * n)) / (1 + z2 / n)
+        half = np.sqrt(z2 * (p * (1 - p) / n + z2 / (4 * n**2))) / (1 + z2 / n)
+        return center - half, center + half
+
+def estimate(sampler, ci_width, confidence = 0.95, batch_size = 10**5, min_samples = 10**3, max_samples = 10**9,
+             args = (), seed = None, bernoulli = False, record = False):
+    """Estimate the mean of sampler's samples to a given confidence-interval width.
+
+    Args:
+        sampler (function): sampler(n, rng, *args) -> n samples.
+        ci_width (float): Target width of the confidence interval (high - low).
+        confidence (float): Confidence level of the interval.
+        batch_size (int): Samples drawn per batch (the check happens after each batch).
+        min_samples (int): Samples drawn before the first check (the variance estimate needs some).
+        max_samples (int): Stop there even if the width is not reached.
+        args (tuple): Extra arguments of sampler.
+        seed: Seed (int, SeedSequence or np.random.Generator) of the random numbers.
+        bernoulli (bool): The samples are 0 or 1: use the Wilson score interval.
+        record (bool): Also return 'history', the (samples, mean, low, high) after every batch.
+
+    Returns:
+        dict: 'mean', 'std_error', 'ci' (low, high), 'ci_width', 'samples', 'converged' (width reached),
+              'seconds', 'samples_per_second' (and 'history').
+    """
+    rng = np.random.default_rng(seed)
+    stats = RunningStats()
+    history = []
+    start = time.perf_counter()
+    n = min(max(min_samples, 2), max_samples)
+    while True:
+        stats.update(sampler(n, rng, *args))
+        low, high = stats.wilson_interval(confidence) if bernoulli else stats.interval(confidence)
+        converged = high - low <= ci_width and stats.m2 > 0
+        if record:
+            history.append((stats.count, stats.mean, low, high))
+        if converged or stats.count >= max_samples:
+            break
+        if stats.m2 > 0:
+            # Next batch: what the current variance says is still missing (at most batch_size)
+            needed = int(np.ceil((2 * norm.ppf((1 + confidence) / 2) / ci_width)**2 * stats.variance)) - stats.count
+        else:
+            needed = stats.count                  # all the samples are equal so far: double the sample size
+        n = int(min(batch_size, max_samples - stats.count, max(needed, min_samples)))
+    seconds = time.perf_counter() - start
+    result = {'mean': stats.mean, 'std_error': stats.std_error, 'ci': (low, high), 'ci_width': high - low,
+              'samples': stats.count, 'converged': converged,
+              'seconds': seconds, 'samples_per_second': stats.count / seconds if seconds > 0 else np.inf}
+    if record:
+        result['history'] = np.array(history)
+    return result
+
+"""-----------------------------------------------------------------"""
+
+# Samplers for the simulations of this repository:
+
+def coin_flip_sampler(n, rng):
+    """1 for heads, 0 for tails (Coin_Flip-Monte_Carlo.py)."""
+    return (rng.integers(0, 2, size = n, dtype = np.int8) == 0).view(np.uint8)
+
+def monty_hall_sampler(n, rng, doors = 3, opened = 1):
+    """1 when switching wins, 0 otherwise, for the standard host (Monty_Hall-Monte_Carlo.py)."""
+    valid, switch_win, stick_win = mm.monty_hall.play_games(n, rng, doors, opened, mm.monty_hall.standard_host)
+    return switch_win.view(np.uint8)
+
+def random_walk_sampler(n, rng, num_steps):
+    """1 when a walk of num_steps steps ends at the origin, 0 otherwise (returned in Random_Walk-Monte_Carlo.py).
+
+    Only the final position matters: 2 * (number of +1 steps) - num_steps, with a binomial number of +1 steps.
+    """
+    return (2 * rng.binomial(num_steps, 0.5, size = n) == num_steps).view(np.uint8)
+
+def gbm_sampler(n, rng, S0, r, sigma, T):
+    """Terminal prices S0 * exp((r - sigma^2 / 2) T + sigma W_T) of the GBM model (GBM.py), drawn exactly."""
+    return S0 * np.exp((r - 0.5 * sigma**2) * T + sigma * np.sqrt(T) * rng.standard_normal(n))
+
+# Progressive versions:
+
+def estimate_heads(ci_width = 0.001, confidence = 0.95, seed = None, **options):
+    """Probability of heads, to the given confidence-interval width."""
+    return estimate(coin_flip_sampler, ci_width, confidence, seed = seed, bernoulli = True, **options)
+
+def estimate_switch_win(ci_width = 0.001, confidence = 0.95, doors = 3, opened = 1, seed = None, **options):
+    """Winning probability of the switching strategy, to the given confidence-interval width."""
+    return estimate(monty_hall_sampler, ci_width, confidence, args = (doors, opened), seed = seed, bernoulli = True, **options)
+
+def estimate_return_probability(num_steps, ci_width = 0.001, confidence = 0.95, seed = None, **options):
+    """Probability that a random walk of num_steps steps ends at the origin, to the given confidence-interval width."""
+    return estimate(random_walk_sampler, ci_width, confidence, args = (num_steps,), seed = seed, bernoulli = True, **options)
+
+def estimate_gbm_mean(S0, r, sigma, T, ci_width, confidence = 0.95, seed = None, **options):
+    """Mean terminal GBM price (exact value S0 * exp(r T)), to the given confidence-interval width."""
+    return estimate(gbm_sampler, ci_width, confidence, args = (S0, r, sigma, T), seed = seed, **options)
+
+def report(name, result, exact = None):
+    low, high = result['ci']
+    print(name + ':', format(result['mean'], '.5f'), '[' + format(low, '.5f') + ', ' + format(high, '.5f') + ']',
+          '' if exact is None else '(exact: ' + format(exact, '.5f') + ')', '-', result['samples'], 'samples,',
+          format(result['samples_per_second'], '.3g'), 'samples/s', '' if result['converged'] else '(not converged)')
+
+if __name__ == '__main__':
+    from math import comb
+
+    report('Heads', estimate_heads(0.001, seed = 0), 0.5)
+    report('Switching wins', estimate_switch_win(0.001, seed = 0), 2/3)
+    report('Walk of 100 steps ends at the origin', estimate_return_probability(100, 0.001, seed = 0), comb(100, 50) / 2**100)
+    report('Mean terminal GBM price', estimate_gbm_mean(100, 0.05, 0.2, 1, 0.1, seed = 0), 100 * np.exp(0.05))
@@ -0,0 +1,225 @@
+import numpy as np
+from scipy.special import ndtri
+from scipy.stats import qmc
+
+"""
+ Quasi-Monte Carlo and variance reduction for the GBM and coin flip estimators
+
+ GBM.py draws independent normals for every step of every path and Coin_Flip-Monte_Carlo.py one random integer per
+ flip: the error of their averages falls as 1 / sqrt(samples). The same uniforms can be spread more evenly:
+
+    'pseudo':      independent uniforms (plain Monte Carlo, the reference)
+    'antithetic':  pairs u, 1 - u (normals z, -z): the errors of monotone payoffs cancel in pairs
+    'stratified':  the first coordinate has exactly one point in each of n equal-probability strata
+    'sobol':       scrambled Sobol' points (n rounded up to a power of 2)
+    'halton':      scrambled Halton points
+
+ For the GBM paths, the Brownian bridge builds the Brownian motion from its end: the first coordinate gives W(T),
+ the next ones the midpoints W(T/2), W(T/4), W(3T/4), ... given their neighbours. The most important coordinates
+ of the points (the most even ones) then carry most of the variance of the path, which is what QMC and
+ stratification need. On top of any sampler, the terminal price, whose expectation S0 * exp(r * T) is known,
+ is a control variate: f - b * (S_T - S0 * exp(r * T)), with b the regression coefficient of f on S_T.
+
+ Every estimator runs `replications` independent randomizations (scrambles, permutations) and reports the
+ standard error of their mean, and the variance reduction factor
+
+    variance reduction = (variance of f / samples) / standard error^2
+
+ i.e. how many times more plain Monte Carlo samples the same error would need (the samples of every sampler
+ are distributed as plain ones, so their variance estimates that of f).
+"""
+
+def _pseudo(n, d, rng):
+    return rng.random((n, d))
+
+def _antithetic(n, d, rng):
+    u = rng.random((n // 2, d))
+    return np.concatenate([u, 1 - u])
+
+def _stratified(n, d, rng):
+    u = rng.random((n, d))
+    u[:, 0] = (rng.permutation(n) + u[:, 0]) / n         # one point per stratum [i / n, (i + 1) / n)
+    return u
+
+def _sobol(n, d, rng):
+    return qmc.Sobol(d, scramble = True, seed = rng).random_base2(int(np.log2(n)))
+
+def _halton(n, d, rng):
+    return qmc.Halton(d, scramble = True, seed = rng).random(n)
+
+# Sampler -> (function (n, d, rng) -> uniforms of shape (n, d), rounding of the number of points)
+SAMPLERS = {
+    'pseudo': (_pseudo, lambda n: n),
+    'antithetic': (_antithetic, lambda n: n + n % 2),
+    'stratified': (_stratified, lambda n: n),
+    'sobol': (_sobol, lambda n: 1 << int(np.ceil(np.log2(max(n, 1))))),
+    'halton': (_halton, lambda n: n),
+}
+
+def uniforms(n, d, sampler = 'pseudo', seed = None):
+    """Points of the unit cube [0, 1)^d from a sampler of SAMPLERS, shape (n', d) with n' = n rounded for the
+    sampler (even for 'antithetic', a power of 2 for 'sobol')."""
+    function, rounding = SAMPLERS[sampler]
+    return function(rounding(n), d, np.random.default_rng(seed))
+
+def normals(n, d, sampler = 'pseudo', seed = None):
+    """Standard normal points of shape (n', d): the uniforms of the sampler through the inverse normal CDF."""
+    u = uniforms(n, d, sampler, seed)
+    return ndtri(np.clip(u, 1e-16, 1 - 1e-16))          # scrambled points are never 0, but may round to it
+
+def _bridge_order(steps):
+    """Brownian bridge construction order: (index, left, right) on the grid 0..steps, W(steps) first (left = 0,
+    right = -1), then the midpoints breadth first."""
+    order = [(steps, 0, -1)]
+    intervals = [(0, steps)]
+    for left, right in intervals:                         # the list grows while it is walked: breadth first
+        if right - left > 1:
+            middle = (left + right) // 2
+            order.append((middle, left, right))
+            intervals += [(left, middle), (middle, right)]
+    return order
+
+def brownian_motion(Z, T, bridge = True):
+    """Brownian motions on a uniform grid of len(Z[0]) steps over [0, T] from standard normals Z (paths, steps).
+
+    Returns:
+        ndarray: W of shape (steps + 1, paths), W[0] = 0. With bridge, Z[:, 0] gives W(T) and the next columns
+                 the midpoints (Brownian bridge); otherwise Z[:, k] is the increment of step k.
+    """
+    N, steps = Z.shape
+    dt = T / steps
+    if not bridge:
+        W = np.zeros((steps + 1, N))
+        np.cumsum(np.sqrt(dt) * Z.T, axis = 0, out = W[1:])
+        return W
+    W = np.empty((steps + 1, N))
+    W[0] = 0
+    for k, (i, left, right) in enumerate(_bridge_order(steps)):
+        if right < 0:
+            W[i] = np.sqrt(T) * Z[:, k]
+            continue
+        # W(i) given W(left), W(right): normal, linear interpolation mean, variance (i - l)(r - i) / (r - l) * dt
+        a, b = i - left, right - i
+        W[i] = (b * W[left] + a * W[right]) / (a + b) + np.sqrt(a * b / (a + b) * dt) * Z[:, k]
+    return W
+
+def gbm_sample(S0, r, sigma, T, dt, N, sampler = 'pseudo', bridge = True, seed = None):
+    """GBM price paths as in gbm_paths (GBM.py), from the points of a sampler.
+
+    Args:
+        S0, r, sigma, T, dt, N: As in gbm_paths.
+        sampler (str): Name in SAMPLERS (the number of paths is rounded as the sampler needs).
+        bridge (bool): Build the Brownian motions with the Brownian bridge (recommended for 'sobol', 'halton',
+                       'stratified'), otherwise step by step as gbm_paths.
+        seed: Seed (int, SeedSequence or np.random.Generator) of the random numbers / scrambling.
+
+    Returns:
+        ndarray: Array P of shape (steps, N'), where P[i, j] is the price of path j at step i.
+    """
+    steps = int(T / dt)
+    Z = normals(N, steps, sampler, seed)
+    W = brownian_motion(Z, steps * dt, bridge)
+    t = dt * np.arange(steps + 1)[:, None]
+    return S0 * np.exp((r - 0.5 * sigma**2) * t + sigma * W)
+
+"""-----------------------------------------------------------------"""
+
+def _report(values, plain_variance, samples):
+    """Estimate, standard error, 95% interval and variance reduction from the means of the replications."""
+    means = np.asarray(values)
+    estimate = means.mean()
+    stderr = means.std(ddof = 1) / np.sqrt(len(means))
+    reduction = plain_variance / samples / stderr**2 if stderr > 0 else np.inf
+    return {'estimate': float(estimate), 'stderr': float(stderr), 'interval': (estimate - 1.96 * stderr, estimate + 1.96 * stderr),
+            'variance_reduction': float(reduction), 'samples': int(samples)}
+
+def gbm_expectation(payoff, S0, r, sigma, T, dt, N, sampler = 'sobol', bridge = True, control = False, replications = 16, seed = None):
+    """Estimate E[payoff(P)] over GBM paths, with a sampler, the Brownian bridge and the terminal price control variate.
+
+    Args:
+        payoff (function): payoff(P) -> values of shape (paths,), for prices P of shape (steps, paths),
+                           e.g. lambda P: np.maximum(P[-1] - 100, 0).
+        S0, r, sigma, T, dt: As in gbm_paths.
+        N (int): Total number of paths (split over the replications, rounded per replication by the sampler).
+        sampler (str): Name in SAMPLERS.
+        bridge (bool): Brownian bridge construction of the paths.
+        control (bool): Use the terminal price (mean S0 * exp(r * T)) as control variate.
+        replications (int): Independent randomizations, for the standard error.
+        seed: Seed (int or SeedSequence).
+
+    Returns:
+        dict: 'estimate', 'stderr', 'interval' (95%), 'variance_reduction' (against plain Monte Carlo with as many
+              paths), 'samples' (paths used), 'beta' (control variate coefficient, with control).
+    """
+    seeds = np.random.SeedSequence(seed).spawn(replications) if not isinstance(seed, np.random.SeedSequence) else seed.spawn(replications)
+    values, terminal = [], []
+    for s in seeds:
+        P = gbm_sample(S0, r, sigma, T, dt, -(-N // replications), sampler, bridge, s)
+        values.append(np.asarray(payoff(P), dtype = float))
+        terminal.append(P[-1])
+    values, terminal = np.array(values), np.array(terminal)
+    beta = 0.0
+    if control:
+        # One coefficient for all the replications (its estimation error is a bias of order 1 / samples)
+        covariance = np.cov(values.ravel(), terminal.ravel())
+        beta = covariance[0, 1] / covariance[1, 1]
+    adjusted = values - beta * (terminal - S0 * np.exp(r * T))
+    result = _report(adjusted.mean(axis = 1), values.var(ddof = 1), values.size)
+    result['beta'] = beta
+    return result
+
+def coin_flip_probability(flips, p = 0.5, sampler = 'pseudo', replications = 16, seed = None):
+    """Estimate the probability of heads of a coin (heads when u < p) with a sampler of SAMPLERS.
+
+    Args:
+        flips (int): Total number of flips (split over the replications).
+        p (float): True probability of heads (0.5: the fair coin of Coin_Flip-Monte_Carlo.py).
+        sampler (str): Name in SAMPLERS.
+        replications (int): Independent randomizations, for the standard error.
+        seed: Seed (int or SeedSequence).
+
+    Returns:
+        dict: As gbm_expectation ('variance_reduction' is inf when every replication gives the same estimate,
+              e.g. stratified or antithetic flips of a fair coin).
+    """
+    seeds = np.random.SeedSequence(seed).spawn(replications) if not isinstance(seed, np.random.SeedSequence) else seed.spawn(replications)
+    means, samples = [], 0
+    for s in seeds:
+        heads = uniforms(-(-flips // replications), 1, sampler, s)[:, 0] < p
+        means.append(heads.mean())
+        samples += heads.size
+    return _report(means, p * (1 - p), samples)
+
+def compare(estimator, samplers = tuple(SAMPLERS), **options):
+    """Run an estimator (gbm_expectation or coin_flip_probability, with its options) for several samplers."""
+    return {sampler: estimator(sampler = sampler, **options) for sampler in samplers}
+
+if __name__ == '__main__':
+    from scipy.stats import norm
+
+    # European call on the GBM of GBM.py (r as the risk-free rate), against the Black-Scholes price
+    S0, r, sigma, T, dt, K = 100, 0.05, 0.2, 1, 0.01, 100
+    d1 = (np.log(S0 / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
+    exact = S0 * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d1 - sigma * np.sqrt(T))
+    call = lambda P: np.exp(-r * T) * np.maximum(P[-1] - K, 0)
+    print('European call, 2^16 paths of 100 steps (Black-Scholes: {:.4f})'.format(exact))
+    for control in (False, True):
+        for sampler, result in compare(gbm_expectation, payoff = call, S0 = S0, r = r, sigma = sigma, T = T, dt = dt,
+                                       N = 2**16, control = control, seed = 0).items():
+            print('  {:<11} control = {!s:<5}  {:.4f} +- {:.4f}   variance reduction {:8.1f}'.format(
+                sampler, control, result['estimate'], result['stderr'], result['variance_reduction']))
+
+    # Arithmetic Asian call: the average price along the path, where the bridge matters
+    asian = lambda P: np.exp(-r * T) * np.maximum(P[1:].mean(axis = 0) - K, 0)
+    print('Asian call, Sobol points with and without the Brownian bridge:')
+    for bridge in (False, True):
+        result = gbm_expectation(asian, S0, r, sigma, T, dt, 2**16, 'sobol', bridge, control = True, seed = 0)
+        print('  bridge = {!s:<5}  {:.4f} +- {:.4f}   variance reduction {:8.1f}'.format(
+            bridge, result['estimate'], result['stderr'], result['variance_reduction']))
+
+    # Coin flips: a fair coin and a biased one
+    for p in (0.5, 0.3):
+        print('Coin with P(heads) = {}, 10^5 flips:'.format(p))
+        for sampler, result in compare(coin_flip_probability, flips = 10**5, p = p, seed = 0).items():
+            print('  {:<11} {:.5f} +- {:.5f}   variance reduction {:8.1f}'.format(
+                sampler, result['estimate'], result['stderr'], result['variance_reduction']))
@@ -0,0 +1,257 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+if __name__ == '__main__':      # run as a script: put the repository root on the path for mathematical_models
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import mathematical_models as mm
+
+"""
+ Headless batch rendering of model figures
+
+ The plotting functions of the scripts solve their model, create a new figure per plot and call plt.show().
+ For reports of many figures the computation and the drawing are separated: the trajectories are computed
+ first (e.g. by solve_seir_batch, gbm_paths, integrate_batch), then every figure is described by a spec, a plain
+ dict of arrays and text,
+
+    {'path': 'report/seir_S_I', 'title': ..., 'xlabel': ..., 'ylabel': ..., 'grid': False, 'xlim': None,
+     'ylim': None, 'xscale': 'linear', 'yscale': 'linear', 'legend': True, 'legend_loc': 'best',
+     'lines': [{'x': t, 'y': I, 'style': 'r', 'label': 'Infected'}, ...]}
+
+ ('y' may be 2-D, one line per row, e.g. GBM paths), and render_batch writes the files (PNG / PDF / SVG, from
+ `formats`). The drawing uses the Agg canvas directly (no pyplot, no window) and each Renderer keeps one figure,
+ one axes and its Line2D objects, updated in place from figure to figure. Lines longer than max_points are
+ decimated first, keeping the minimum and the maximum of each bucket of points so that peaks survive; the
+ specs are then split into chunks rendered by a pool of worker processes.
+"""
+
+# Matplotlib format strings ('b', '-r', '.b', '--', ...) -> colors, line styles and markers
+COLORS = 'bgrcmykw'
+LINESTYLES = ('--', '-.', '-', ':')
+MARKERS = '.,ov^<>1234sp*hH+xDd|_'
+
+def _format(fmt):
+    """Line2D properties of a matplotlib format string (as in plt.plot(x, y, fmt)), or of a color name ('orange')."""
+    from matplotlib.colors import is_color_like
+
+    if len(fmt) > 1 and is_color_like(fmt):
+        return {'color': fmt}
+    style = {}
+    for linestyle in LINESTYLES:
+        if linestyle in fmt:
+            style['linestyle'] = linestyle
+            fmt = fmt.replace(linestyle, '', 1)
+            break
+    for c in fmt:
+        if c in COLORS:
+            style['color'] = c
+        elif c in MARKERS:
+            style['marker'] = c
+        else:
+            raise ValueError('Unknown format character: ' + c)
+    if 'marker' in style and 'linestyle' not in style:
+        style['linestyle'] = 'None'          # '.b': markers only
+    return style
+
+def decimate(x, y, max_points = 2000):
+    """Reduce lines to about max_points points, keeping the minimum and the maximum of every bucket.
+
+    Args:
+        x: Horizontal values, shape (T,) (shared by all the lines).
+        y: Values of one line (T,) or of several lines (lines, T).
+        max_points (int): Points kept per line (the first and last points are always kept).
+
+    Returns:
+        tuple: (x, y), of shape (T',) if y was 1-D, otherwise (lines, T') each.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    T = y.shape[-1]
+    if T <= max_points:
+        return x, y
+    single = y.ndim == 1
+    y = np.atleast_2d(y)
+    buckets = max(1, (max_points - 2) // 2)
+    width = -(-T // buckets)
+    padded = np.pad(y, ((0, 0), (0, buckets * width - T)), mode = 'edge').reshape(len(y), buckets, width)
+    start = np.arange(buckets) * width
+    low = np.minimum(start + padded.argmin(axis = 2), T - 1)
+    high = np.minimum(start + padded.argmax(axis = 2), T - 1)
+    # Per bucket, its minimum and maximum in time order, plus the two ends of the line
+    index = np.sort(np.stack([low, high], axis = 2), axis = 2).reshape(len(y), -1)
+    index = np.concatenate([np.zeros((len(y), 1), int), index, np.full((len(y), 1), T - 1)], axis = 1)
+    xs, ys = x[index], np.take_along_axis(y, index, axis = 1)
+    return (xs[0], ys[0]) if single else (xs, ys)
+
+def prepare(spec, max_points = 2000):
+    """A copy of a figure spec with its lines split into rows and decimated to max_points points."""
+    lines = []
+    for line in spec.get('lines', []):
+        y = np.asarray(line['y'])
+        x = np.asarray(line['x']) if line.get('x') is not None else np.arange(y.shape[-1])
+        x, y = decimate(x, y, max_points)
+        rows = [(x, y)] if y.ndim == 1 else list(zip(x if x.ndim == 2 else [x] * len(y), y))
+        for i, (xi, yi) in enumerate(rows):
+            # a label of a 2-D line is given to its first row only (one legend entry)
+            lines.append(dict(line, x = xi, y = yi, label = line.get('label') if i == 0 else None))
+    return dict(spec, lines = lines)
+
+
+class Renderer:
+    """One Agg figure and axes, reused (with their lines) for every figure drawn.
+
+    Args:
+        figsize (tuple): Size of the figures in inches.
+        dpi (int): Resolution of the raster formats.
+    """
+
+    def __init__(self, figsize = (6.4, 4.8), dpi = 100):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        self.figure = Figure(figsize = figsize, dpi = dpi)
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.lines = []
+
+    def draw(self, spec):
+        """Draw a (prepared) figure spec on the axes."""
+        ax = self.ax
+        for i, line in enumerate(spec['lines']):
+            if i == len(self.lines):
+                self.lines.append(ax.plot([], [])[0])
+            artist = self.lines[i]
+            # Reset what the previous figure may have set, then apply the style of this line
+            artist.set(data = (line['x'], line['y']), visible = True, color = 'C{}'.format(i % 10), linestyle = '-',
+                       marker = 'None', linewidth = 1.5, alpha = None, label = line.get('label') or '_nolegend_')
+            style = line.get('style', {})
+            artist.set(**(_format(style) if isinstance(style, str) else style))
+        for artist in self.lines[len(spec['lines']):]:
+            artist.set(visible = False, label = '_nolegend_')
+
+        ax.set_title(spec.get('title', ''))
+        ax.set_xlabel(spec.get('xlabel', ''))
+        ax.set_ylabel(spec.get('ylabel', ''))
+        ax.set_xscale(spec.get('xscale', 'linear'))
+        ax.set_yscale(spec.get('yscale', 'linear'))
+        ax.grid(spec.get('grid', False))
+        ax.set_autoscale_on(True)
+        ax.relim(visible_only = True)
+        ax.autoscale_view()
+        if spec.get('xlim') is not None:
+            ax.set_xlim(spec['xlim'])
+        if spec.get('ylim') is not None:
+            ax.set_ylim(spec['ylim'])
+        if ax.get_legend() is not None:
+            ax.get_legend().remove()
+        if spec.get('legend', True) and any(line.get('label') for line in spec['lines']):
+            ax.legend(loc = spec.get('legend_loc', 'best'))
+
+    def save(self, spec, formats = ('png',)):
+        """Draw a spec and write it as spec['path'] + '.' + format for every format; returns the file names."""
+        self.draw(spec)
+        directory = os.path.dirname(spec['path'])
+        if directory:
+            os.makedirs(directory, exist_ok = True)
+        paths = []
+        for extension in formats:
+            paths.append(spec['path'] + '.' + extension)
+            self.figure.savefig(paths[-1], format = extension)
+        return paths
+
+def _render_chunk(job):
+    specs, formats, figsize, dpi = job
+    renderer = Renderer(figsize, dpi)
+    return [path for spec in specs for path in renderer.save(spec, formats)]
+
+def render_batch(specs, formats = ('png',), workers = None, chunk_size = None, max_points = 2000, figsize = (6.4, 4.8), dpi = 100):
+    """Write many figures, without a display, on a pool of worker processes.
+
+    Args:
+        specs (list): Figure specs (dicts, see above), each with its output 'path' (without extension).
+        formats (tuple): File formats written for every figure ('png', 'pdf', 'svg').
+        workers (int): Number of processes (default: all the cores). 1 renders in this process.
+        chunk_size (int): Figures per job (default: the figures split evenly over the workers, in a few jobs each).
+        max_points (int): Points kept per line by decimate.
+        figsize (tuple), dpi (int): Size and resolution of the figures.
+
+    Returns:
+        list: The names of the files written, in the order of specs and formats.
+    """
+    specs = [prepare(spec, max_points) for spec in specs]
+    if not specs:
+        return []
+    workers = workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, -(-len(specs) // (4 * workers)))
+    jobs = [(specs[start:start + chunk_size], tuple(formats), figsize, dpi) for start in range(0, len(specs), chunk_size)]
+    if workers == 1 or len(jobs) == 1:
+        results = [_render_chunk(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers = min(workers, len(jobs))) as executor:
+            results = list(executor.map(_render_chunk, jobs))          # map keeps the order of the jobs
+    return [path for paths in results for path in paths]
+
+"""-----------------------------------------------------------------"""
+
+# Specs of the figures of the scripts, from precomputed arrays:
+
+def growth_figure(path, t, P, labels, title, colors = None):
+    """Growth curves P (cases, len(t)) as in compare_r_cases / compare_k_cases."""
+    P = np.atleast_2d(P)
+    colors = colors or [mm.malthus_verhulst.case_color(i) for i in range(len(P))]
+    return {'path': path, 'title': title, 'xlabel': 'Time [days]', 'ylabel': 'Number of individuals',
+            'lines': [{'x': t, 'y': p, 'style': color, 'label': label} for p, color, label in zip(P, colors, labels)]}
+
+def sir_figure(path, t, X, N, title = 'Odeint Method', ylabel = 'Number of individuals'):
+    """S, I, R of one solution X (len(t), 3), as in Main_1 / Main_2."""
+    return {'path': path, 'title': title, 'xlabel': 'Time t, [days]', 'ylabel': ylabel, 'grid': True, 'ylim': (0, N),
+            'lines': [{'x': t, 'y': X[:, i], 'style': style, 'label': label}
+                      for i, (style, label) in enumerate([('b', 'Susceptible'), ('r', 'Infected'), ('g', 'Recoverd with immunity')])]}
+
+def seir_phase_space_figures(path, solutions, E0):
+    """The six projections of plot_seir_phase_space, for solutions (scenarios, len(t), 4)."""
+    names = ['Susceptible', 'Exposed', 'Infected', 'Recovered']
+    specs = []
+    for x, y in [(0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)]:
+        specs.append({'path': '{}_{}_{}'.format(path, names[x][0], names[y][0]), 'xlabel': names[x], 'ylabel': names[y],
+                      'title': 'SEIR Model Phase Space: {} vs {}'.format(names[x], names[y]),
+                      'lines': [{'x': sol[:, x], 'y': sol[:, y], 'label': 'E0 = {}'.format(e)} for sol, e in zip(solutions, E0)]})
+    return specs
+
+def gbm_figure(path, P):
+    """Price paths P (steps, paths) of gbm_paths, as in plot_gbm."""
+    P = np.asarray(P)
+    return {'path': path, 'title': 'Geometric Brownian Motion Model', 'xlabel': 'Steps', 'ylabel': 'Price',
+            'lines': [{'x': np.arange(P.shape[0]), 'y': P.T}]}
+
+def random_walk_figures(path, positions, prob_return):
+    """The two figures of Plot (Random_Walk-Monte_Carlo.py): a few walks (walks, steps) and the return probability."""
+    positions = np.atleast_2d(positions)
+    return [{'path': path + '_walks', 'title': 'Random Walks', 'xlabel': 'Step', 'ylabel': 'Position',
+             'lines': [{'y': p, 'style': {'color': 'C{}'.format(i % 10)}} for i, p in enumerate(positions)]},
+            {'path': path + '_return', 'title': 'Probability of Returning to the Origin for a Random Walk',
+             'xlabel': 'Step', 'ylabel': 'Probability of returning to origin', 'lines': [{'y': prob_return}]}]
+
+if __name__ == '__main__':
+    import tempfile
+    import time
+
+    # A report of the SIR model over a grid of (beta, gamma): one figure per scenario, plus the scripts' figures
+    directory = sys.argv[1] if len(sys.argv) > 1 else tempfile.mkdtemp(prefix = 'model_figures_')
+    N, t = 350, np.linspace(0, 160, 161)
+    beta, gamma = np.meshgrid(np.linspace(0.05, 0.6, 20), np.linspace(0.05, 0.3, 10))
+    beta, gamma = beta.ravel(), gamma.ravel()
+    X = mm.integrate_batch('sir', [N - 1, 1, 0], t, np.stack([np.full(beta.size, N), beta, gamma], axis = 1), method = 'rk45')
+    specs = [sir_figure(os.path.join(directory, 'sir_{:03d}'.format(i)), t, X[i], N,
+                        title = 'beta = {:.3f}, gamma = {:.3f}, Rzero = {:.2f}'.format(beta[i], gamma[i], beta[i] / gamma[i]))
+             for i in range(beta.size)]
+
+    E0 = np.linspace(0, 100, 5)
+    specs += seir_phase_space_figures(os.path.join(directory, 'seir'), mm.solve_seir_batch(0.3, 0.1, 0.05, 1000, E0, np.linspace(0, 365, 366)), E0)
+    specs.append(gbm_figure(os.path.join(directory, 'gbm'), mm.gbm_paths(100, 0.05, 0.2, 1, 1e-4, 100, seed = 0)))   # 10^4 steps, decimated
+
+    start = time.perf_counter()
+    files = render_batch(specs, formats = ('png',))
+    seconds = time.perf_counter() - start
+    print(len(files), 'files written to', directory, 'in', format(seconds, '.2f'), 's (' + format(len(files) / seconds, '.1f'), 'figures/s)')
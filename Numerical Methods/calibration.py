@@ -0,0 +1,335 @@
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.integrate import ODEintWarning, odeint
+from scipy.optimize import least_squares, minimize
+from scipy.special import gammaln
+
+if __name__ == '__main__':      # run as a script: put the repository root on the path for mathematical_models
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mathematical_models.ode_solver import ATOL, RTOL
+
+"""
+ Calibration of the SIR and SEIR models to observed daily incidence
+
+ The scripts hard-code their parameters (beta = 0.3, gamma = 0.1, sigma = 0.05 in SEIR Model.py). Here they are
+ fitted to a series of daily case counts y_k (cases reported during day k). The model incidence over day k is
+ mu_k = Z(k + 1) - Z(k), with Z the cumulative number of new infectious individuals, integrated with the model:
+
+    SEIR:  dZ/dt = sigma * E       fitted: beta, gamma, sigma, E0      (I0 fixed, S0 = N - E0 - I0)
+    SIR:   dZ/dt = beta * S * I / N  fitted: beta, gamma, I0            (S0 = N - I0)
+
+ Objectives:
+
+    'least_squares':      sum (mu_k - y_k)^2                        (scipy.optimize.least_squares)
+    'poisson':            -log-likelihood of y_k ~ Poisson(mu_k)      (scipy.optimize.minimize, L-BFGS-B)
+    'negative_binomial':  y_k ~ NB(mean mu_k, dispersion k)          (over-dispersed counts)
+
+ The gradients are exact, from the forward sensitivity equations: with s_j = dX/dtheta_j,
+
+    ds_j/dt = J(X) s_j + df/dtheta_j,    s_j(0) = dX0/dtheta_j
+
+ integrated together with the model (one odeint call gives mu and dmu/dtheta), instead of one extra solve per
+ parameter for finite differences. The parameters are optimized through their logarithms (they stay positive);
+ the last solve is reused when the optimizer asks for the Jacobian at the point where it just evaluated the
+ residuals. fit_many calibrates many series (regions) on a process pool, each starting from its previous fit
+ (warm start: e.g. yesterday's parameters for today's nightly run) when one is given.
+"""
+
+# Model equations with the cumulative incidence Z as last state: derivative f, its Jacobian J = df/dX,
+# df/dtheta, the initial state and dX0/dtheta; theta holds the fitted parameters in the order of 'parameters'
+
+def _seir(X, theta, N):
+    S, E, I, R, Z = X
+    beta, gamma, sigma, E0 = theta
+    infection = beta * S * I / N
+    return np.array([-infection, infection - sigma * E, sigma * E - gamma * I, gamma * I, sigma * E])
+
+def _seir_jacobian(X, theta, N):
+    S, E, I, R, Z = X
+    beta, gamma, sigma, E0 = theta
+    return np.array([[-beta * I / N, 0, -beta * S / N, 0, 0],
+                     [beta * I / N, -sigma, beta * S / N, 0, 0],
+                     [0, sigma, -gamma, 0, 0],
+                     [0, 0, gamma, 0, 0],
+                     [0, sigma, 0, 0, 0]])
+
+def _seir_parameters(X, theta, N):
+    S, E, I, R, Z = X
+    contact = S * I / N
+    #                beta      gamma   sigma  E0
+    return np.array([[-contact, 0, 0, 0],
+                     [contact, 0, -E, 0],
+                     [0, -I, E, 0],
+                     [0, I, 0, 0],
+                     [0, 0, E, 0]])
+
+def _seir_initial(theta, N, I0 = 0):
+    E0 = theta[3]
+    return np.array([N - E0 - I0, E0, I0, 0, 0]), np.array([[0, 0, 0, -1], [0, 0, 0, 1], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]])
+
+def _sir(X, theta, N):
+    S, I, R, Z = X
+    beta, gamma, I0 = theta
+    infection = beta * S * I / N
+    return np.array([-infection, infection - gamma * I, gamma * I, infection])
+
+def _sir_jacobian(X, theta, N):
+    S, I, R, Z = X
+    beta, gamma, I0 = theta
+    return np.array([[-beta * I / N, -beta * S / N, 0, 0],
+                     [beta * I / N, beta * S / N - gamma, 0, 0],
+                     [0, gamma, 0, 0],
+                     [beta * I / N, beta * S / N, 0, 0]])
+
+def _sir_parameters(X, theta, N):
+    S, I, R, Z = X
+    contact = S * I / N
+    #                beta      gamma  I0
+    return np.array([[-contact, 0, 0],
+                     [contact, -I, 0],
+                     [0, I, 0],
+                     [contact, 0, 0]])
+
+def _sir_initial(theta, N):
+    I0 = theta[2]
+    return np.array([N - I0, I0, 0, 0]), np.array([[0, 0, -1], [0, 0, 1], [0, 0, 0], [0, 0, 0]])
+
+# Model -> (fitted parameters, their defaults (those of the scripts), f, J, df/dtheta, initial state)
+MODELS = {
+    'seir': (('beta', 'gamma', 'sigma', 'E0'), (0.3, 0.1, 0.05, 1.0), _seir, _seir_jacobian, _seir_parameters, _seir_initial),
+    'sir': (('beta', 'gamma', 'I0'), (0.4, 0.1, 1.0), _sir, _sir_jacobian, _sir_parameters, _sir_initial),
+}
+
+# Search box of the rates (per day); the initial numbers go from 1e-3 to N
+BOUNDS = {'beta': (1e-4, 20.0), 'gamma': (1e-4, 10.0), 'sigma': (1e-4, 10.0)}
+# Box of the screened starting points (plausible epidemics); the initial numbers go from 1 to N / 1000
+STARTS = {'beta': (0.05, 2.0), 'gamma': (0.02, 1.0), 'sigma': (0.02, 1.0)}
+
+def incidence(model, theta, N, days, sensitivities = False, rtol = RTOL, atol = ATOL, **initial):
+    """Daily incidence of the model over `days` days (and its derivatives with respect to the parameters).
+
+    Args:
+        model (str): 'seir' or 'sir'.
+        theta: Values of the parameters of MODELS[model] (e.g. beta, gamma, sigma, E0).
+        N (float): Population.
+        days (int): Number of days.
+        sensitivities (bool): Also integrate the forward sensitivity equations.
+        rtol, atol (float): Tolerances of odeint.
+        initial: Fixed initial values (I0 of the SEIR model).
+
+    Returns:
+        ndarray: mu, shape (days,), or (mu, dmu/dtheta of shape (days, parameters)) with sensitivities.
+    """
+    names, defaults, f, jacobian, parameters, start = MODELS[model]
+    theta = np.asarray(theta, dtype = float)
+    X0, dX0 = start(theta, N, **initial)
+    t = np.arange(days + 1, dtype = float)
+    n, p = X0.size, theta.size
+    if not sensitivities:
+        X = odeint(lambda X, s: f(X, theta, N), X0, t, Dfun = lambda X, s: jacobian(X, theta, N), rtol = rtol, atol = atol)
+        return np.diff(X[:, -1])
+
+    def augmented(y, s):
+        X, sens = y[:n], y[n:].reshape(n, p)
+        return np.concatenate([f(X, theta, N), (jacobian(X, theta, N) @ sens + parameters(X, theta, N)).ravel()])
+    y = odeint(augmented, np.concatenate([X0, dX0.ravel()]), t, rtol = rtol, atol = atol)
+    Z, dZ = y[:, n - 1], y[:, n:].reshape(len(t), n, p)[:, -1]
+    return np.diff(Z), np.diff(dZ, axis = 0)
+
+"""-----------------------------------------------------------------"""
+
+# Objectives: negative log-likelihoods (constant terms included) and their derivative with respect to mu
+
+def _poisson(mu, y, dispersion):
+    return np.sum(mu - y * np.log(mu) + gammaln(y + 1)), 1 - y / mu
+
+def _negative_binomial(mu, y, k):
+    value = -np.sum(gammaln(y + k) - gammaln(k) - gammaln(y + 1) + k * np.log(k / (k + mu)) + y * np.log(mu / (k + mu)))
+    return value, (k + y) / (k + mu) - y / mu
+
+LIKELIHOODS = {'poisson': _poisson, 'negative_binomial': _negative_binomial}
+
+def _screen(model, theta, free, names, N, days, extra, y, weights, starts, seed, rtol, atol):
+    """The given point (log values of the free parameters) followed by starts - 1 points of a Latin hypercube of
+    STARTS, sorted by their weighted sum of squares (one solve without sensitivities each)."""
+    rng = np.random.default_rng(seed)
+    low, high = np.log([STARTS.get(names[i], (1.0, max(N / 1000, 1.0))) for i in free]).T
+    u = (np.argsort(rng.random((len(free), starts - 1)), axis = 1) + rng.random((len(free), starts - 1))) / (starts - 1)
+    points = list((low[:, None] + (high - low)[:, None] * u).T)
+    costs = []
+    for phi in points:
+        trial = theta.copy()
+        trial[free] = np.exp(phi)
+        with np.errstate(all = 'ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', ODEintWarning)         # wild starting points are only ranked
+            mu = incidence(model, trial, N, days, rtol = rtol, atol = atol, **extra)
+        cost = np.sum((weights * (mu - y))**2)
+        costs.append(cost if np.isfinite(cost) else np.inf)
+    return [np.log(theta[free])] + [points[k] for k in np.argsort(costs)]
+
+def fit(model, cases, N, parameters = None, initial = None, fixed = None, objective = 'least_squares', dispersion = 10.0,
+        starts = None, refine = 3, seed = 0, rtol = 1e-8, atol = 1e-8, max_iterations = 200):
+    """Fit parameters of a model to a daily incidence series.
+
+    Args:
+        model (str): 'seir' or 'sir'.
+        cases: Observed cases of each day, shape (days,).
+        N (float): Population.
+        parameters (tuple): Names of the fitted parameters (default: all of MODELS[model], e.g. beta, gamma,
+                            sigma, E0); the others keep their value from `fixed` or the defaults.
+        initial (dict): Starting values (warm start), name -> value (default: the defaults of the scripts).
+        fixed (dict): Values of the parameters that are not fitted, and fixed initial values (I0 for SEIR).
+        objective (str): 'least_squares', 'poisson' or 'negative_binomial'.
+        dispersion (float): Dispersion k of the negative binomial (variance mu + mu^2 / k).
+        starts (int): Starting points: the starting values, plus starts - 1 points of a Latin hypercube of
+                      STARTS screened with one cheap solve each. Default: 1 with a warm start (initial given),
+                      64 otherwise.
+        refine (int): Number of starting points optimized (the starting values and the best screened points);
+                      the best fit is kept.
+        seed: Seed of the Latin hypercube.
+        rtol, atol (float): Tolerances of the solves.
+        max_iterations (int): Iterations of the optimizer, per starting point.
+
+    Returns:
+        dict: 'parameters' (name -> fitted value), 'objective' (final value), 'prediction' (fitted incidence),
+              'success', 'message', 'solves' (number of model solves with sensitivities), 'seconds'.
+    """
+    start_time = time.perf_counter()
+    names, defaults = MODELS[model][:2]
+    if objective not in ('least_squares',) + tuple(LIKELIHOODS):
+        raise ValueError("objective must be 'least_squares', " + ', '.join("'" + name + "'" for name in LIKELIHOODS))
+    parameters = tuple(parameters or names)
+    fixed = dict(fixed or {})
+    values = dict(zip(names, defaults))
+    values.update({name: value for name, value in fixed.items() if name in names})
+    values.update(initial or {})
+    extra = {name: value for name, value in fixed.items() if name not in names}        # I0 of SEIR
+    free = [names.index(name) for name in parameters]
+    y = np.asarray(cases, dtype = float)
+    days = y.size
+
+    theta = np.array([values[name] for name in names], dtype = float)
+    bounds = np.log([BOUNDS.get(name, (1e-3, N)) for name in parameters]).T
+    theta[free] = np.exp(np.clip(np.log(theta[free]), bounds[0], bounds[1]))
+    solves = [0]
+    last = {}
+
+    def solve(phi):
+        # One solve (model and sensitivities) per point, shared by the residuals and the Jacobian
+        key = phi.tobytes()
+        if last.get('key') != key:
+            theta[free] = np.exp(phi)
+            mu, dmu = incidence(model, theta, N, days, True, rtol, atol, **extra)
+            last.update(key = key, mu = mu, dmu = dmu[:, free] * theta[free])      # chain rule: d theta / d phi = theta
+            solves[0] += 1
+        return last['mu'], last['dmu']
+
+    # Least squares, weighted by 1 / sqrt(cases) for the likelihoods (Neyman's chi-square, close to the Poisson
+    # likelihood): Gauss-Newton steps converge from much further away than a quasi-Newton method on the likelihood
+    weights = 1 / np.sqrt(np.maximum(y, 1)) if objective in LIKELIHOODS else np.ones(days)
+    likelihood = LIKELIHOODS.get(objective)
+
+    def negative_log_likelihood(phi):
+        mu, dmu = solve(phi)
+        mu = np.maximum(mu, 1e-12)
+        value, dvalue = likelihood(mu, y, dispersion)
+        return value, dvalue @ dmu
+
+    def optimize(phi):
+        result = least_squares(lambda phi: weights * (solve(phi)[0] - y), phi, jac = lambda phi: weights[:, None] * solve(phi)[1],
+                               bounds = bounds, x_scale = 'jac', method = 'trf', max_nfev = max_iterations)
+        if likelihood is None:
+            return 2 * result.cost, result.success, result.message, result.x
+        # then the likelihood itself, from there
+        result = minimize(negative_log_likelihood, result.x, jac = True, method = 'L-BFGS-B', bounds = bounds.T,
+                          options = {'maxiter': max_iterations})
+        return result.fun, result.success, result.message, result.x
+
+    starts = starts or (1 if initial else 64)
+    candidates = _screen(model, theta, free, names, N, days, extra, y, weights, starts, seed, rtol, atol) if starts > 1 else [np.log(theta[free])]
+    with warnings.catch_warnings():
+        # the optimizers may try far-off points on the way: their solves are poor, but they are not kept
+        warnings.simplefilter('ignore', ODEintWarning)
+        value, success, message, phi = min((optimize(phi) for phi in candidates[:refine]), key = lambda fit: fit[0])
+
+    theta[free] = np.exp(phi)
+    return {'parameters': dict(zip(names, theta.tolist())), 'objective': float(value),
+            'prediction': incidence(model, theta, N, days, rtol = rtol, atol = atol, **extra),
+            'success': bool(success), 'message': str(message), 'solves': solves[0], 'seconds': time.perf_counter() - start_time}
+
+def _fit_job(job):
+    name, model, cases, N, initial, options = job
+    try:
+        return name, fit(model, cases, N, initial = initial, **options)
+    except Exception as error:            # one bad series must not stop the whole batch
+        return name, {'success': False, 'message': repr(error)}
+
+def fit_many(model, series, N, previous = None, workers = None, **options):
+    """Fit many incidence series (e.g. one per region) on a process pool.
+
+    Args:
+        model (str): 'seir' or 'sir'.
+        series (dict): Name -> observed daily cases.
+        N: Population, a number or a dict name -> population.
+        previous (dict): Earlier results of fit_many (name -> result): their parameters are the starting points
+                         (warm start) of the series they name.
+        workers (int): Number of processes (default: all the cores). 1 fits in this process.
+        options: Other arguments of fit (parameters, fixed, objective, ...).
+
+    Returns:
+        dict: Name -> result of fit (or {'success': False, 'message': ...} if the fit failed).
+    """
+    previous = previous or {}
+    jobs = [(name, model, cases, N[name] if isinstance(N, dict) else N,
+             previous[name].get('parameters') if name in previous else None, options) for name, cases in series.items()]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        results = [_fit_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers = min(workers, len(jobs))) as executor:
+            results = list(executor.map(_fit_job, jobs, chunksize = max(1, len(jobs) // (4 * workers))))
+    return dict(results)
+
+def plot_fit(cases, result, title = 'Calibration'):
+    import matplotlib.pyplot as plt
+
+    days = np.arange(len(cases))
+    plt.figure()
+    plt.plot(days, cases, '.k', label = 'Observed cases')
+    plt.plot(days, result['prediction'], 'r', label = 'Fitted model: ' + ', '.join(
+        '{} = {:.3g}'.format(name, value) for name, value in result['parameters'].items()))
+    plt.xlabel('Time t, [days]')
+    plt.ylabel('Daily cases')
+    plt.title(title)
+    plt.legend()
+    plt.show()
+
+if __name__ == '__main__':
+    # Synthetic outbreak: the SEIR model of SEIR Model.py with other rates, observed with Poisson noise
+    rng = np.random.default_rng(0)
+    N, days = 10**5, 150
+    truth = (0.45, 0.15, 0.2, 20.0)
+    cases = rng.poisson(incidence('seir', truth, N, days))
+
+    for objective in ('least_squares', 'poisson', 'negative_binomial'):
+        result = fit('seir', cases, N, objective = objective)
+        print(objective + ':', {name: round(value, 4) for name, value in result['parameters'].items()},
+              '(truth:', dict(zip(MODELS['seir'][0], truth)), ')', result['solves'], 'solves,', format(result['seconds'], '.2f'), 's')
+    plot_fit(cases, result, 'SEIR Model - Calibration to daily cases')
+
+    # Many regions in parallel, then the next night's run warm-started from these fits
+    betas = rng.uniform(0.3, 0.6, 16)
+    series = {'region {}'.format(i): rng.poisson(incidence('seir', (beta, 0.15, 0.2, 20.0), N, days)) for i, beta in enumerate(betas)}
+    start = time.perf_counter()
+    fits = fit_many('seir', series, N, objective = 'poisson')
+    print(len(series), 'regions fitted in', format(time.perf_counter() - start, '.2f'), 's')
+    series = {name: np.append(cases, rng.poisson(cases[-1])) for name, cases in series.items()}         # one more day
+    start = time.perf_counter()
+    fits = fit_many('seir', series, N, previous = fits, objective = 'poisson')
+    print('warm-started refit:', format(time.perf_counter() - start, '.2f'), 's, largest relative error on Rzero = beta / gamma:',
+          format(np.max(np.abs([fits[name]['parameters']['beta'] / fits[name]['parameters']['gamma'] for name in series] / (betas / 0.15) - 1)), '.3f'))
@@ -0,0 +1,347 @@
+import warnings
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:             # optional: without numba the batches are integrated with vectorized NumPy code
+    numba = None
+
+"""
+ Compiled right-hand sides and Runge-Kutta integrators for batches of scenarios
+
+ odeint and solve_ivp call back into Python for every evaluation of the right-hand side, and for the small
+ models of this repository that callback costs far more than the arithmetic. Here the right-hand side of each
+ model is written once, indexing the compartments and parameters on the first axis,
+
+    rhs(t, x, p, out):  x[0], x[1], ... the compartments, p[0], p[1], ... the parameters, out receives dx/dt
+
+ so that the same function works for one scenario (x of shape (compartments,)) and for a whole batch
+ (x of shape (compartments, scenarios)). Two integrators:
+
+    'rk4':   classic 4th order Runge-Kutta, `substeps` fixed steps between consecutive time points
+    'rk45':  Dormand-Prince 5(4) with an adaptive step (error per component within atol + rtol * |x|)
+
+ With numba installed the right-hand sides and the integrators are JIT-compiled (nopython mode, on the first
+ call in a process): every scenario is solved with scalar arithmetic, each with its own adaptive step, without
+ returning to Python. Without numba the batch is integrated at once with NumPy, one array operation per stage
+ for all the scenarios (the adaptive step is then shared by the batch).
+
+ rk45 drops a scenario whose error estimate stops being finite (e.g. N = 0 in the SIR model) or which needs a
+ step below H_MIN times the current time (e.g. a logistic curve blowing up with k < 0 and P0 > K): its solution
+ is NaN from that time point on, integrate_batch warns about it, and the other scenarios carry on. More than
+ max_steps steps for a scenario raise a RuntimeError, as ode_solver.solve_ode does for odeint failures.
+"""
+
+HAVE_NUMBA = numba is not None
+
+def jit(function):
+    return numba.njit(error_model = 'numpy')(function) if HAVE_NUMBA else function
+
+"""-----------------------------------------------------------------"""
+
+# Right-hand sides (same equations as the model scripts):
+
+@jit
+def seir_rhs(t, x, p, out):
+    # x: S, E, I, R    p: N, beta, gamma, sigma
+    infection = p[1] * x[0] * x[2] / p[0]
+    out[0] = -infection
+    out[1] = infection - p[3] * x[1]
+    out[2] = p[3] * x[1] - p[2] * x[2]
+    out[3] = p[2] * x[2]
+
+@jit
+def sir_rhs(t, x, p, out):
+    # x: S, I, R    p: N, beta, gamma
+    infection = p[1] * x[0] * x[1] / p[0]
+    out[0] = -infection
+    out[1] = infection - p[2] * x[1]
+    out[2] = p[2] * x[1]
+
+@jit
+def malthus_rhs(t, x, p, out):
+    # x: P    p: r
+    out[0] = p[0] * x[0]
+
+@jit
+def logistic_rhs(t, x, p, out):
+    # x: P    p: k, K
+    out[0] = p[0] * x[0] * (1 - x[0] / p[1])
+
+@jit
+def lotka_volterra_rhs(t, x, p, out):
+    # x: prey, predators    p: a, b, d, g
+    out[0] = x[0] * (p[0] - p[1] * x[1])
+    out[1] = x[1] * (p[2] * x[0] - p[3])
+
+# Model name -> (right-hand side, compartments, parameter names)
+MODELS = {
+    'seir': (seir_rhs, ('S', 'E', 'I', 'R'), ('N', 'beta', 'gamma', 'sigma')),
+    'sir': (sir_rhs, ('S', 'I', 'R'), ('N', 'beta', 'gamma')),
+    'malthus': (malthus_rhs, ('P',), ('r',)),
+    'logistic': (logistic_rhs, ('P',), ('k', 'K')),
+    'lotka_volterra': (lotka_volterra_rhs, ('x', 'y'), ('a', 'b', 'd', 'g')),
+}
+
+"""-----------------------------------------------------------------"""
+
+# Dormand-Prince 5(4) coefficients
+A21 = 1/5
+A31, A32 = 3/40, 9/40
+A41, A42, A43 = 44/45, -56/15, 32/9
+A51, A52, A53, A54 = 19372/6561, -25360/2187, 64448/6561, -212/729
+A61, A62, A63, A64, A65 = 9017/3168, -355/33, 46732/5247, 49/176, -5103/18656
+B1, B3, B4, B5, B6 = 35/384, 500/1113, 125/192, -2187/6784, 11/84
+E1, E3, E4, E5, E6, E7 = 71/57600, -71/16695, 71/1920, -17253/339200, 22/525, -1/40
+
+# Smallest rk45 step, relative to max(|t|, time span)
+H_MIN = 10 * np.finfo(float).eps
+
+@jit
+def step_factor(norm):
+    """Standard step size control: new step / old step from the scaled error norm."""
+    return min(5.0, max(0.2, 0.9 * norm ** -0.2)) if norm > 0 else 5.0
+
+# Compiled integrators: one scenario after the other, scalar loops over the compartments
+
+@jit
+def _rk4_compiled(rhs, X0, t, P, substeps):
+    scenarios, C = X0.shape
+    out = np.empty((scenarios, t.size, C))
+    for n in range(scenarios):
+        p = P[n]
+        x, y = X0[n].copy(), np.empty(C)
+        k1, k2, k3, k4 = np.empty(C), np.empty(C), np.empty(C), np.empty(C)
+        out[n, 0] = x
+        for i in range(1, t.size):
+            h = (t[i] - t[i - 1]) / substeps
+            s = t[i - 1]
+            for _ in range(substeps):
+                rhs(s, x, p, k1)
+                for c in range(C):
+                    y[c] = x[c] + h / 2 * k1[c]
+                rhs(s + h / 2, y, p, k2)
+                for c in range(C):
+                    y[c] = x[c] + h / 2 * k2[c]
+                rhs(s + h / 2, y, p, k3)
+                for c in range(C):
+                    y[c] = x[c] + h * k3[c]
+                rhs(s + h, y, p, k4)
+                for c in range(C):
+                    x[c] += h / 6 * (k1[c] + 2 * k2[c] + 2 * k3[c] + k4[c])
+                s += h
+            out[n, i] = x
+    return out
+
+@jit
+def _rk45_compiled(rhs, X0, t, P, rtol, atol, max_steps):
+    scenarios, C = X0.shape
+    out = np.empty((scenarios, t.size, C))
+    span = t[-1] - t[0]
+    steps = 0
+    for n in range(scenarios):
+        p = P[n]
+        x, y, z = X0[n].copy(), np.empty(C), np.empty(C)
+        k1, k2, k3, k4 = np.empty(C), np.empty(C), np.empty(C), np.empty(C)
+        k5, k6, k7 = np.empty(C), np.empty(C), np.empty(C)
+        out[n, 0] = x
+        h = span / 1000
+        scenario_steps = 0
+        failed = False
+        for i in range(1, t.size):
+            if failed:
+                out[n, i] = np.nan
+                continue
+            s = t[i - 1]
+            while s < t[i]:
+                h = min(h, t[i] - s)
+                rhs(s, x, p, k1)
+                for c in range(C):
+                    y[c] = x[c] + h * A21 * k1[c]
+                rhs(s + h / 5, y, p, k2)
+                for c in range(C):
+                    y[c] = x[c] + h * (A31 * k1[c] + A32 * k2[c])
+                rhs(s + 3 * h / 10, y, p, k3)
+                for c in range(C):
+                    y[c] = x[c] + h * (A41 * k1[c] + A42 * k2[c] + A43 * k3[c])
+                rhs(s + 4 * h / 5, y, p, k4)
+                for c in range(C):
+                    y[c] = x[c] + h * (A51 * k1[c] + A52 * k2[c] + A53 * k3[c] + A54 * k4[c])
+                rhs(s + 8 * h / 9, y, p, k5)
+                for c in range(C):
+                    y[c] = x[c] + h * (A61 * k1[c] + A62 * k2[c] + A63 * k3[c] + A64 * k4[c] + A65 * k5[c])
+                rhs(s + h, y, p, k6)
+                for c in range(C):
+                    z[c] = x[c] + h * (B1 * k1[c] + B3 * k3[c] + B4 * k4[c] + B5 * k5[c] + B6 * k6[c])
+                rhs(s + h, z, p, k7)
+                norm = 0.0
+                for c in range(C):
+                    error = h * (E1 * k1[c] + E3 * k3[c] + E4 * k4[c] + E5 * k5[c] + E6 * k6[c] + E7 * k7[c])
+                    ratio = abs(error) / (atol + rtol * max(abs(x[c]), abs(z[c])))
+                    norm = max(norm, ratio) if ratio == ratio else np.inf      # max() would drop a NaN
+                steps += 1
+                scenario_steps += 1
+                if norm <= 1.0:
+                    s += h
+                    x[:] = z
+                h *= step_factor(norm)
+                if not np.isfinite(norm) or h < H_MIN * max(abs(s), span):
+                    failed = True
+                    break
+                if scenario_steps > max_steps:
+                    raise RuntimeError('rk45: more than max_steps steps')
+            if failed:
+                out[n, i] = np.nan
+            else:
+                out[n, i] = x
+    return out, steps
+
+
+# NumPy integrators: the whole batch at once, arrays of shape (compartments, scenarios)
+
+def _rk4_numpy(rhs, X0, t, P, substeps):
+    x = X0.T.copy()
+    P = P.T.copy()
+    out = np.empty((X0.shape[0], t.size, X0.shape[1]))
+    out[:, 0] = X0
+    k1, k2, k3, k4 = (np.empty_like(x) for _ in range(4))
+    for i in range(1, t.size):
+        h = (t[i] - t[i - 1]) / substeps
+        s = t[i - 1]
+        for _ in range(substeps):
+            rhs(s, x, P, k1)
+            rhs(s + h / 2, x + h / 2 * k1, P, k2)
+            rhs(s + h / 2, x + h / 2 * k2, P, k3)
+            rhs(s + h, x + h * k3, P, k4)
+            x += h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+            s += h
+        out[:, i] = x.T
+    return out
+
+def _rk45_numpy(rhs, X0, t, P, rtol, atol, max_steps):
+    x = X0.T.copy()
+    P = P.T.copy()
+    out = np.empty((X0.shape[0], t.size, X0.shape[1]))
+    out[:, 0] = X0
+    k1, k2, k3, k4, k5, k6, k7 = (np.empty_like(x) for _ in range(7))
+    span = t[-1] - t[0]
+    h = span / 1000
+    failed = np.zeros(X0.shape[0], dtype = bool)         # scenarios dropped after a non-finite error estimate
+    steps = 0
+    for i in range(1, t.size):
+        s = t[i - 1]
+        while s < t[i] and not failed.all():
+            h = min(h, t[i] - s)
+            rhs(s, x, P, k1)
+            rhs(s + h / 5, x + h * A21 * k1, P, k2)
+            rhs(s + 3 * h / 10, x + h * (A31 * k1 + A32 * k2), P, k3)
+            rhs(s + 4 * h / 5, x + h * (A41 * k1 + A42 * k2 + A43 * k3), P, k4)
+            rhs(s + 8 * h / 9, x + h * (A51 * k1 + A52 * k2 + A53 * k3 + A54 * k4), P, k5)
+            rhs(s + h, x + h * (A61 * k1 + A62 * k2 + A63 * k3 + A64 * k4 + A65 * k5), P, k6)
+            z = x + h * (B1 * k1 + B3 * k3 + B4 * k4 + B5 * k5 + B6 * k6)
+            rhs(s + h, z, P, k7)
+            error = h * (E1 * k1 + E3 * k3 + E4 * k4 + E5 * k5 + E6 * k6 + E7 * k7)
+            norms = np.max(np.abs(error) / (atol + rtol * np.maximum(np.abs(x), np.abs(z))), axis = 0)
+            dropped = ~np.isfinite(norms) & ~failed
+            if h * step_factor(float(np.max(norms, where = ~failed | dropped, initial = 0.0))) < H_MIN * max(abs(s), span):
+                dropped |= (norms > 1.0) & ~failed         # the scenarios rejecting the step cannot go on
+            if dropped.any():
+                failed |= dropped
+                x[:, failed] = np.nan
+                z[:, failed] = np.nan
+            norm = float(np.max(norms, where = ~failed, initial = 0.0))      # worst remaining scenario
+            steps += 1
+            if norm <= 1.0:
+                s += h
+                x = z
+            h *= step_factor(norm)
+            if steps > max_steps:
+                raise RuntimeError('rk45: more than max_steps steps')
+        out[:, i] = x.T
+    return out, steps
+
+"""-----------------------------------------------------------------"""
+
+def integrate_batch(model, X0, t, params, method = 'rk4', substeps = 10, rtol = 1e-6, atol = 1e-6, max_steps = 10**6,
+                    compiled = None):
+    """Integrate a batch of scenarios of one model with a Runge-Kutta method.
+
+    Args:
+        model (str or function): A name of MODELS, or a right-hand side rhs(t, x, p, out)
+                                 (decorated with jit to be compiled).
+        X0: Initial states, shape (scenarios, compartments), or (compartments,) shared by all scenarios.
+        t: Time points (the first one is the initial time).
+        params: Parameters, shape (scenarios, parameters), or (parameters,) shared by all scenarios.
+        method (str): 'rk4' (fixed steps) or 'rk45' (adaptive).
+        substeps (int): Number of rk4 steps between consecutive time points.
+        rtol, atol (float): Tolerances of rk45.
+        max_steps (int): Maximum number of rk45 steps per scenario (RuntimeError beyond).
+        compiled (bool): Use the compiled integrators (default: when numba is installed).
+
+    Returns:
+        ndarray: Array of shape (scenarios, len(t), compartments); NaN from the time point where a scenario
+                 was dropped by rk45 (non-finite error estimate).
+    """
+    rhs = MODELS[model][0] if isinstance(model, str) else model
+    compiled = HAVE_NUMBA if compiled is None else compiled
+    if compiled and not HAVE_NUMBA:
+        raise ImportError('The compiled integrators need numba')
+    X0 = np.atleast_2d(np.asarray(X0, dtype = float))
+    params = np.atleast_2d(np.asarray(params, dtype = float))
+    scenarios = max(X0.shape[0], params.shape[0])
+    # Writable C-ordered copies, so that the compiled integrators always see the same argument types
+    X0 = np.array(np.broadcast_to(X0, (scenarios, X0.shape[1])), order = 'C')
+    params = np.array(np.broadcast_to(params, (scenarios, params.shape[1])), order = 'C')
+    t = np.asarray(t, dtype = float)
+    if method == 'rk4':
+        return (_rk4_compiled if compiled else _rk4_numpy)(rhs, X0, t, params, int(substeps))
+    if method == 'rk45':
+        with np.errstate(over = 'ignore', invalid = 'ignore'):          # non-finite scenarios are dropped
+            X = (_rk45_compiled if compiled else _rk45_numpy)(rhs, X0, t, params, float(rtol), float(atol),
+                                                              int(max_steps))[0]
+        dropped = np.flatnonzero(np.isnan(X[:, -1]).any(axis = 1) & ~np.isnan(X0).any(axis = 1))
+        if dropped.size:
+            warnings.warn('rk45 dropped {} scenario(s) (non-finite or vanishing step), e.g. {}; they are NaN from '
+                          'then on'.format(dropped.size, dropped[:10].tolist()), RuntimeWarning)
+        return X
+    raise ValueError("method must be 'rk4' or 'rk45'")
+
+def odeint_rhs(model):
+    """A right-hand side of MODELS in odeint's convention f(X, t, *params), for a single scenario."""
+    rhs, compartments, names = MODELS[model]
+    def f(X, t, *params):
+        out = np.empty(len(compartments))
+        rhs(t, np.asarray(X, dtype = float), np.asarray(params, dtype = float), out)
+        return out
+    return f
+
+if __name__ == '__main__':
+    import os, sys, time
+    from scipy.integrate import odeint
+
+    ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))     # repository root, for mathematical_models
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import mathematical_models as mm
+
+    # SEIR sweep over E0, as in plot_seir_phase_space, with many more scenarios
+    scenarios = 1000
+    t = np.linspace(0, 365, 366)
+    E0 = np.linspace(1, 100, scenarios)
+    X0 = np.stack([1000 - E0, E0, np.zeros(scenarios), np.zeros(scenarios)], axis = 1)
+    params = [1000, 0.3, 0.1, 0.05]
+
+    start = time.perf_counter()
+    reference = np.array([odeint(mm.seir.derivative, x0, t, args = tuple(params), Dfun = mm.seir.jacobian) for x0 in X0])
+    odeint_time = time.perf_counter() - start
+    print('odeint, one call per scenario: ', format(odeint_time, '.3f'), 's')
+
+    for compiled in ((False, True) if HAVE_NUMBA else (False,)):
+        for method in ('rk4', 'rk45'):
+            integrate_batch('seir', X0[:2], t, params, method = method, compiled = compiled)   # compile first
+            start = time.perf_counter()
+            X = integrate_batch('seir', X0, t, params, method = method, compiled = compiled)
+            elapsed = time.perf_counter() - start
+            print(method, '(numba)' if compiled else '(numpy)', ': ', format(elapsed, '.3f'), 's, speedup',
+                  format(odeint_time / elapsed, '.1f')+'x, max relative error', format(np.abs(X - reference).max() / 1000, '.1e'))
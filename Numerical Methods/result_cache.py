@@ -0,0 +1,213 @@
+import functools
+import hashlib
+import inspect
+import os
+import types
+from collections import OrderedDict
+
+import numpy as np
+
+"""
+ Result cache for the deterministic model solves
+
+ The plotting functions often solve the same problem more than once: plot_seir_direction_field solves the
+ scenarios plot_seir_phase_space has just solved, compare_r_cases / compare_k_cases recompute the curves of
+ every case on each call, Main_2.Case integrates a scenario each time it is drawn. A solve is a pure function
+ of (model, parameters, initial state, time grid), so its result can be stored under a hash of these:
+
+    key = sha1(model name, every argument: arrays by dtype, shape and bytes (the time grid included), scalars by value)
+
+ Functions passed as arguments (e.g. the model of solve_growth_model) are hashed by their code: bytecode,
+ constants, defaults, closure cells and the scalar/array globals they read, so that two lambdas, or a function
+ redefined with other equations, get different keys. memoize also adds a hash of the source file of the solver,
+ so that editing a model script invalidates the results it stored on disk.
+
+ Two tiers:
+
+    memory:  least recently used entries are evicted once the stored arrays exceed max_bytes
+    disk:    optional (directory = ...), one <key>.npy file per result, opened as a read-only memmap on a memory
+             miss, so that results survive between runs (the default cache uses $MODEL_CACHE_DIR when it is set)
+
+ Cached results are returned read-only (the same array is shared by all the callers). The counters 'hits',
+ 'disk_hits', 'misses' and 'evictions' (see ResultCache.stats) tell whether max_bytes is large enough.
+"""
+
+def _update_code(digest, code):
+    """Feed a code object (bytecode, names and constants, nested functions included) to the hash."""
+    digest.update(code.co_code)
+    digest.update(repr((code.co_names, code.co_varnames, code.co_freevars)).encode())
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _update_code(digest, const)
+        else:
+            digest.update('{}:{!r}:'.format(type(const).__name__, const).encode())
+
+def _update_function(digest, function, seen):
+    """Feed the identity of a function (not only its name) to the hash."""
+    digest.update('function:{}.{}:'.format(getattr(function, '__module__', None),
+                                           getattr(function, '__qualname__', type(function).__name__)).encode())
+    function = getattr(function, 'py_func', function)          # numba dispatchers (compiled_rhs.jit)
+    if isinstance(function, functools.partial):
+        _update(digest, (function.func, function.args, function.keywords), seen)
+        return
+    code = getattr(function, '__code__', None)
+    if code is None or id(function) in seen:                   # builtins / ufuncs, or a recursive reference
+        return
+    seen = seen | {id(function)}
+    _update_code(digest, code)
+    _update(digest, function.__defaults__, seen)
+    _update(digest, function.__kwdefaults__, seen)
+    for cell in function.__closure__ or ():
+        try:
+            _update(digest, cell.cell_contents, seen)
+        except ValueError:                                     # empty cell
+            digest.update(b'empty-cell:')
+    for name in code.co_names:
+        value = function.__globals__.get(name)
+        if isinstance(value, np.ndarray) or (np.isscalar(value) and not isinstance(value, str)):
+            digest.update(name.encode())
+            _update(digest, value, seen)
+
+def _update(digest, value, seen = frozenset()):
+    """Feed the identity of one argument to the hash."""
+    if isinstance(value, (list, tuple)) and all(np.isscalar(v) for v in value):
+        value = np.asarray(value)
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        digest.update('array:{}:{}:'.format(value.dtype.str, value.shape).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update('sequence:{}:'.format(len(value)).encode())
+        for v in value:
+            _update(digest, v, seen)
+    elif isinstance(value, dict):
+        digest.update('dict:{}:'.format(len(value)).encode())
+        for name in sorted(value, key = repr):
+            digest.update(repr(name).encode())
+            _update(digest, value[name], seen)
+    elif callable(value):
+        _update_function(digest, value, seen)
+    else:
+        digest.update('{}:{!r}:'.format(type(value).__name__, value).encode())
+
+def cache_key(model, *args, **kwargs):
+    """Hash (hex string) of a model name and the arguments of a solve."""
+    digest = hashlib.sha1(str(model).encode())
+    for value in args:
+        _update(digest, value)
+    for name in sorted(kwargs):
+        digest.update(name.encode())
+        _update(digest, kwargs[name])
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """LRU cache of ndarray results with a byte budget and an optional on-disk tier.
+
+    Args:
+        max_bytes (int): Memory budget of the stored arrays (memmapped disk entries included).
+        directory (str): Folder of the on-disk tier (None: memory only).
+    """
+
+    def __init__(self, max_bytes = 2**28, directory = None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.enabled = True
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok = True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def _store(self, key, value):
+        if value.nbytes > self.max_bytes:
+            return
+        self.entries[key] = value
+        self.bytes += value.nbytes
+        while self.bytes > self.max_bytes:
+            _, old = self.entries.popitem(last = False)
+            self.bytes -= old.nbytes
+            self.evictions += 1
+
+    def get(self, key):
+        """The cached array for key, or None."""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        if self.directory is not None and os.path.exists(self._path(key)):
+            value = np.load(self._path(key), mmap_mode = 'r')
+            self._store(key, value)
+            self.disk_hits += 1
+            return value
+        return None
+
+    def put(self, key, value):
+        """Store an array (as a read-only copy) under key and return it."""
+        value = np.array(value)
+        value.setflags(write = False)
+        self._store(key, value)
+        if self.directory is not None:
+            temporary = self._path(key) + '.{}.tmp'.format(os.getpid())
+            with open(temporary, 'wb') as f:
+                np.save(f, value)
+            os.replace(temporary, self._path(key))       # never leave a partly written file under the key
+        return value
+
+    def get_or_compute(self, key, compute):
+        """The cached array for key, computing (and storing) compute() on a miss."""
+        if not self.enabled:
+            return compute()
+        value = self.get(key)
+        if value is None:
+            self.misses += 1
+            value = self.put(key, compute())
+        return value
+
+    def clear(self, disk = False):
+        """Empty the memory tier (and the on-disk tier if disk) and reset the counters."""
+        self.entries.clear()
+        self.bytes = 0
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+        if disk and self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith('.npy'):
+                    os.remove(os.path.join(self.directory, name))
+
+    def stats(self):
+        """Counters and size of the cache."""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'entries': len(self.entries), 'bytes': self.bytes, 'max_bytes': self.max_bytes}
+
+
+default_cache = ResultCache(directory = os.environ.get('MODEL_CACHE_DIR'))
+
+def _source_hash(function):
+    """Hash of the source file defining function ('' when it cannot be read)."""
+    try:
+        with open(inspect.getsourcefile(function), 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except (OSError, TypeError):
+        return ''
+
+def memoize(model, cache = None):
+    """Decorator caching the (ndarray) results of a deterministic solver under cache_key(model, arguments).
+
+    The key also covers the source file of the solver, so results stored on disk by an older version of the
+    model script are not returned.
+
+    cache: a ResultCache (default: default_cache, looked up at call time).
+    """
+    def decorate(solver):
+        version = '{}:{}'.format(model, _source_hash(solver))
+        @functools.wraps(solver)
+        def cached_solver(*args, **kwargs):
+            store = default_cache if cache is None else cache
+            return store.get_or_compute(cache_key(version, *args, **kwargs), lambda: solver(*args, **kwargs))
+        cached_solver.uncached = solver
+        return cached_solver
+    return decorate
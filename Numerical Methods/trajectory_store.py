@@ -0,0 +1,292 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+"""
+ Memory-mapped columnar store of trajectories
+
+ Sweeps produce arrays of shape (scenarios, time, compartments) (solve_seir_batch, integrate_batch, the paths
+ of gbm_chunks, the walks of walk_chunks, ...) that can be larger than the memory, and that are usually thrown
+ away once plotted. A TrajectoryStore keeps them on disk, in a folder:
+
+    index.json                          time grid length, compartment and parameter names, dtype, chunking, size
+    t.npy                               the time grid
+    chunk_00000/compartment_0.npy       (chunk_scenarios, len(t)) values of the first compartment
+    chunk_00000/compartment_1.npy       ...
+    chunk_00000/parameters.npy          (chunk_scenarios, parameters) parameters of every scenario
+    chunk_00001/...
+
+ Every file is a .npy array opened as a memory map, so that:
+
+    - writing appends scenarios chunk by chunk (memory: one chunk of each compartment at most)
+    - reading a compartment of a range of scenarios inside one chunk returns a view of the file (zero-copy),
+      and only the chunks that are touched are read; a single scenario reads one row per compartment
+    - the parameters are a small table, e.g. to find the scenarios of a given beta without reading trajectories
+"""
+
+INDEX = 'index.json'
+
+
+class TrajectoryStore:
+    """A folder of chunked, memory-mapped trajectories. Use TrajectoryStore.create or TrajectoryStore.open."""
+
+    def __init__(self, path, index, mode):
+        self.path = path
+        self.index = index
+        self.mode = mode
+        self.t = np.load(os.path.join(path, 't.npy'), mmap_mode = 'r')
+        self._maps = {}                        # (chunk, file name) -> memmap
+
+    @classmethod
+    def create(cls, path, t, compartments, parameters = (), dtype = np.float64, chunk_scenarios = 4096, overwrite = False):
+        """Create an empty store for writing.
+
+        Args:
+            path (str): Folder of the store.
+            t: Time grid shared by all the trajectories.
+            compartments: Names of the compartments (e.g. ('S', 'E', 'I', 'R')).
+            parameters: Names of the parameters recorded with every scenario (e.g. ('beta', 'gamma')).
+            dtype: Type of the stored values (e.g. np.float32, or np.int32 for random walks).
+            chunk_scenarios (int): Scenarios per chunk file.
+            overwrite (bool): Replace an existing store at path.
+
+        Returns:
+            TrajectoryStore: The store, in write mode (call close, or use it in a with statement).
+        """
+        if os.path.exists(os.path.join(path, INDEX)):
+            if not overwrite:
+                raise FileExistsError('A trajectory store already exists at ' + path)
+            shutil.rmtree(path)
+        os.makedirs(path, exist_ok = True)
+        t = np.asarray(t, dtype = float)
+        np.save(os.path.join(path, 't.npy'), t)
+        index = {'compartments': list(compartments), 'parameters': list(parameters), 'times': int(t.size),
+                 'dtype': np.dtype(dtype).str, 'chunk_scenarios': int(chunk_scenarios), 'scenarios': 0}
+        store = cls(path, index, 'w')
+        store.flush()
+        return store
+
+    @classmethod
+    def open(cls, path):
+        """Open an existing store for reading (memory maps, nothing is loaded)."""
+        with open(os.path.join(path, INDEX)) as f:
+            return cls(path, json.load(f), 'r')
+
+    """-----------------------------------------------------------------"""
+
+    @property
+    def compartments(self):
+        return self.index['compartments']
+
+    @property
+    def parameter_names(self):
+        return self.index['parameters']
+
+    def __len__(self):
+        return self.index['scenarios']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _file(self, chunk, name, columns = None):
+        """Memory map of one file of a chunk (created, full size, when writing a new chunk)."""
+        if (chunk, name) not in self._maps:
+            folder = os.path.join(self.path, 'chunk_{:05d}'.format(chunk))
+            file = os.path.join(folder, name + '.npy')
+            if self.mode == 'w' and not os.path.exists(file):
+                os.makedirs(folder, exist_ok = True)
+                dtype = float if name == 'parameters' else self.index['dtype']
+                shape = (self.index['chunk_scenarios'], self.index['times'] if columns is None else columns)
+                self._maps[chunk, name] = np.lib.format.open_memmap(file, mode = 'w+', dtype = dtype, shape = shape)
+            else:
+                self._maps[chunk, name] = np.load(file, mmap_mode = 'r+' if self.mode == 'w' else 'r')
+        return self._maps[chunk, name]
+
+    def _compartment(self, name):
+        return name if isinstance(name, int) else self.compartments.index(name)
+
+    """-----------------------------------------------------------------"""
+
+    # Writing:
+
+    def append(self, X, parameters = None):
+        """Append scenarios.
+
+        Args:
+            X: Trajectories of shape (scenarios, len(t), compartments) ((scenarios, len(t)) for one compartment).
+            parameters: Parameters of shape (scenarios, len(parameter_names)), or (len(parameter_names),) for all.
+        """
+        if self.mode != 'w':
+            raise ValueError('The store is open for reading')
+        X = np.asarray(X)
+        if X.ndim == 2:
+            X = X[:, :, None]
+        if X.shape[1:] != (self.index['times'], len(self.compartments)):
+            raise ValueError('X must have shape (scenarios, {}, {})'.format(self.index['times'], len(self.compartments)))
+        P = len(self.parameter_names)
+        if P:
+            parameters = np.broadcast_to(np.asarray(parameters, dtype = float), (X.shape[0], P))
+
+        size = self.index['chunk_scenarios']
+        done = 0
+        while done < X.shape[0]:
+            chunk, row = divmod(self.index['scenarios'], size)
+            n = min(size - row, X.shape[0] - done)
+            for c in range(len(self.compartments)):
+                self._file(chunk, 'compartment_{}'.format(c))[row:row + n] = X[done:done + n, :, c]
+            if P:
+                self._file(chunk, 'parameters', P)[row:row + n] = parameters[done:done + n]
+            self.index['scenarios'] += n
+            done += n
+            if row + n == size:                   # chunk complete: write it out and unmap it
+                self._release(chunk)
+                self.flush()
+
+    def _release(self, chunk):
+        for key in [key for key in self._maps if key[0] == chunk]:
+            self._maps.pop(key).flush()
+
+    def flush(self):
+        """Write the data and the index to disk."""
+        for memmap in self._maps.values():
+            memmap.flush()
+        temporary = os.path.join(self.path, INDEX + '.tmp')
+        with open(temporary, 'w') as f:
+            json.dump(self.index, f, indent = 2)
+        os.replace(temporary, os.path.join(self.path, INDEX))
+
+    def close(self):
+        if self.mode == 'w':
+            self.flush()
+        self._maps.clear()
+
+    """-----------------------------------------------------------------"""
+
+    # Reading:
+
+    def _rows(self, start, stop):
+        """(chunk, first row, last row) pieces of the scenarios start:stop."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        size = self.index['chunk_scenarios']
+        while start < stop:
+            chunk, row = divmod(start, size)
+            n = min(size - row, stop - start)
+            yield chunk, row, row + n
+            start += n
+
+    def compartment(self, name, start = 0, stop = None):
+        """Values of one compartment (name or position) for the scenarios start:stop, shape (scenarios, len(t)).
+
+        Within a single chunk this is a read-only view of the memory-mapped file (nothing is copied).
+        """
+        name = 'compartment_{}'.format(self._compartment(name))
+        pieces = [self._file(chunk, name)[first:last] for chunk, first, last in self._rows(start, stop)]
+        if len(pieces) == 1:
+            return pieces[0]
+        if not pieces:
+            return np.empty((0, self.index['times']), dtype = self.index['dtype'])
+        return np.concatenate(pieces)
+
+    def scenario(self, i):
+        """Trajectory of scenario i, shape (len(t), compartments)."""
+        if not -len(self) <= i < len(self):
+            raise IndexError('scenario {} out of range ({} scenarios)'.format(i, len(self)))
+        chunk, row = divmod(i % len(self), self.index['chunk_scenarios'])
+        return np.stack([self._file(chunk, 'compartment_{}'.format(c))[row] for c in range(len(self.compartments))], axis = 1)
+
+    def parameters(self, start = 0, stop = None):
+        """Parameters of the scenarios start:stop, as a dict name -> array (empty for a store without parameters)."""
+        P = len(self.parameter_names)
+        if not P:                                 # no parameters.npy files were written
+            return {}
+        pieces = [self._file(chunk, 'parameters', P)[first:last] for chunk, first, last in self._rows(start, stop)]
+        table = np.concatenate(pieces) if pieces else np.empty((0, P))
+        return {name: table[:, j] for j, name in enumerate(self.parameter_names)}
+
+    def find(self, **values):
+        """Indices of the scenarios whose parameters equal (np.isclose) the given values, e.g. find(beta = 0.3)."""
+        unknown = [name for name in values if name not in self.parameter_names]
+        if unknown:
+            raise ValueError('Unknown parameter(s) {} (the store records: {})'.format(
+                ', '.join(unknown), ', '.join(self.parameter_names) or 'no parameters'))
+        table = self.parameters()
+        match = np.ones(len(self), dtype = bool)
+        for name, value in values.items():
+            match &= np.isclose(table[name], value)
+        return np.flatnonzero(match)
+
+    def chunks(self, compartments = None):
+        """Iterate over the store a chunk at a time: yields (first scenario, X of shape (scenarios, len(t), compartments))."""
+        columns = [self._compartment(c) for c in (compartments or range(len(self.compartments)))]
+        for chunk, first, last in self._rows(0, None):
+            X = np.stack([self._file(chunk, 'compartment_{}'.format(c))[first:last] for c in columns], axis = 2)
+            yield chunk * self.index['chunk_scenarios'] + first, X
+
+"""-----------------------------------------------------------------"""
+
+# Writers for the sweeps of the models:
+
+def save_sweep(path, t, X, compartments, parameters = None, parameter_names = (), overwrite = False, **options):
+    """Store a sweep already in memory, X of shape (scenarios, len(t), compartments), and return the store (read mode)."""
+    with TrajectoryStore.create(path, t, compartments, parameter_names, overwrite = overwrite, **options) as store:
+        store.append(X, parameters)
+    return TrajectoryStore.open(path)
+
+def save_gbm_paths(path, gbm, S0, r, sigma, T, dt, N, chunk_paths = 2**14, dtype = np.float64, seed = None, overwrite = False):
+    """Stream the paths of gbm.gbm_chunks (gbm: the GBM module, e.g. mathematical_models.gbm) into a store.
+
+    One compartment 'S', time grid 0, dt, ..., with S0 at step 0; the store's chunks are the blocks of paths.
+    """
+    n = int(T / dt) + 1
+    with TrajectoryStore.create(path, dt * np.arange(n), ('S',), ('S0', 'r', 'sigma'), dtype, chunk_paths, overwrite) as store:
+        for first_path, first_step, P in gbm.gbm_chunks(S0, r, sigma, T, dt, N, chunk_paths, dtype = dtype, seed = seed):
+            X = np.empty((P.shape[1], n), dtype = dtype)
+            X[:, 0] = S0
+            X[:, 1:] = P.T
+            store.append(X, (S0, r, sigma))
+    return TrajectoryStore.open(path)
+
+def save_random_walks(path, random_walk, num_walks, num_steps, chunk_size = 2**14, seed = None, overwrite = False):
+    """Stream the walks of random_walk.walk_chunks (random_walk: the random walk module) into a store.
+
+    One compartment 'position' (int32), time grid 0, 1, ..., num_steps, with position 0 at step 0.
+    """
+    with TrajectoryStore.create(path, np.arange(num_steps + 1), ('position',), (), np.int32, chunk_size, overwrite) as store:
+        for positions in random_walk.walk_chunks(num_walks, num_steps, chunk_size, seed = seed):
+            X = np.zeros((positions.shape[0], num_steps + 1), dtype = np.int32)
+            X[:, 1:] = positions
+            store.append(X)
+    return TrajectoryStore.open(path)
+
+if __name__ == '__main__':
+    import sys
+    import tempfile
+
+    ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))     # repository root, for mathematical_models
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import mathematical_models as mm
+
+    folder = tempfile.mkdtemp()
+
+    # A SEIR sweep over beta and E0
+    t = np.linspace(0, 365, 366)
+    beta, E0 = (v.ravel() for v in np.meshgrid(np.linspace(0.1, 0.5, 50), np.linspace(1, 100, 20)))
+    X = mm.solve_seir_batch(beta, 0.1, 0.05, 1000, E0, t)
+    store = save_sweep(os.path.join(folder, 'seir'), t, X, ('S', 'E', 'I', 'R'), np.stack([beta, E0], axis = 1),
+                       ('beta', 'E0'), chunk_scenarios = 256)
+    store = TrajectoryStore.open(os.path.join(folder, 'seir'))          # e.g. in a later run
+    print('SEIR sweep:', len(store), 'scenarios, first chunk of I read as', type(store.compartment('I', 0, 256)).__name__)
+    print('Peak of infected for beta = 0.5:', store.compartment('I')[store.find(beta = 0.5)].max(axis = 1)[:3], '...')
+
+    # 100000 GBM paths and random walks, streamed to disk without holding them in memory
+    paths = save_gbm_paths(os.path.join(folder, 'gbm'), mm.gbm, 100, 0.05, 0.2, 1, 1/252, 100000, dtype = np.float32, seed = 0)
+    print('GBM: path 12345 ends at', paths.scenario(12345)[-1, 0])
+    walks = save_random_walks(os.path.join(folder, 'walks'), mm.random_walk, 100000, 1000, seed = 0)
+    print('Random walks: mean final position', sum(X[:, -1, 0].sum() for first, X in walks.chunks()) / len(walks))
+    shutil.rmtree(folder)
@@ -1,6 +1,11 @@
+import os
+import sys
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.integrate import odeint 
+from scipy.integrate import odeint
+
+if __name__ == '__main__':      # run as a script: put the repository root on the path for mathematical_models
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mathematical_models import events, result_cache
 
 """
  SEIR (Susceptible-Exposed-Infected-Recovered) model is a mathematical model used to simulate the spread of infectious diseases.
@@ -42,25 +47,120 @@ def derivative(X, t, N, beta, gamma, sigma):
     dRdt = gamma * I
     return [dSdt, dEdt, dIdt, dRdt]
 
-# Integrate the SEIR equations over the time grid t:
+# Its Jacobian matrix (d derivative_i / d X_j), so that implicit solvers don't estimate it by finite differences:
+
+def jacobian(X, t, N, beta, gamma, sigma):
+    S,E,I,R = X
+    return np.array([[-beta * I / N, 0, -beta * S / N, 0],
+                     [beta * I / N, -sigma, beta * S / N, 0],
+                     [0, sigma, -gamma, 0],
+                     [0, 0, gamma, 0]])
+
+# Batched version: many scenarios integrated at once as a single stacked state
+
+def derivative_batch(X, t, N, beta, gamma, sigma):
+    """SEIR right-hand side for a stack of scenarios.
+
+    Args:
+        X (ndarray): Flat state of length 4*scenarios, laid out as [S_0, E_0, I_0, R_0, S_1, E_1, ...].
+        t (float): Current time (unused, the system is autonomous).
+        N, beta, gamma, sigma (ndarray): Per-scenario parameters, each of shape (scenarios,).
+
+    Returns:
+        ndarray: The derivatives, with the same flat layout as X.
+    """
+    X = X.reshape(-1, 4)
+    S, E, I = X[:, 0], X[:, 1], X[:, 2]
+    infection = beta * S * I / N
+    dX = np.empty_like(X)
+    dX[:, 0] = -infection
+    dX[:, 1] = infection - sigma * E
+    dX[:, 2] = sigma * E - gamma * I
+    dX[:, 3] = gamma * I
+    return dX.ravel()
+
+def jacobian_batch(X, t, N, beta, gamma, sigma):
+    """Jacobian of derivative_batch in LSODA's banded storage (ml = mu = 3).
+
+    Returns:
+        ndarray: Array `band` of shape (7, 4*scenarios) with band[i - j + 3, j] = d derivative_i / d X_j.
+    """
+    X = X.reshape(-1, 4)
+    S, I = X[:, 0], X[:, 2]
+    band = np.zeros((7, X.size))
+    J = band.reshape(7, -1, 4)       # J[i - j + 3, scenario, j within the scenario]
+    J[3, :, 0] = -beta * I / N       # dS'/dS
+    J[1, :, 2] = -beta * S / N       # dS'/dI
+    J[4, :, 0] = beta * I / N        # dE'/dS
+    J[3, :, 1] = -sigma              # dE'/dE
+    J[2, :, 2] = beta * S / N        # dE'/dI
+    J[4, :, 1] = sigma               # dI'/dE
+    J[3, :, 2] = -gamma              # dI'/dI
+    J[4, :, 2] = gamma               # dR'/dI
+    return band
+
+def solve_seir_batch(beta, gamma, sigma, N, E0, t, I0 = 0, R0 = 0):
+    """Integrate many SEIR scenarios with a single odeint call.
+
+    All parameters and initial conditions are broadcast against each other, so any of them
+    may be a scalar or an array of scenarios (e.g. a sweep over E0 with fixed beta, gamma, sigma).
+    S0 is taken as N - E0 - I0 - R0.
+
+    Each scenario only depends on its own 4 compartments, so the Jacobian of the stacked
+    system is block diagonal; we give LSODA its bands (ml = mu = 3, jacobian_batch), which
+    keeps the cost of stiff steps linear in the number of scenarios. Banded LSODA can give up on
+    very stiff scenarios (e.g. sigma = 1000, N = 1e6: "Excess work done"); the batch is then solved
+    again with a dense Jacobian, and a RuntimeError is raised if that fails as well.
+
+    Returns:
+        ndarray: Array of shape (scenarios, len(t), 4) holding S, E, I, R for every scenario.
+    """
+    beta, gamma, sigma, N, E0, I0, R0 = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(v, dtype=float)) for v in (beta, gamma, sigma, N, E0, I0, R0)))
+    beta, gamma, sigma, N, E0, I0, R0 = (v.ravel() for v in (beta, gamma, sigma, N, E0, I0, R0))
+    S0 = N - E0 - I0 - R0
+    X0 = np.stack([S0, E0, I0, R0], axis = 1).ravel()
+    args = (N, beta, gamma, sigma)
+    sol, output = odeint(derivative_batch, X0, t, args = args, Dfun = jacobian_batch, ml = 3, mu = 3, full_output = True)
+    if output['message'] != 'Integration successful.':
+        sol, output = odeint(derivative_batch, X0, t, args = args, full_output = True)
+        if output['message'] != 'Integration successful.':
+            raise RuntimeError(output['message'])
+    return np.ascontiguousarray(sol.reshape(len(t), -1, 4).transpose(1, 0, 2))
+
+# Same, but the solutions are kept (read-only) in result_cache.default_cache: the phase space and
+# direction field plots of the same scenarios solve them once
+cached_seir_batch = result_cache.memoize('seir')(solve_seir_batch)
+
+# Peak and final size, integrating only until the exposed and infected sum below threshold
+def seir_summary(N, beta, gamma, sigma, E0, I0 = 0, R0 = 0, t_max = 365, threshold = 0.5):
+    """Peak time, peak size (infected) and final size (ever infected) of the SEIR epidemic (see events.epidemic_summary)."""
+    X0 = (N - E0 - I0 - R0, E0, I0, R0)
+    return events.epidemic_summary(derivative, X0, t_max, (N, beta, gamma, sigma), infected = 2, infectious = [1, 2],
+                                   threshold = threshold, jac = jacobian)
+
+def plot_seir_model(X0, t, N, beta, gamma, sigma):
+    import matplotlib.pyplot as plt
 
-solution = odeint(derivative, X0, t, args=(N, beta, gamma, sigma))
+    # Integrate the SEIR equations over the time grid t:
 
-S,E,I,R = solution.T
+    solution = odeint(derivative, X0, t, args=(N, beta, gamma, sigma), Dfun=jacobian)
 
-# Plot the results:
+    S,E,I,R = solution.T
 
-plt.figure()
-plt.grid()
-plt.plot(t, S, 'blue', label='Susceptible')
-plt.plot(t, E, 'red', label='Exposed')
-plt.plot(t, I, 'yellow', label='Infected')
-plt.plot(t, R, 'purple', label='Recovered')
-plt.xlabel('Time [days]')
-plt.ylabel('Number of individuals')
-plt.title('SEIR Model (Odeint Method)')
-plt.legend()
-plt.show()
+    # Plot the results:
+
+    plt.figure()
+    plt.grid()
+    plt.plot(t, S, 'blue', label='Susceptible')
+    plt.plot(t, E, 'red', label='Exposed')
+    plt.plot(t, I, 'yellow', label='Infected')
+    plt.plot(t, R, 'purple', label='Recovered')
+    plt.xlabel('Time [days]')
+    plt.ylabel('Number of individuals')
+    plt.title('SEIR Model (Odeint Method)')
+    plt.legend()
+    plt.show()
 
 
 """-----------------------------------------------------------------"""
@@ -71,18 +171,16 @@ plt.show()
     This allows us to see the dynamical behavior of the system and understand how it evolves over time (Phase Space Infected vs Exposed)
  """
 
-def plot_seir_phase_space(beta, gamma, sigma, N, E0, t):
-    num_scenarios = len(E0)
-    I0 = np.zeros(num_scenarios)
-    R0 = np.zeros(num_scenarios)
-    S0 = N - E0 - I0 - R0
+def plot_seir_phase_space(beta, gamma, sigma, N, E0, t, store = None):
+    import matplotlib.pyplot as plt
+
+    # Integrate the SEIR equations over the time grid t for all scenarios at once
+    solutions = cached_seir_batch(beta, gamma, sigma, N, E0, t)
 
-    # Integrate the SEIR equations over the time grid t for each scenario
-    solutions = []
-    for i in range(num_scenarios):
-        y0 = [S0[i], E0[i], I0[i], R0[i]]
-        sol = odeint(derivative, y0, t, args=(N, beta, gamma, sigma))
-        solutions.append(sol)
+    # Optionally keep them: store is a TrajectoryStore (trajectory_store.py) created with compartments
+    # ('S', 'E', 'I', 'R') and parameters ('beta', 'gamma', 'sigma', 'N', 'E0')
+    if store is not None:
+        store.append(solutions, np.stack(np.broadcast_arrays(beta, gamma, sigma, N, E0), axis = -1).reshape(-1, 5))
 
     # Plot the phase spaces
     plt.figure()
@@ -150,13 +248,6 @@ def plot_seir_phase_space(beta, gamma, sigma, N, E0, t):
     plt.legend()
     plt.show()
 
-beta = 0.3
-gamma = 0.1
-sigma = 0.05
-N = 1000
-E0 = np.linspace(0, 100, 5)
-t = np.linspace(0, 365, 366)
-plot_seir_phase_space(beta, gamma, sigma, N, E0, t)
 
 
 """-----------------------------------------------------------------"""
@@ -166,69 +257,30 @@ plot_seir_phase_space(beta, gamma, sigma, N, E0, t)
 """ direction field represents the direction of change of the system, and can be useful to visualize the stability of the system"""
 
 def plot_seir_direction_field(beta, gamma, sigma, N, E0, t):
-    Y0 = (N-E0, E0, 0, 0)
-    solutions = [odeint(derivative, Y0, t, args=(N, beta, gamma, sigma)) for Y0 in zip(np.ones(len(E0))*(N-E0), E0, np.zeros(len(E0)), np.zeros(len(E0)))]
-
-    plt.figure()
-    for i, sol in enumerate(solutions):
-        S, E, I, R = sol.T
-        dSdt, dEdt, dIdt, dRdt = derivative(sol.T, t, N, beta, gamma, sigma)
-        plt.quiver(E, I, dEdt, dIdt, label='E0 = {}'.format(E0[i]), color='C{}'.format(i))
-
-    plt.xlabel('Exposed')
-    plt.ylabel('Infected')
-    plt.title('SEIR Model Phase Space: Direction Field')
-    plt.legend()
-    plt.show()
-
-    plt.figure()
-    for i, sol in enumerate(solutions):
-        S, E, I, R = sol.T
-        dSdt, dEdt, dIdt, dRdt = derivative(sol.T, t, N, beta, gamma, sigma)
-        plt.quiver(E, R, dEdt, dRdt, label='E0 = {}'.format(E0[i]), color='C{}'.format(i))
-
-    plt.xlabel('Exposed')
-    plt.ylabel('Recovered')
-    plt.title('SEIR Model Phase Space: Direction Field')
-    plt.legend()
-    plt.show()
-
-    plt.figure()
-    for i, sol in enumerate(solutions):
-        S, E, I, R = sol.T
-        dSdt, dEdt, dIdt, dRdt = derivative(sol.T, t, N, beta, gamma, sigma)
-        plt.quiver(I, R, dIdt, dRdt, label='E0 = {}'.format(E0[i]), color='C{}'.format(i))
+    import matplotlib.pyplot as plt
 
-    plt.xlabel('Infected')
-    plt.ylabel('Recovered')
-    plt.title('SEIR Model Phase Space: Direction Field')
-    plt.legend()
-    plt.show()
+    solutions = cached_seir_batch(beta, gamma, sigma, N, E0, t)
 
-    plt.figure()
-    for i, sol in enumerate(solutions):
-        S, E, I, R = sol.T
-        dSdt, dEdt, dIdt, dRdt = derivative(sol.T, t, N, beta, gamma, sigma)
-        plt.quiver(S, I, -dSdt, dIdt, label='E0 = {}'.format(E0[i]), color='C{}'.format(i))
+    # The derivative along every solution, in one broadcasted call: arrays of shape (scenarios, len(t))
+    states = np.moveaxis(solutions, -1, 0)
+    rates = np.stack(derivative(states, t, N, beta, gamma, sigma))
+    rates[0] = -rates[0]                         # S decreases: the arrows are drawn with -dS/dt, as before
 
-    plt.xlabel('Susceptible')
-    plt.ylabel('Infected')
-    plt.title('SEIR Model Phase Space: Direction Field')
-    plt.legend()
-    plt.show()
+    names = ['Susceptible', 'Exposed', 'Infected', 'Recovered']
+    for x, y in [(1, 2), (1, 3), (2, 3), (0, 2), (0, 3)]:      # E-I, E-R, I-R, S-I, S-R
+        plt.figure()
+        for i in range(len(solutions)):
+            plt.quiver(states[x, i], states[y, i], rates[x, i], rates[y, i], label='E0 = {}'.format(E0[i]), color='C{}'.format(i))
 
-    plt.figure()
-    for i, sol in enumerate(solutions):
-        S, E, I, R = sol.T
-        dSdt, dEdt, dIdt, dRdt = derivative(sol.T, t, N, beta, gamma, sigma)
-        plt.quiver(S, R, -dSdt, dRdt, label='E0 = {}'.format(E0[i]), color='C{}'.format(i))
+        plt.xlabel(names[x])
+        plt.ylabel(names[y])
+        plt.title('SEIR Model Phase Space: Direction Field')
+        plt.legend()
+        plt.show()
 
-    plt.xlabel('Susceptible')
-    plt.ylabel('Recovered')
-    plt.title('SEIR Model Phase Space: Direction Field')
-    plt.legend()
-    plt.show()
+if __name__ == '__main__':
+    plot_seir_model(X0, t, N, beta, gamma, sigma)
 
-E0 = np.linspace(0, 100, 5)
-t = np.linspace(0, 365, 366)
-plot_seir_direction_field(beta, gamma, sigma, N, E0, t)
+    E0 = np.linspace(0, 100, 5)
+    plot_seir_phase_space(beta, gamma, sigma, N, E0, t)
+    plot_seir_direction_field(beta, gamma, sigma, N, E0, t)
@@ -0,0 +1,199 @@
+import numpy as np
+from scipy import sparse
+from scipy.integrate import solve_ivp
+
+"""
+ Metapopulation (multi-group) SEIR and SIR models
+
+ SEIR Model.py describes one homogeneous population N. Here the population is split into G groups (regions,
+ age groups, ...), each with its own size N_i and rates beta_i, sigma_i, gamma_i, coupled by a contact matrix K:
+
+    lambda_i = beta_i * sum_j K_ij * I_j / N_j             (force of infection on group i)
+
+    dS_i/dt = -lambda_i * S_i
+    dE_i/dt = lambda_i * S_i - sigma_i * E_i
+    dI_i/dt = sigma_i * E_i - gamma_i * I_i
+    dR_i/dt = gamma_i * I_i
+
+ (SIR: without E, dI_i/dt = lambda_i * S_i - gamma_i * I_i). With K = identity the groups are independent copies
+ of the model of SEIR Model.py. K is a scipy.sparse matrix: regions only mix with a few others, so computing all
+ the forces of infection is one sparse matrix-vector product, and a right-hand side evaluation costs
+ O(G + nonzeros of K).
+
+ A state is an array of shape (compartments, G). Batches of scenarios (B, compartments, G) (e.g. other betas,
+ other seeds of the outbreak) are solved as one system of B * G groups with the block-diagonal contact matrix
+ kron(identity(B), K), so the cost stays linear in the number of groups times scenarios.
+"""
+
+def coupling(mobility, epsilon):
+    """Contact matrix of regions whose residents make a fraction epsilon of their contacts elsewhere.
+
+    Args:
+        mobility: (G, G) matrix (dense or sparse) of trips from region i to region j (the diagonal is ignored).
+        epsilon (float): Fraction of the contacts made outside the home region, split as the trips.
+
+    Returns:
+        csr_matrix: K = (1 - epsilon) * I + epsilon * P, with P the row-normalized mobility.
+    """
+    mobility = sparse.csr_matrix(mobility, dtype = float)
+    mobility.setdiag(0)
+    mobility.eliminate_zeros()
+    trips = np.asarray(mobility.sum(axis = 1)).ravel()
+    P = sparse.diags(np.divide(1.0, trips, out = np.zeros_like(trips), where = trips > 0)) @ mobility
+    stay = 1 - epsilon * (trips > 0)                 # regions without trips keep all their contacts at home
+    return (sparse.diags(stay) + epsilon * P).tocsr()
+
+def ring_mobility(G, neighbors = 2, shortcuts = 0, seed = None):
+    """Mobility of G regions on a ring (trips to the `neighbors` nearest regions on each side) plus random shortcuts."""
+    rng = np.random.default_rng(seed)
+    i = np.repeat(np.arange(G), 2 * neighbors)
+    offsets = np.tile(np.r_[-neighbors:0, 1:neighbors + 1], G)
+    rows, columns = [i], [(i + offsets) % G]
+    if shortcuts:
+        rows.append(rng.integers(0, G, shortcuts))
+        columns.append(rng.integers(0, G, shortcuts))
+    rows, columns = np.concatenate(rows), np.concatenate(columns)
+    M = sparse.coo_matrix((np.ones(rows.size), (rows, columns)), shape = (G, G)).tocsr()
+    return M + M.T                                    # trips in both directions
+
+"""-----------------------------------------------------------------"""
+
+def _flat(value, shape):
+    return np.broadcast_to(np.asarray(value, dtype = float), shape).ravel()
+
+def derivative(X, t, N, beta, gamma, contacts, sigma = None):
+    """Right-hand side for a state X of shape (compartments, G): S, E, I, R (SEIR), or S, I, R when sigma is None.
+
+    N, beta, gamma, sigma are scalars or arrays of shape (G,), contacts a sparse (G, G) matrix.
+    """
+    if sigma is None:
+        S, I, R = X
+    else:
+        S, E, I, R = X
+    infection = beta * (contacts @ (I / N)) * S          # the sparse product: lambda_i * S_i for all the groups
+    recovery = gamma * I
+    if sigma is None:
+        return np.stack([-infection, infection - recovery, recovery])
+    onset = sigma * E
+    return np.stack([-infection, infection - onset, onset - recovery, recovery])
+
+def jacobian(X, t, N, beta, gamma, contacts, sigma = None):
+    """Sparse Jacobian (compartments * G square) of derivative, for the implicit solvers ('BDF', 'Radau')."""
+    G = contacts.shape[0]
+    if sigma is None:
+        S, I, R = X
+    else:
+        S, E, I, R = X
+    beta, gamma, N = _flat(beta, G), _flat(gamma, G), _flat(N, G)
+    force = beta * (contacts @ (I / N))
+    spread = sparse.diags(beta * S) @ contacts @ sparse.diags(1 / N)       # d(infection) / dI
+    diag = sparse.diags
+    if sigma is None:
+        blocks = [[diag(-force), -spread, None],
+                  [diag(force), spread - diag(gamma), None],
+                  [None, diag(gamma), diag(np.zeros(G))]]
+    else:
+        sigma = _flat(sigma, G)
+        blocks = [[diag(-force), None, -spread, None],
+                  [diag(force), diag(-sigma), spread, None],
+                  [None, diag(sigma), diag(-gamma), None],
+                  [None, None, diag(gamma), diag(np.zeros(G))]]
+    return sparse.bmat(blocks, format = 'csr')
+
+def solve(X0, t, N, beta, gamma, contacts, sigma = None, method = 'RK45', rtol = 1e-6, atol = 1e-6):
+    """Integrate the metapopulation model, for one scenario or a batch of scenarios.
+
+    Args:
+        X0: Initial state, shape (compartments, G), or (B, compartments, G) for B scenarios
+            (compartments: S, E, I, R, or S, I, R when sigma is None).
+        t: Time points (the first one is the initial time).
+        N, beta, gamma, sigma: Scalars, arrays of shape (G,) (one value per group), or of shape (B, G) / (B, 1)
+                               (per scenario). sigma = None: SIR model.
+        contacts: Contact matrix K, shape (G, G) (converted to CSR).
+        method (str): Method of solve_ivp; the implicit ones ('BDF', 'Radau') get the sparse Jacobian.
+        rtol, atol (float): Tolerances.
+
+    Returns:
+        ndarray: Solution, shape (len(t), compartments, G), or (B, len(t), compartments, G).
+    """
+    X0 = np.asarray(X0, dtype = float)
+    single = X0.ndim == 2
+    X0 = X0[None] if single else X0
+    B, C, G = X0.shape
+    contacts = sparse.csr_matrix(contacts, dtype = float)
+    # B scenarios = one system of B * G groups (scenario-major), coupled within each scenario only
+    K = contacts if B == 1 else sparse.kron(sparse.identity(B), contacts, format = 'csr')
+    params = [_flat(p, (B, G)) for p in (N, beta, gamma)]
+    params += [None if sigma is None else _flat(sigma, (B, G))]
+    N, beta, gamma, sigma = params
+
+    fun = lambda s, x: derivative(x.reshape(C, B * G), s, N, beta, gamma, K, sigma).ravel()
+    options = {}
+    if method in ('BDF', 'Radau', 'LSODA'):
+        options['jac'] = lambda s, x: jacobian(x.reshape(C, B * G), s, N, beta, gamma, K, sigma)
+        if method == 'LSODA':          # LSODA only takes dense Jacobians
+            options['jac'] = lambda s, x, jac = options['jac']: jac(s, x).toarray()
+    x0 = X0.transpose(1, 0, 2).reshape(C, B * G).ravel()
+    t = np.asarray(t, dtype = float)
+    sol = solve_ivp(fun, (t[0], t[-1]), x0, method = method, t_eval = t, rtol = rtol, atol = atol, **options)
+    if sol.status == -1:
+        raise RuntimeError(sol.message)
+    X = sol.y.T.reshape(len(t), C, B, G).transpose(2, 0, 1, 3)
+    return X[0] if single else X
+
+def seed_outbreak(N, infected, groups = (0,), sir = False):
+    """Initial state with `infected` exposed (infected for SIR) individuals in each of the given groups."""
+    N = np.asarray(N, dtype = float)
+    X0 = np.zeros((3 if sir else 4, N.size))
+    X0[1, list(groups)] = infected
+    X0[0] = N - X0[1]
+    return X0
+
+def plot_metapopulation(t, X, title = 'Metapopulation SEIR Model'):
+    """Infected per group over time (heat map) and the total of every compartment."""
+    import matplotlib.pyplot as plt
+
+    names = ['Susceptible', 'Exposed', 'Infected', 'Recovered'] if X.shape[1] == 4 else ['Susceptible', 'Infected', 'Recovered']
+    infected = X[:, names.index('Infected')]
+    plt.figure()
+    plt.imshow(infected.T, aspect = 'auto', origin = 'lower', extent = [t[0], t[-1], 0, X.shape[2]])
+    plt.colorbar(label = 'Infected')
+    plt.xlabel('Time t, [days]')
+    plt.ylabel('Group')
+    plt.title(title + ': infected per group')
+    plt.show()
+
+    plt.figure()
+    for i, name in enumerate(names):
+        plt.plot(t, X[:, i].sum(axis = 1), label = name)
+    plt.xlabel('Time t, [days]')
+    plt.ylabel('Number of individuals')
+    plt.title(title + ': all the groups')
+    plt.legend()
+    plt.show()
+
+if __name__ == '__main__':
+    import time
+
+    # 500 regions of 1000 individuals on a ring with a few long-distance links, the rates of SEIR Model.py
+    G = 500
+    N = np.full(G, 1000.0)
+    K = coupling(ring_mobility(G, neighbors = 2, shortcuts = 20, seed = 0), epsilon = 0.05)
+    t = np.linspace(0, 730, 731)
+    X = solve(seed_outbreak(N, 1), t, N, 0.3, 0.1, K, sigma = 0.05)
+    plot_metapopulation(t, X)
+
+    # Cost against the number of groups (one scenario) and of scenarios (100 groups each)
+    for groups in (100, 1000, 10000):
+        N = np.full(groups, 1000.0)
+        K = coupling(ring_mobility(groups, shortcuts = groups // 25, seed = 0), epsilon = 0.05)
+        start = time.perf_counter()
+        solve(seed_outbreak(N, 1), t, N, 0.3, 0.1, K, sigma = 0.05)
+        print(groups, 'groups:', format(time.perf_counter() - start, '.2f'), 's')
+    N = np.full(100, 1000.0)
+    K = coupling(ring_mobility(100, seed = 0), epsilon = 0.05)
+    beta = np.linspace(0.15, 0.5, 100)[:, None]                 # one beta per scenario
+    start = time.perf_counter()
+    X = solve(np.broadcast_to(seed_outbreak(N, 1), (100, 4, 100)), t, N, beta, 0.1, K, sigma = 0.05)
+    print('100 scenarios of 100 groups:', format(time.perf_counter() - start, '.2f'), 's, final sizes from',
+          format(1e5 - X[0, -1, 0].sum(), '.0f'), 'to', format(1e5 - X[-1, -1, 0].sum(), '.0f'))
@@ -1,6 +1,11 @@
+import os
+import sys
 import numpy as np
 from scipy import integrate
-import matplotlib.pyplot as plt
+
+if __name__ == '__main__':      # run as a script: put the repository root on the path for mathematical_models
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mathematical_models import events, result_cache
 """ 
         SIR Epidemic Model (A simple mathematical description of the spread of a disease in a population N)
          ( S + I + R = N )
@@ -38,9 +43,50 @@ tmax = 160              # A grid of time points / days
 Nt = 160
 t = np.linspace(0, tmax, Nt + 1)
 
+def derivative(X, t, N, beta, gamma):
+    S, I, R = X
+    dotS = (-beta * S * I) / N
+    dotI = (beta * S * I / N) - (gamma * I)
+    dotR = gamma * I
+    return np.array([dotS, dotI, dotR])
+
+def jacobian(X, t, N, beta, gamma):
+    S, I, R = X
+    return np.array([[-beta * I / N, -beta * S / N, 0],
+                     [beta * I / N, beta * S / N - gamma, 0],
+                     [0, gamma, 0]])
+
+# We already know that S+I+R = N => R = N - S - I
+# Thus, we simplify the SIR -> SI Model, using only the first two O.D.E's
+
+def derivative_SI(X, t, N, beta = 0.4, gamma = 0.1):
+    S, I = X
+    dotS = (-beta * S * I) / N
+    dotI = (beta * S * I / N) - (gamma * I)
+    return np.array([dotS, dotI])
+
+def jacobian_SI(X, t, N, beta = 0.4, gamma = 0.1):
+    S, I = X
+    return np.array([[-beta * I / N, -beta * S / N],
+                     [beta * I / N, beta * S / N - gamma]])
+
+# odeint solution of the SIR model, kept (read-only) in result_cache.default_cache:
+# redrawing a case (Main_1, Main_2) does not integrate it again
+@result_cache.memoize('sir')
+def solve_sir(X0, t, N, beta, gamma):
+    return integrate.odeint(derivative, X0, t, args = (N, beta, gamma), Dfun = jacobian)
+
+# Peak and final size, integrating only until the number of infected falls below threshold
+def sir_summary(N, beta, gamma, I0 = 1, R0 = 0, t_max = 365, threshold = 0.5):
+    """Peak time, peak size (infected) and final size (ever infected) of the SIR epidemic (see events.epidemic_summary)."""
+    X0 = (N - I0 - R0, I0, R0)
+    return events.epidemic_summary(derivative, X0, t_max, (N, beta, gamma), infected = 1, threshold = threshold, jac = jacobian)
+
 """  Odeint Method:  """
 
 def Main_1():
+   import matplotlib.pyplot as plt
+
    N = 350                 # Population
    I0 = 1                  # Initial State: 1 Infected
    R0 = 0
@@ -51,16 +97,9 @@ def Main_1():
    Nt = 160
    t = np.linspace(0, tmax, Nt + 1)
 
-   def derivative(X, t):
-       S, I, R = X 
-       dotS = (-beta * S * I) / N 
-       dotI = (beta * S * I / N) - (gamma * I)
-       dotR = gamma * I   
-       return np.array([dotS, dotI, dotR])
-
    X0 = S0, I0, R0          # Initial Conditions Vector
 
-   res = integrate.odeint(derivative, X0, t)
+   res = solve_sir(X0, t, N, beta, gamma)
    S, I, R = res.T
 
    plt.figure()
@@ -78,6 +117,7 @@ def Main_1():
 """  Comparing the Differences of Rzero:  """
 
 def Main_2():
+   import matplotlib.pyplot as plt
    
    """ R_0 or Rzero is a parameter describing the average number of new infections due to a sick individual.
        Its commonly called the basic reproduction number. Its a fundamental concept in epidemiology.
@@ -87,18 +127,15 @@ def Main_2():
 
    # We'll compare the different cases of R_0 :
 
-   def der(X, t, beta, gamma):
-       S, I, R = X
-       dotS = (-beta * S * I) / N 
-       dotI = (beta * S * I / N) - (gamma * I)
-       dotR = gamma * I
-       return np.array([dotS, dotI, dotR])
-
    X0 = S0, I0, R0          # Initial Conditions Vector
 
    def Case(beta, gamma):
        Rzero = beta/gamma
-       res = integrate.odeint(der, X0, t, args = (beta, gamma))
+       summary = sir_summary(N, beta, gamma, I0, R0, tmax)
+       print('beta =', beta, ', gamma =', gamma, ': peak of', format(summary['peak_size'], '.1f'), 'infected on day',
+             format(summary['peak_time'], '.1f')+', final size', format(summary['final_size'], '.1f'),
+             '(over on day '+format(summary['end_time'], '.1f')+')' if summary['died_out'] else '')
+       res = solve_sir(X0, t, N, beta, gamma)
        S, I, R = res.T
        plt.figure()
        plt.grid()
@@ -127,20 +164,13 @@ def Main_2():
 """ Phase - Space of SI Model: """
 
 def Main_3():
-   
-   # We already know that S+I+R = N => R = N - S - R
-   # Thus, we simplify the SIR -> SI Model, using only the first two O.D.E's
-
-   def derivative_SI(X, t, beta = 0.4, gamma = 0.1):
-       S, I = X 
-       dotS = (-beta * S * I) / N 
-       dotI = (beta * S * I / N) - (gamma * I)
-       return np.array([dotS, dotI])
+   import matplotlib.pyplot as plt
+
    plt.figure()
    I = np.linspace(1, 6, 15)
    for i in I:
       X0 = [S0, i]
-      Xf = integrate.odeint(derivative_SI, X0, t, args = (0.4, 0.1))
+      Xf = integrate.odeint(derivative_SI, X0, t, args = (N, 0.4, 0.1), Dfun = jacobian_SI)
       plt.plot(Xf, "-", label = "$s = $"+str(X0[1]))
    plt.xlabel('Susceptible')
    plt.ylabel('Infected')
@@ -148,7 +178,8 @@ def Main_3():
    plt.title('Phase - Space')                                              
    plt.show()
 
-Main_1()
-Main_2()
-Main_3()
+if __name__ == '__main__':
+   Main_1()
+   Main_2()
+   Main_3()
 
@@ -1,6 +1,5 @@
 import numpy as np
 from scipy.integrate import odeint
-import matplotlib.pyplot as plt
 # Define the SIR model differential equations
 def sir_model(y, t, N, beta, gamma):
     # Unpack the variables
@@ -12,8 +11,17 @@ def sir_model(y, t, N, beta, gamma):
     # Return the derivatives
     return dSdt, dIdt, dRdt
 
+# Jacobian matrix of the SIR model (d sir_model_i / d y_j)
+def sir_jacobian(y, t, N, beta, gamma):
+    S, I, R = y
+    return np.array([[-beta * I / N, -beta * S / N, 0],
+                     [beta * I / N, beta * S / N - gamma, 0],
+                     [0, gamma, 0]])
+
 # Main function
 if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
     # Set the total population size
     N = 1000000
     # Set the initial number of infected and recovered individuals
@@ -27,7 +35,7 @@ if __name__ == '__main__':
     # Set the initial conditions for the model
     y0 = S0, I0, R0
     # Solve the differential equations using odeint
-    sol = odeint(sir_model, y0, t, args=(N, beta, gamma))
+    sol = odeint(sir_model, y0, t, args=(N, beta, gamma), Dfun=sir_jacobian)
     # Unpack the solution array into separate arrays for S, I, and R
     S, I, R = sol[:, 0], sol[:, 1], sol[:, 2]
     # Plot the results
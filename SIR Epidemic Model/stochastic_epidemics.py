@@ -0,0 +1,207 @@
+import numpy as np
+
+"""
+ Stochastic SIR and SEIR Epidemic Models
+
+ The deterministic models (sir_model in Simplest_SIR.py, derivative in SEIR Model.py) describe the average
+ behaviour of a large population. For small populations (e.g. N = 350) chance matters: the epidemic may die
+ out early, or take off later than expected. Here every infection, incubation and recovery is a random event,
+ with the same parameters (N: population, beta: contact rate, sigma: incubation rate, gamma: recovery rate):
+
+    SIR:    S -> I   with rate  beta * S * I / N
+            I -> R   with rate  gamma * I
+
+    SEIR:   S -> E   with rate  beta * S * I / N
+            E -> I   with rate  sigma * E
+            I -> R   with rate  gamma * I
+
+ Two simulators, both vectorized across many replicate trajectories:
+
+    gillespie:    exact, one event at a time (Gillespie's direct method)
+    tau_leaping:  approximate, fires many events per step (Poisson numbers of events, adaptive step tau),
+                  falling back to exact steps when only a few events are expected. The number of steps
+                  does not grow with N, so it suits large populations (e.g. N = 10^6 in Simplest_SIR.py).
+
+ A replicate stops as soon as there are no infected (and exposed) individuals left, and the simulation ends
+ when all the replicates have either died out or reached the end of the time grid.
+"""
+
+# Change of each compartment caused by each event (rows: events, columns: compartments)
+STOICHIOMETRY = {
+    'SIR': np.array([[-1, 1, 0],                  # infection
+                     [0, -1, 1]]),                # recovery
+    'SEIR': np.array([[-1, 1, 0, 0],              # infection (exposure)
+                      [0, -1, 1, 0],              # end of incubation
+                      [0, 0, -1, 1]]),            # recovery
+}
+
+# Highest order of the events in which each compartment is consumed (used to choose tau)
+ORDER = {'SIR': np.array([2, 2, 1]), 'SEIR': np.array([2, 1, 2, 1])}
+
+def rates(model, X, N, beta, gamma, sigma):
+    """Event rates (propensities) of shape (replicates, events) for states X of shape (replicates, compartments)."""
+    if model == 'SIR':
+        S, I = X[:, 0], X[:, 1]
+        return np.stack([beta * S * I / N, gamma * I], axis = 1)
+    S, E, I = X[:, 0], X[:, 1], X[:, 2]
+    return np.stack([beta * S * I / N, sigma * E, gamma * I], axis = 1)
+
+def _prepare(model, X0, t, beta, gamma, sigma, replicates):
+    if model not in STOICHIOMETRY:
+        raise ValueError("model must be 'SIR' or 'SEIR'")
+    if model == 'SEIR' and sigma is None:
+        raise ValueError('The SEIR model needs sigma')
+    C = STOICHIOMETRY[model].shape[1]
+    X0 = np.asarray(X0, dtype = np.int64)
+    if X0.shape[-1] != C:
+        raise ValueError('X0 must have {} compartments for the {} model'.format(C, model))
+    X = np.array(np.broadcast_to(X0, (replicates, C)))
+    params = [np.broadcast_to(np.asarray(0.0 if p is None else p, dtype = float), (replicates,)) for p in (beta, gamma, sigma)]
+    N = X.sum(axis = 1).astype(float)
+    t = np.asarray(t, dtype = float)
+    out = np.zeros((replicates, t.size, C), dtype = np.int64)
+    return X, N, params, t, out
+
+def _record(out, grid, grid_index, rows, X, until):
+    """Store the states X of `rows` at the grid points before the time `until`."""
+    while rows.size:
+        pending = grid_index[rows] < grid.size
+        pending[pending] = grid[grid_index[rows[pending]]] < until[pending]
+        if not pending.any():
+            return
+        rows, X, until = rows[pending], X[pending], until[pending]
+        out[rows, grid_index[rows]] = X
+        grid_index[rows] += 1
+
+def _finish(out, grid_index, rows, X):
+    """Fill the rest of the time grid of finished replicates with their final state."""
+    for row, state in zip(rows, X):
+        out[row, grid_index[row]:] = state
+
+def _simulate(model, X0, t, beta, gamma, sigma, replicates, seed, epsilon):
+    rng = np.random.default_rng(seed)
+    X, N, (beta, gamma, sigma), t, out = _prepare(model, X0, t, beta, gamma, sigma, replicates)
+    v = STOICHIOMETRY[model]
+    g = ORDER[model]
+    tmax = t[-1]
+
+    time = np.full(replicates, t[0])
+    grid_index = np.zeros(replicates, dtype = np.int64)
+    extinction_time = np.full(replicates, np.nan)
+    active = np.arange(replicates)
+    steps = 0
+
+    while active.size:
+        steps += 1
+        x = X[active]
+        a = rates(model, x, N[active], beta[active], gamma[active], sigma[active])
+        a0 = a.sum(axis = 1)
+
+        # Extinction: no events can happen any more
+        extinct = a0 <= 0
+        if extinct.any():
+            rows = active[extinct]
+            extinction_time[rows] = time[rows]
+            _finish(out, grid_index, rows, X[rows])
+            active, x, a, a0 = active[~extinct], x[~extinct], a[~extinct], a0[~extinct]
+            if not active.size:
+                break
+
+        # Exact step: waiting time to the next event and which event it is
+        m = active.size
+        dt = rng.exponential(1.0, m) / a0
+        event = (np.cumsum(a, axis = 1) < (rng.random(m) * a0)[:, None]).sum(axis = 1)
+        K = np.zeros_like(a, dtype = np.int64)
+        K[np.arange(m), np.minimum(event, a.shape[1] - 1)] = 1
+
+        if epsilon is not None:
+            # Tau-leaping: largest tau for which no rate is expected to change by more than a fraction epsilon
+            mu, var = a @ v, a @ (v * v)
+            bound = np.maximum(epsilon * x / g, 1.0)
+            with np.errstate(divide = 'ignore'):
+                tau = np.minimum(np.where(mu != 0, bound / np.abs(mu), np.inf),
+                                 np.where(var > 0, bound**2 / var, np.inf)).min(axis = 1)
+            tau = np.minimum(tau, tmax - time[active])
+            leap = tau * a0 >= 10                      # otherwise exact steps are cheaper (and exact)
+            rows = np.flatnonzero(leap)
+            while rows.size:
+                k = rng.poisson(a[rows] * tau[rows, None])
+                negative = (x[rows] + k @ v < 0).any(axis = 1)
+                K[rows[~negative]] = k[~negative]
+                dt[rows[~negative]] = tau[rows[~negative]]
+                rows = rows[negative]
+                tau[rows] /= 2                           # too many events, retry with a smaller step
+
+        # The state is constant until time + dt
+        new_time = time[active] + dt
+        _record(out, t, grid_index, active, x, new_time)
+
+        # Replicates reaching the end of the time grid
+        done = new_time >= tmax
+        if epsilon is not None:
+            K[done & ~leap & (new_time > tmax)] = 0   # an exact event after tmax does not happen
+        else:
+            K[done] = 0
+        X[active] = x + K @ v
+        time[active] = np.minimum(new_time, tmax)
+        if done.any():
+            _finish(out, grid_index, active[done], X[active[done]])
+            active = active[~done]
+
+    return {'t': t, 'X': out, 'extinction_time': extinction_time, 'steps': steps}
+
+def gillespie(model, X0, t, beta, gamma, sigma = None, replicates = 1, seed = None):
+    """Exact stochastic simulation (Gillespie's direct method) of the SIR or SEIR model.
+
+    Args:
+        model (str): 'SIR' or 'SEIR'.
+        X0: Initial numbers of individuals, (S0, I0, R0) or (S0, E0, I0, R0), or one row per replicate.
+        t: Time grid on which the trajectories are recorded (starts at t[0], ends at t[-1]).
+        beta, gamma, sigma: Contact, recovery and incubation (SEIR only) rates, scalars or one per replicate.
+        replicates (int): Number of independent trajectories.
+        seed: Seed (int, SeedSequence or np.random.Generator) of the random numbers.
+
+    Returns:
+        dict: 't', 'X' (array of shape (replicates, len(t), compartments) with the numbers of individuals),
+              'extinction_time' (time at which the infection died out, nan if it did not before t[-1])
+              and 'steps' (number of vectorized steps).
+    """
+    return _simulate(model, X0, t, beta, gamma, sigma, replicates, seed, epsilon = None)
+
+def tau_leaping(model, X0, t, beta, gamma, sigma = None, replicates = 1, seed = None, epsilon = 0.03):
+    """Approximate stochastic simulation of the SIR or SEIR model by adaptive tau-leaping.
+
+    The step tau is chosen (Cao, Gillespie & Petzold, 2006) so that no rate is expected to change by more
+    than a fraction epsilon; steps that would make a compartment negative are retried with tau / 2.
+    Arguments and result as in gillespie.
+    """
+    return _simulate(model, X0, t, beta, gamma, sigma, replicates, seed, epsilon = epsilon)
+
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
+    # The small population of "SIR  Epidemic Model.py": N = 350, one infected
+    N = 350
+    t = np.linspace(0, 160, 161)
+    result = gillespie('SIR', (N - 1, 1, 0), t, beta = 0.4, gamma = 0.1, replicates = 100)
+    died_out = np.mean(result['extinction_time'] < 20)
+    print('Epidemics that died out in the first 20 days: ', format(died_out*100, '.2f')+'%')
+
+    plt.figure()
+    plt.grid()
+    plt.plot(t, result['X'][:, :, 1].T, 'r', alpha = 0.2)
+    plt.xlabel('Time t, [days]')
+    plt.ylabel('Infected')
+    plt.title('Stochastic SIR Model (Gillespie) - 100 replicates')
+    plt.show()
+
+    # The large population of Simplest_SIR.py: N = 10^6, by tau-leaping
+    N = 1000000
+    t = np.linspace(0, 365, 365)
+    result = tau_leaping('SIR', (N - 10, 10, 0), t, beta = 0.5, gamma = 0.1, replicates = 20)
+    plt.figure(figsize=(12, 4))
+    plt.plot(t, result['X'][:, :, 1].T / N, 'r', alpha = 0.3)
+    plt.xlabel('Time [days]')
+    plt.ylabel('Proportion of population')
+    plt.title('Stochastic SIR model (tau-leaping) - Infected')
+    plt.show()
@@ -1,6 +1,4 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.integrate import solve_ivp
 
 """ 
 simple stochastic model of stock price dynamics 
@@ -28,29 +26,6 @@ a*y*(1-y): represents the expected growth of the stock price due to market condi
 b*y*np.random.normal(size=1): adds some randomness to the model using normally distributed random numbers
 """
 
-# Example
-
-# Set up Initial conditions and Time span
-y0 = [100]   # initial stock price
-t_span = [0, 100]   # time span for simulation
-t_eval = np.linspace(t_span[0], t_span[1], 1000)   # time points to evaluate solution
-
-# Set up the parameters
-r = 0.05   # interest rate 
-a = 0.001    # growth rate
-b = 0.01   # volatility
-
-# Solve the ODE system numerically using solve_ivp
-sol = solve_ivp(stock_price, t_span=t_span, y0=y0, t_eval=t_eval, args=(r, a, b))
-
-# Plot the results
-plt.plot(sol.t, sol.y[0], label='Stock Price')
-plt.xlabel('Time')
-plt.ylabel('Price')
-plt.title('Stock Price')
-plt.legend()
-plt.show()
-
 """
 Similar to the graph of f(x) = 1/x , because the logistic equation dy/dt = r*y*(1-y)
 has a stable equilibrium point at y=1,
@@ -58,11 +33,86 @@ which means that if the initial value of y is close to 1,
 the solution will converge towards 1 over time 
 """
 
-def simulation(y0, t_span, t_eval, r, a, b,):
-    sol = solve_ivp(stock_price, t_span=t_span, y0=y0, t_eval=t_eval, args=(r, a, b))
-    plt.plot(sol.t, sol.y[0], label='Stock Price')
+"""
+As an SDE:  dy = (r*y + a*y*(1-y)) dt + b*y dW,  with W a Brownian motion.
+
+stock_price draws a new random number every time solve_ivp evaluates it, and the adaptive solver does
+so an unpredictable number of times per step, so neither the noise nor the run time are well defined.
+sde_paths integrates the SDE with fixed steps instead, for many paths (and parameter sets) at once:
+
+    Euler-Maruyama:  y_{n+1} = y_n + f(y_n) dt + g(y_n) dW
+    Milstein:        y_{n+1} = y_n + f(y_n) dt + g(y_n) dW + 0.5 * g(y_n) * g'(y_n) * (dW^2 - dt)
+
+with drift f(y) = r*y + a*y*(1-y), diffusion g(y) = b*y (so g*g' = b^2 * y) and dW ~ Normal(0, dt).
+"""
+
+def drift(y, r, a):
+    return r*y + a*y*(1-y)
+
+def diffusion(y, b):
+    return b*y
+
+def sde_paths(y0, t_eval, r, a, b, paths = 1, scheme = 'milstein', substeps = 1, seed = None):
+    """Integrate the stock price SDE with a fixed-step scheme.
+
+    Args:
+        y0, r, a, b: Initial price and parameters, scalars or arrays (broadcast against each other, e.g. a grid of parameter sets).
+        t_eval: Time points at which the solution is returned (the first one is the initial time).
+        paths (int): Number of independent paths per parameter set.
+        scheme (str): 'milstein' or 'euler' (Euler-Maruyama).
+        substeps (int): Number of fixed steps between two consecutive time points.
+        seed: Seed (int, SeedSequence or np.random.Generator) of the random numbers.
+
+    Returns:
+        ndarray: Array of shape broadcast(y0, r, a, b).shape + (paths, len(t_eval)).
+    """
+    if scheme not in ('milstein', 'euler'):
+        raise ValueError("scheme must be 'milstein' or 'euler'")
+    rng = np.random.default_rng(seed)
+    y0, r, a, b = (v[..., None] for v in np.broadcast_arrays(*(np.asarray(v, dtype = float) for v in (y0, r, a, b))))
+    t_eval = np.asarray(t_eval, dtype = float)
+
+    y = np.array(np.broadcast_to(y0, y0.shape[:-1] + (paths,)))
+    Y = np.empty(y.shape + (t_eval.size,))
+    Y[..., 0] = y
+    milstein = 0.5 * b**2 if scheme == 'milstein' else None
+    for i in range(1, t_eval.size):
+        dt = (t_eval[i] - t_eval[i - 1]) / substeps
+        for _ in range(substeps):
+            dW = rng.normal(0.0, np.sqrt(dt), size = y.shape)
+            dy = drift(y, r, a) * dt + diffusion(y, b) * dW
+            if milstein is not None:
+                dy += milstein * y * (dW**2 - dt)
+            y += dy
+        Y[..., i] = y
+    return Y
+
+def simulation(y0, t_span, t_eval, r, a, b, paths = 1, scheme = 'milstein', seed = None):
+    import matplotlib.pyplot as plt
+
+    if t_eval is None:
+        t_eval = np.linspace(t_span[0], t_span[1], 1000)
+    Y = sde_paths(np.ravel(y0)[0], t_eval, r, a, b, paths = paths, scheme = scheme, seed = seed)
+    lines = plt.plot(t_eval, Y.T)
+    lines[0].set_label('Stock Price')
     plt.xlabel('Time')
     plt.ylabel('Price')
     plt.title('Stock Price')
     plt.legend()
-    plt.show()
\ No newline at end of file
+    plt.show()
+
+if __name__ == '__main__':
+    # Example
+
+    # Set up Initial conditions and Time span
+    y0 = [100]   # initial stock price
+    t_span = [0, 100]   # time span for simulation
+    t_eval = np.linspace(t_span[0], t_span[1], 1000)   # time points to evaluate solution
+
+    # Set up the parameters
+    r = 0.05   # interest rate
+    a = 0.001    # growth rate
+    b = 0.01   # volatility
+
+    # Integrate the SDE (Milstein scheme) and plot the results
+    simulation(y0, t_span, t_eval, r, a, b)
@@ -0,0 +1,121 @@
+"""
+ Importable entry point for the models of this repository.
+
+ The model scripts live in folders whose names contain spaces (e.g. "SEIR Epidemic Model/SEIR Model.py"),
+ so they cannot be imported with a plain import statement. This module maps each script to a short name
+ and loads it on first use:
+
+    import mathematical_models as mm
+
+    mm.seir.solve_seir_batch(0.3, 0.1, 0.05, 1000, E0, t)       # any function of a script, via its short name
+    mm.logistic_model(P0, t, k, K)                                # the main model functions, directly
+
+    import mathematical_models.seir                               # also works, e.g. inside worker processes
+
+ Nothing is loaded until it is accessed, and none of the scripts import matplotlib (or pandas) at import time;
+ plotting functions import it when they are called. Running a script directly still shows its figures.
+"""
+
+import importlib.abc
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Short name -> script path (relative to the repository root)
+MODULES = {
+    'malthus_verhulst': 'Malthus & Verhulst Models/Malthus & Verhulst Models.py',
+    'lotka_volterra': 'Lotka Volterra Model/Lotka-Volterra.py',
+    'sir': 'SIR Epidemic Model/SIR  Epidemic Model.py',
+    'simplest_sir': 'SIR Epidemic Model/Simplest_SIR.py',
+    'stochastic_epidemics': 'SIR Epidemic Model/stochastic_epidemics.py',
+    'seir': 'SEIR Epidemic Model/SEIR Model.py',
+    'metapopulation': 'SEIR Epidemic Model/metapopulation.py',
+    'gbm': 'Geometric Brownian Motion Model/GBM.py',
+    'option_pricing': 'Geometric Brownian Motion Model/option_pricing.py',
+    'stock': 'Simple stochastic model of stock price dynamics/simple_stochastic_model_of_stock_price_dynamics.py',
+    'coin_flip': 'Monte Carlo Simulations Method/Coin_Flip-Monte_Carlo.py',
+    'monty_hall': 'Monte Carlo Simulations Method/Monty_Hall-Monte_Carlo.py',
+    'random_walk': 'Monte Carlo Simulations Method/Random_Walk-Monte_Carlo.py',
+    'parallel_monte_carlo': 'Monte Carlo Simulations Method/parallel_monte_carlo.py',
+    'progressive_estimators': 'Monte Carlo Simulations Method/progressive_estimators.py',
+    'abc_inference': 'Monte Carlo Simulations Method/abc_inference.py',
+    'variance_reduction': 'Monte Carlo Simulations Method/variance_reduction.py',
+    'ode_solver': 'Numerical Methods/ode_solver.py',
+    'compiled_rhs': 'Numerical Methods/compiled_rhs.py',
+    'result_cache': 'Numerical Methods/result_cache.py',
+    'trajectory_store': 'Numerical Methods/trajectory_store.py',
+    'events': 'Numerical Methods/events.py',
+    'parameter_explorer': 'Numerical Methods/parameter_explorer.py',
+    'phase_portrait': 'Numerical Methods/phase_portrait.py',
+    'batch_render': 'Numerical Methods/batch_render.py',
+    'calibration': 'Numerical Methods/calibration.py',
+}
+
+# Function name -> short name of the script defining it (only names that are unique across scripts)
+FUNCTIONS = {
+    'malthus_model': 'malthus_verhulst',
+    'logistic_model': 'malthus_verhulst',
+    'malthus_solution': 'malthus_verhulst',
+    'logistic_solution': 'malthus_verhulst',
+    'solve_growth_model': 'malthus_verhulst',
+    'sir_model': 'simplest_sir',
+    'gillespie': 'stochastic_epidemics',
+    'tau_leaping': 'stochastic_epidemics',
+    'solve_seir_batch': 'seir',
+    'gbm_paths': 'gbm',
+    'gbm_chunks': 'gbm',
+    'gbm_statistics': 'gbm',
+    'stock_price': 'stock',
+    'sde_paths': 'stock',
+    'coin_flip': 'coin_flip',
+    'random_walk': 'random_walk',
+    'monte_carlo_random_walk': 'random_walk',
+    'monte_carlo_return_to_origin': 'random_walk',
+    'random_walk_statistics': 'random_walk',
+    'solve_ode': 'ode_solver',
+    'integrate_batch': 'compiled_rhs',
+    'memoize': 'result_cache',
+    'solve_events': 'events',
+    'epidemic_summary': 'events',
+    'vector_field': 'phase_portrait',
+    'render_batch': 'batch_render',
+    'run_parallel': 'parallel_monte_carlo',
+}
+
+# Makes "import mathematical_models.<name>" go through the finder below
+__path__ = []
+
+
+class _ScriptFinder(importlib.abc.MetaPathFinder):
+    """Finds "mathematical_models.<name>" modules in the scripts listed in MODULES."""
+
+    def find_spec(self, fullname, path, target=None):
+        package, _, name = fullname.partition('.')
+        if package != __name__ or name not in MODULES:
+            return None
+        return importlib.util.spec_from_file_location(fullname, os.path.join(ROOT, MODULES[name]))
+
+
+if not any(isinstance(finder, _ScriptFinder) for finder in sys.meta_path):
+    sys.meta_path.append(_ScriptFinder())
+
+
+def load(name):
+    """Import (once) and return the script registered under the short name `name`."""
+    if name not in MODULES:
+        raise KeyError('Unknown model: {} (available: {})'.format(name, ', '.join(sorted(MODULES))))
+    return importlib.import_module(__name__ + '.' + name)
+
+
+def __getattr__(name):
+    if name in MODULES:
+        return load(name)
+    if name in FUNCTIONS:
+        return getattr(load(FUNCTIONS[name]), name)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + list(MODULES) + list(FUNCTIONS))